@@ -7,6 +7,30 @@ import time
 from typing import Dict, List, Any, Optional
 from pathlib import Path
 
+from structured_output import parse_json
+
+# LLM思考结果的结构
+THOUGHT_SCHEMA = {
+    "type": "object",
+    "required": ["reasoning"],
+    "properties": {
+        "progress_analysis": {"type": "string"},
+        "next_step_suggestion": {"type": "string"},
+        "reasoning": {"type": "string"}
+    }
+}
+
+# LLM决策结果的结构
+DECISION_SCHEMA = {
+    "type": "object",
+    "required": ["tool", "reason"],
+    "properties": {
+        "tool": {"type": "string"},
+        "parameters": {"type": "object"},
+        "reason": {"type": "string"}
+    }
+}
+
 
 class NovelToVideoAgent:
     """
@@ -95,12 +119,9 @@ class NovelToVideoAgent:
                 # 3. 执行动作
                 result = self._execute(action)
                 
-                # 4. 更新记忆
+                # 4. 更新记忆（API限流由KimiAPI的全局限速器处理，循环中不再固定休眠）
                 self._update_memory(action, result)
                 
-                # 5. 短暂休息（避免API限流）
-                time.sleep(1)
-                
         except Exception as e:
             self._log_thinking("❌ 错误", f"Agent遇到错误: {str(e)}")
             raise
@@ -198,19 +219,13 @@ class NovelToVideoAgent:
             messages = [
                 {"role": "user", "content": prompt}
             ]
-            response = self.llm.chat(messages)
+            response = self.llm.chat(messages, json_mode=True)
             
             if not response:
                 raise Exception("LLM返回为空")
             
             # 提取JSON
-            response = response.strip()
-            if "```json" in response:
-                response = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                response = response.split("```")[1].split("```")[0].strip()
-            
-            thought = json.loads(response)
+            thought = parse_json(response, THOUGHT_SCHEMA)
             self._log_thinking("💭 分析结果", thought["reasoning"])
             return thought
             
@@ -284,19 +299,13 @@ class NovelToVideoAgent:
             messages = [
                 {"role": "user", "content": prompt}
             ]
-            response = self.llm.chat(messages)
+            response = self.llm.chat(messages, json_mode=True)
             
             if not response:
                 raise Exception("LLM返回为空")
             
             # 提取JSON
-            response = response.strip()
-            if "```json" in response:
-                response = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                response = response.split("```")[1].split("```")[0].strip()
-            
-            action = json.loads(response)
+            action = parse_json(response, DECISION_SCHEMA)
             
             # 验证决策是否合法
             state = self.memory["current_state"]
@@ -6,6 +6,34 @@ import json
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+from structured_output import parse_json
+
+# LLM质量评估结果的结构
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "required": ["overall_score"],
+    "properties": {
+        "overall_score": {"type": "number"},
+        "completeness": {"type": "number"},
+        "consistency": {"type": "number"},
+        "quality": {"type": "number"},
+        "issues": {"type": "array", "items": {"type": "string"}},
+        "suggestions": {"type": "array", "items": {"type": "string"}}
+    }
+}
+
+# LLM参数调整结果的结构
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "required": ["sampling_steps", "cfg_scale", "sampler"],
+    "properties": {
+        "sampling_steps": {"type": "integer"},
+        "cfg_scale": {"type": "number"},
+        "sampler": {"type": "string"},
+        "reason": {"type": "string"}
+    }
+}
+
 
 class AgentTools:
     """Agent 工具集合"""
@@ -108,13 +136,16 @@ class AgentTools:
                 "message": f"项目检查失败: {str(e)}"
             }
         
-    def regenerate_scene(self, scene_number: int, new_prompt: str = None, **kwargs) -> Dict[str, Any]:
+    def regenerate_scene(self, scene_number: int, new_prompt: str = None, seed_mode: str = "new",
+                         steps: int = None, **kwargs) -> Dict[str, Any]:
         """
         工具：重新生成指定场景的图像（完整实现）
         
         Args:
             scene_number: 场景编号（从1开始）
             new_prompt: 新的提示词（可选，如果不提供则使用现有提示词）
+            seed_mode: "new" 新的随机种子，"same" 沿用上次的种子（复现同一张图）
+            steps: 推理步数（可选）
             
         Returns:
             执行结果
@@ -128,7 +159,9 @@ class AgentTools:
             result = regenerate_single_image_tool(
                 project_name=self.generator.project_name,
                 scene_index=scene_number,
-                new_prompt=new_prompt
+                new_prompt=new_prompt,
+                seed_mode=seed_mode,
+                steps=steps
             )
             
             if result['success']:
@@ -137,7 +170,8 @@ class AgentTools:
                     "scene_number": scene_number,
                     "message": result['message'],
                     "image_path": result.get('image_path'),
-                    "prompt": result.get('prompt')
+                    "prompt": result.get('prompt'),
+                    "seed": result.get('seed')
                 }
             else:
                 return {
@@ -827,19 +861,13 @@ class AgentTools:
 
         try:
             messages = [{"role": "user", "content": prompt}]
-            response = self.llm_client.chat(messages)
+            response = self.llm_client.chat(messages, json_mode=True)
             
             if not response:
                 raise Exception("LLM返回为空")
             
             # 提取JSON
-            response = response.strip()
-            if "```json" in response:
-                response = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                response = response.split("```")[1].split("```")[0].strip()
-            
-            evaluation = json.loads(response)
+            evaluation = parse_json(response, EVALUATION_SCHEMA)
             return evaluation
             
         except Exception as e:
@@ -964,19 +992,13 @@ class AgentTools:
 
         try:
             messages = [{"role": "user", "content": prompt}]
-            response = self.llm_client.chat(messages)
+            response = self.llm_client.chat(messages, json_mode=True)
             
             if not response:
                 raise Exception("LLM返回为空")
             
             # 提取JSON
-            response = response.strip()
-            if "```json" in response:
-                response = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                response = response.split("```")[1].split("```")[0].strip()
-            
-            new_params = json.loads(response)
+            new_params = parse_json(response, PARAMETERS_SCHEMA)
             return new_params
             
         except Exception as e:
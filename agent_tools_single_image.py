@@ -1,11 +1,14 @@
 """
 Agent工具：单张图片重新生成
 """
-from pathlib import Path
 import json
 
 
-def regenerate_single_image_tool(project_name: str, scene_index: int, new_prompt: str = None):
+SEED_CHOICES = ("new", "same")
+
+
+def regenerate_single_image_tool(project_name: str, scene_index: int, new_prompt: str = None,
+                                 seed_mode: str = "new", steps: int = None):
     """
     重新生成单张分镜图片
     
@@ -13,14 +16,23 @@ def regenerate_single_image_tool(project_name: str, scene_index: int, new_prompt
         project_name: 项目名称
         scene_index: 场景索引（从1开始）
         new_prompt: 新的提示词（可选，如果不提供则使用现有提示词）
+        seed_mode: "new" 使用新的随机种子；"same" 沿用种子台账中记录的种子
+                   （复现同一张图，如配合 steps 提高步数，或只微调提示词）
+        steps: 推理步数（可选，默认与main.py相同）
     
     Returns:
-        dict: 执行结果
+        dict: 执行结果（含本次使用的种子）
     """
+    if seed_mode not in SEED_CHOICES:
+        return {
+            "success": False,
+            "error": f"未知的种子模式: {seed_mode}（可选: {', '.join(SEED_CHOICES)}）"
+        }
+    
     try:
         from main import VideoGenerator
+        from seed_ledger import generation_settings, make_record, random_seed, save_prompts
         import torch
-        import gc
         
         print(f"\n🎨 单图重生工具: scene_{scene_index:04d}")
         
@@ -48,15 +60,16 @@ def regenerate_single_image_tool(project_name: str, scene_index: int, new_prompt
                     break
             
             if updated:
-                with open(prompts_file, 'w', encoding='utf-8') as f:
-                    json.dump(prompts_data, f, ensure_ascii=False, indent=2)
+                save_prompts(prompts_file, prompts_data)
                 print(f"✓ 提示词已更新")
         
         # 找到对应的提示词
+        scene = None
         scene_prompt = None
-        for scene in prompts_data.get('scene_prompts', []):
-            if scene['index'] == scene_index:
-                scene_prompt = scene['prompt']
+        for entry in prompts_data.get('scene_prompts', []):
+            if entry['index'] == scene_index:
+                scene = entry
+                scene_prompt = entry['prompt']
                 break
         
         if not scene_prompt:
@@ -67,104 +80,67 @@ def regenerate_single_image_tool(project_name: str, scene_index: int, new_prompt
         
         print(f"提示词: {scene_prompt[:80]}...")
         
-        # 加载SDXL模型（使用与main.py完全相同的配置）
-        from diffusers import StableDiffusionXLPipeline, EulerAncestralDiscreteScheduler
+        # 使用常驻的SDXL管线（与main.py共享同一个实例和相同的配置）
+        from sdxl_pipeline import get_pipeline_service, default_loras, sampling_params
+        from sdxl_batch import BatchImageGenerator
+        from prompt_embeddings import PromptEncoder, CLIP_SKIP
         
-        # 使用正确的模型路径
-        model_dir = Path("sdxl/models/prefectIllustriousXL_40")
-        model_path_file = model_dir / "prefectIllustriousXL_40.safetensors"
-        
-        if not model_path_file.exists():
+        pipeline_service = get_pipeline_service()
+        if not pipeline_service.model_path.exists():
             return {
                 "success": False,
-                "error": f"模型文件不存在: {model_path_file}"
+                "error": f"模型文件不存在: {pipeline_service.model_path}"
             }
         
-        print("加载SDXL模型...")
-        print(f"✓ 使用模型: Prefect Illustrious XL 40")
-        
-        pipe = StableDiffusionXLPipeline.from_single_file(
-            str(model_path_file),
-            torch_dtype=torch.float16,
-            config=str(model_dir),
-            local_files_only=True
-        ).to("cuda")
-        
-        # 加载DMD2 LoRA
-        dmd2_lora_path = Path("sdxl/models/loras/dmd2_sdxl_4step_lora.safetensors")
-        if dmd2_lora_path.exists():
-            pipe.load_lora_weights(
-                str(dmd2_lora_path.parent),
-                weight_name=dmd2_lora_path.name,
-                adapter_name="dmd2"
-            )
-            pipe.set_adapters(["dmd2"], adapter_weights=[0.8])
-            print("✓ DMD2 LoRA已加载")
-        
-        # 使用Euler Ancestral调度器
-        pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(
-            pipe.scheduler.config
-        )
-        
-        pipe.enable_attention_slicing()
-        pipe.enable_vae_slicing()
-        
-        # 生成图像（使用与main.py完全相同的参数）
-        print("生成图像...")
-        torch.cuda.empty_cache()
-        import random
-        seed = random.randint(0, 2**32 - 1)
-        generator_obj = torch.Generator(device="cuda").manual_seed(seed)
-        
-        # 负面词（Illustrious专用 - 更全面的质量控制）
-        negative_prompt = "lazyneg, lazyhand, child, (censored, mosaic censoring, bar_censor), lowres, text, error, cropped, worst quality, low quality, jpeg artifacts, ugly, duplicate, morbid, mutilated, out of frame, extra fingers, mutated hands, poorly drawn hands, poorly drawn face, mutation, deformed, blurry, dehydrated, bad anatomy, bad proportions, extra limbs, cloned face, disfigured, gross proportions, malformed limbs, missing arms, missing legs, extra arms, extra legs, fused fingers, too many fingers, long neck, username, watermark, signature"
-        
-        # 添加质量标签到提示词（Illustrious专用PE格式）
-        quality_tags = "score_9, score_8_up, score_7_up, masterpiece, best quality, amazing quality, absurdres, newest"
-        enhanced_prompt = f"{quality_tags}, BREAK {scene_prompt}"
-        
-        # 使用DMD2加速模式
-        use_dmd2 = dmd2_lora_path.exists()
-        if use_dmd2:
-            # DMD2: 12步，CFG=2.5（原始稳定配置）
-            image = pipe(
-                prompt=enhanced_prompt,
-                negative_prompt=negative_prompt,
-                num_inference_steps=12,
-                guidance_scale=2.5,
-                width=1024,
-                height=1024,
-                generator=generator_obj,
-                clip_skip=2
-            ).images[0]
+        loras = default_loras()
+        params = sampling_params(bool(loras))
+        if steps:
+            params["num_inference_steps"] = steps
+        settings = generation_settings(pipeline_service, loras, params, 1024, 1024, CLIP_SKIP)
+        
+        # 种子：沿用台账中的种子，或使用新的随机种子
+        record = scene.get("generation") or {}
+        if seed_mode == "same" and "seed" in record:
+            seed = record["seed"]
         else:
-            # 标准模式: 20步，CFG=7.0（原始配置）
-            image = pipe(
-                prompt=enhanced_prompt,
-                negative_prompt=negative_prompt,
-                num_inference_steps=20,
-                guidance_scale=7.0,
+            if seed_mode == "same":
+                print("⚠ 种子台账中没有该分镜的种子，使用新种子")
+            seed = random_seed()
+        
+        # 生成图像（使用与main.py完全相同的参数和提示词编码）
+        print(f"生成图像（{params['num_inference_steps']}步，种子 {seed}）...")
+        torch.cuda.empty_cache()
+        
+        with pipeline_service.acquire(loras) as pipe:
+            prompt_encoder = PromptEncoder(pipe)
+            image = BatchImageGenerator(
+                pipe,
+                device=pipeline_service.device,
+                batch_size=1,
+                encode_prompts=prompt_encoder.pipeline_kwargs
+            ).generate(
+                [{"prompt": scene_prompt, "seed": seed}],
                 width=1024,
                 height=1024,
-                generator=generator_obj,
-                clip_skip=2
-            ).images[0]
+                **params
+            )[0]
+        prompt_encoder.print_timing()
         
         # 保存图像
         img_path = generator.imgs_dir / f"scene_{scene_index:04d}.png"
         image.save(img_path)
         print(f"✓ 图像已保存: {img_path}")
         
-        # 释放显存
-        del pipe
-        torch.cuda.empty_cache()
-        gc.collect()
+        # 记录到种子台账
+        scene["generation"] = make_record(seed, scene_prompt, settings, pinned=["steps"] if steps else ())
+        save_prompts(prompts_file, prompts_data)
         
         return {
             "success": True,
             "message": f"场景 {scene_index} 已重新生成",
             "image_path": str(img_path),
-            "prompt": scene_prompt
+            "prompt": scene_prompt,
+            "seed": seed
         }
         
     except Exception as e:
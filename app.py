@@ -12,6 +12,8 @@ import time
 from datetime import datetime
 from main import VideoGenerator
 from tools.project_manager import ProjectManager
+from llm_cache import get_llm_cache
+from structured_output import parse_json, StructuredOutputError
 
 app = Flask(__name__)
 
@@ -102,6 +104,7 @@ class Task:
         self.video_path = None
         self.thinking_log = []  # Agent思考日志
         self.quality_score = None  # 质量分数
+        self.llm_cache = None  # LLM响应缓存命中统计（开启 llm_cache_enabled 时记录）
         # 工具状态：idle|running|done|error，含次数与最后更新时间
         now = datetime.now().isoformat()
         self.tools = {
@@ -129,6 +132,7 @@ class Task:
             'video_path': self.video_path,
             'thinking_log': self.thinking_log,
             'quality_score': self.quality_score
+            , 'llm_cache': self.llm_cache
             , 'tools': self.tools
         }
 
@@ -149,7 +153,9 @@ def task_worker():
                 
                 result = regenerate_single_image_tool(
                     project_name=task['project_name'],
-                    scene_index=task['scene_index']
+                    scene_index=task['scene_index'],
+                    seed_mode=task.get('seed_mode', 'new'),
+                    steps=task.get('steps')
                 )
                 
                 if result['success']:
@@ -177,6 +183,9 @@ def task_worker():
         while task.task_id in paused_tasks:
             time.sleep(0.5)
         
+        llm_cache = get_llm_cache()
+        llm_cache_snapshot = llm_cache.stats() if llm_cache else None
+        
         try:
             # 执行任务
             generator = VideoGenerator(task.project_name, task.novel_text, task.timbre)
@@ -282,6 +291,8 @@ def task_worker():
         finally:
             task.end_time = datetime.now()
             task.duration = (task.end_time - task.start_time).total_seconds()
+            if llm_cache:
+                task.llm_cache = llm_cache.stats_since(llm_cache_snapshot)
             
             with task_lock:
                 task_history.append(task)
@@ -318,13 +329,13 @@ def index():
 @app.route('/api/timbres')
 def get_timbres():
     """获取音色列表"""
-    timbre_dir = Path('Timbre')
-    timbres = []
+    from timbre_catalog import get_timbre_catalog
     
-    if timbre_dir.exists():
-        for file in timbre_dir.glob('*'):
-            if file.suffix.lower() in ['.wav', '.mp3']:
-                timbres.append(file.name)
+    catalog = get_timbre_catalog()
+    timbres = [
+        entry['filename'] for entry in catalog.list()
+        if Path(entry['filename']).suffix.lower() in ['.wav', '.mp3']
+    ]
     
     return jsonify(timbres)
 
@@ -673,7 +684,6 @@ def send_agent_message(task_id):
                                         # 找到了！从metadata恢复任务
                                         from agent import NovelToVideoAgent
                                         from agent_tools import AgentTools
-                                        from kimi_api import KimiAPI
                                         
                                         # 创建Task对象
                                         task = Task(
@@ -780,6 +790,18 @@ def send_agent_message(task_id):
     return jsonify({'success': True, 'message': '消息已发送'})
 
 
+# Agent创建任务时LLM提取结果的结构
+TASK_SCHEMA = {
+    "type": "object",
+    "required": ["title", "content"],
+    "properties": {
+        "title": {"type": "string"},
+        "content": {"type": "string"},
+        "timbre": {"type": ["string", "null"]}
+    }
+}
+
+
 @app.route('/api/agent_create_task', methods=['POST'])
 def agent_create_task():
     """Agent智能创建任务"""
@@ -800,9 +822,9 @@ def agent_create_task():
             available_timbres = wav_files + mp3_files + WAV_files
         
         # 使用LLM提取任务信息
-        from tools.kimi_api import KimiAPI
+        from kimi_api import get_kimi_api
         
-        api = KimiAPI()
+        api = get_kimi_api()
         
         # 构建音色列表（带描述）
         timbre_descriptions = {
@@ -874,25 +896,18 @@ def agent_create_task():
 只返回JSON，不要有其他解释。"""
         
         messages = [{"role": "user", "content": extract_prompt}]
-        response = api.chat(messages, temperature=0.3)
+        response = api.chat(messages, temperature=0.3, json_mode=True)
         
         if not response:
             return jsonify({'success': False, 'error': 'LLM提取失败'}), 500
         
-        # 解析JSON
-        json_str = response.strip()
-        if "```json" in json_str:
-            json_str = json_str.split("```json")[1].split("```")[0]
-        elif "```" in json_str:
-            json_str = json_str.split("```")[1].split("```")[0]
-        
+        # 解析JSON（内容中未转义的引号等常见问题会先在本地修复）
         try:
-            task_info = json.loads(json_str.strip())
-        except json.JSONDecodeError as e:
-            # JSON解析失败，可能是因为内容中有特殊字符
-            # 尝试使用更宽松的解析或直接从原始消息提取
+            task_info = parse_json(response, TASK_SCHEMA)
+        except StructuredOutputError as e:
+            # 修复后仍无法解析，直接从原始消息提取
             print(f"⚠️ JSON解析失败: {e}")
-            print(f"原始响应: {json_str[:200]}...")
+            print(f"原始响应: {response[:200]}...")
             
             # 回退方案：直接使用用户消息作为内容
             task_info = {
@@ -1202,15 +1217,18 @@ def regenerate_scene(project_name, scene_index):
 
 @app.route('/api/regenerate_single_image/<project_name>/<int:scene_index>', methods=['POST'])
 def regenerate_single_image(project_name, scene_index):
-    """重新生成单张图片（使用共享模型池）"""
+    """重新生成单张图片（使用共享模型池，可选 seed_mode: new/same 和 steps）"""
     try:
         print(f"\n🎨 重新生成单张图片: scene_{scene_index:04d}")
+        data = request.get_json(silent=True) or {}
         
         # 添加到任务队列
         task_data = {
             'type': 'regenerate_single',
             'project_name': project_name,
             'scene_index': scene_index,
+            'seed_mode': data.get('seed_mode', 'new'),
+            'steps': data.get('steps'),
             'timestamp': time.time()
         }
         
@@ -0,0 +1,111 @@
+"""
+TTS音频后处理基准测试
+
+用合成的语音片段（首尾带静音的噪声）模拟一个项目的全部子分镜，对比：
+- 逐帧循环：按10ms帧在Python中从两端扫描静音（常见的pydub式写法）
+- 逐片段处理：每个片段单独调用一次向量化后处理
+- 整体处理：整个项目的片段一次传入后处理
+并统计裁剪掉的静音时长
+
+用法：
+    python benchmarks/bench_audio_postprocess.py
+    python benchmarks/bench_audio_postprocess.py --clips 3000 --max-gap-ms 300
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from audio_postprocess import AudioPostProcessor
+
+SAMPLE_RATE = 24000
+
+
+def make_clips(count, seed=0):
+    """生成模拟片段：0.1~0.5秒前导静音 + 0.5~3秒语音 + 0.2~0.8秒尾部静音"""
+    rng = np.random.default_rng(seed)
+    clips = []
+    for _ in range(count):
+        lead = int(rng.uniform(0.1, 0.5) * SAMPLE_RATE)
+        body = int(rng.uniform(0.5, 3.0) * SAMPLE_RATE)
+        trail = int(rng.uniform(0.2, 0.8) * SAMPLE_RATE)
+        level = rng.uniform(0.02, 0.3)
+        voice = np.clip(rng.standard_normal(body) * level, -1, 1) * 32767
+        noise = rng.standard_normal(lead + body + trail) * 3  # 底噪约 -80dBFS
+        wav = np.concatenate([np.zeros(lead), voice, np.zeros(trail)]) + noise
+        clips.append(wav.astype(np.int16).reshape(-1, 1))
+    return clips
+
+
+def frame_loop_trim(wav, trim_db, pad_ms, target_dbfs, frame_ms=10):
+    """对照实现：逐帧扫描首尾静音，再按RMS调整增益"""
+    frame = SAMPLE_RATE * frame_ms // 1000
+    threshold = 10 ** (trim_db / 20) * 32768
+    x = wav[:, 0].astype(np.float32)
+    n_frames = len(x) // frame
+
+    start = 0
+    while start < n_frames and np.abs(x[start * frame:(start + 1) * frame]).max() <= threshold:
+        start += 1
+    end = n_frames
+    while end > start and np.abs(x[(end - 1) * frame:end * frame]).max() <= threshold:
+        end -= 1
+
+    pad = pad_ms // frame_ms
+    y = x[max(start - pad, 0) * frame:min(end + pad, n_frames) * frame] / 32768
+    rms = np.sqrt(np.mean(y * y)) if len(y) else 0
+    if rms > 1e-6:
+        y = y * min(10 ** (target_dbfs / 20) / rms, 0.97 / np.abs(y).max())
+    return np.clip(np.rint(y * 32768), -32768, 32767).astype(np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TTS音频后处理基准测试')
+    parser.add_argument('--clips', type=int, default=3000, help='片段数')
+    parser.add_argument('--max-gap-ms', type=float, default=None, help='相邻片段最大停顿（毫秒）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快）')
+    args = parser.parse_args()
+
+    clips = make_clips(args.clips)
+    total_before = sum(len(c) for c in clips) / SAMPLE_RATE
+    processor = AudioPostProcessor(max_gap_ms=args.max_gap_ms)
+
+    print("=" * 60)
+    print(f"音频后处理基准: {len(clips)} 个片段，共 {total_before:.1f}秒")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    for c in clips:
+        frame_loop_trim(c, processor.trim_db, processor.pad_ms, processor.target_dbfs)
+    frame_loop = time.perf_counter() - start
+
+    per_clip = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        loop_out = [processor.process([c], SAMPLE_RATE)[0] for c in clips]
+        per_clip = min(per_clip, time.perf_counter() - start)
+
+    batched = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        batch_out = processor.process(clips, SAMPLE_RATE)
+        batched = min(batched, time.perf_counter() - start)
+
+    assert all(np.array_equal(a, b) for a, b in zip(loop_out, batch_out))
+
+    total_after = sum(len(c) for c in batch_out) / SAMPLE_RATE
+    print(f"逐帧循环:   {frame_loop * 1000:.0f}ms")
+    print(f"逐片段处理: {per_clip * 1000:.0f}ms（{frame_loop / per_clip:.1f}x）")
+    print(f"整体处理:   {batched * 1000:.0f}ms（{frame_loop / batched:.1f}x）")
+    print(f"处理速度:   {total_before / batched:.0f} 秒音频/秒")
+    print(f"裁剪静音:   {total_before - total_after:.1f}秒"
+          f"（{(total_before - total_after) / total_before:.0%}），处理后共 {total_after:.1f}秒")
+
+
+if __name__ == "__main__":
+    main()
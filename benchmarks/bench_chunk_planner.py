@@ -0,0 +1,75 @@
+"""
+TTS合成单元规划基准测试
+
+统计真实小说文本按逗号切分后的推理次数，与合并相邻短片段后的推理次数对比，
+并用简单的耗时模型（每次调用固定开销 + 每字耗时）估算合成时间
+
+用法：
+    python benchmarks/bench_chunk_planner.py
+    python benchmarks/bench_chunk_planner.py --input novel.txt --budgets 0 20 30 40
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from text_segmenter import clean_input_text, split_parent_scenes, split_child_scenes, clean_text_for_tts
+from tts_chunk_planner import plan_chunks
+
+
+def load_novel(input_path):
+    """读取小说文本，未指定时使用示例项目的字幕原文"""
+    if input_path:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    texts = []
+    for subtitle_file in sorted((PROJECT_ROOT / "projects").glob("*/Audio/Subtitles.json")):
+        with open(subtitle_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        texts.extend(parent['text'] for parent in data.get('parent_scenes', []))
+    return "".join(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TTS合成单元规划基准测试')
+    parser.add_argument('--input', '-i', help='小说文本文件（默认使用示例项目）')
+    parser.add_argument('--budgets', type=int, nargs='+', default=[0, 15, 20, 30, 40],
+                        help='每次合成的字数上限（0表示不合并）')
+    parser.add_argument('--call-overhead', type=float, default=0.35, help='每次推理的固定开销（秒）')
+    parser.add_argument('--per-char', type=float, default=0.05, help='每字推理耗时（秒）')
+    args = parser.parse_args()
+
+    text = clean_input_text(load_novel(args.input))
+    texts = []
+    groups = []
+    for parent_idx, parent_text in enumerate(split_parent_scenes(text), 1):
+        for child_text in split_child_scenes(parent_text):
+            texts.append(clean_text_for_tts(child_text))
+            groups.append(parent_idx)
+
+    print("=" * 72)
+    print(f"TTS合成单元规划: {len(text)} 字，{groups[-1] if groups else 0} 个父分镜，{len(texts)} 个子分镜")
+    print("=" * 72)
+    print(f"{'字数上限':>8} {'推理次数':>8} {'减少':>8} {'平均字数':>8} {'≤2字调用':>9} {'估算耗时':>10}")
+
+    baseline = None
+    for budget in args.budgets:
+        chunks = plan_chunks(texts, groups=groups, max_chars=budget)
+        lengths = [sum(len(texts[i]) for i in chunk) for chunk in chunks]
+        tiny = sum(1 for n in lengths if n <= 2)
+        est = len(chunks) * args.call_overhead + sum(lengths) * args.per_char
+        if baseline is None:
+            baseline = (len(chunks), est)
+        reduction = 1 - len(chunks) / baseline[0]
+        label = str(budget) if budget > 0 else "不合并"
+        print(f"{label:>8} {len(chunks):>8} {reduction:>8.0%} {sum(lengths) / len(chunks):>8.1f} "
+              f"{tiny:>9} {est:>9.1f}秒")
+
+    print(f"\n耗时模型: 每次调用 {args.call_overhead}秒 + 每字 {args.per_char}秒")
+
+
+if __name__ == "__main__":
+    main()
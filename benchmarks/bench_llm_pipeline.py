@@ -0,0 +1,182 @@
+"""
+LLM流程端到端基准测试（本地模拟服务）
+
+启动 tools/mock_llm_server.py 的模拟服务，把 kimi_base_url 指向它，然后端到端运行：
+- PromptGenerator.generate_prompts（元数据 + 并发批次，流式解析、补充请求等全部真实执行）
+- Agent 主循环（NovelToVideoAgent，LLM思考/决策真实执行，工具用固定耗时的模拟函数代替）
+可注入延迟、500错误、429、截断的JSON、少返回分镜的批次，比较不同并发数下的耗时、请求数和补全情况，
+上线前离线调整并发、重试、熔断和对冲参数
+
+用法：
+    python benchmarks/bench_llm_pipeline.py
+    python benchmarks/bench_llm_pipeline.py --scenes 300 --in-flight 1 3 5 10 --latency 0.5 --decode 0.005
+    python benchmarks/bench_llm_pipeline.py --error-rate 0.1 --short-rate 0.3 --truncate-rate 0.1 --rpm 60
+    python benchmarks/bench_llm_pipeline.py --jitter 0.8 --hedge
+    python benchmarks/bench_llm_pipeline.py --fixtures cache/llm_responses   # 回放录制的回复
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+import kimi_api
+from app_config import load_config
+from mock_llm_server import MockLLMServer
+
+WORDS = "林默走过来看着窗外的雨点了点头转身离开办公室电梯里很安静她想起昨天的会议"
+
+
+def load_subtitles(scenes):
+    """读取示例项目的字幕，指定 scenes 时生成对应数量的父分镜"""
+    if not scenes:
+        for subtitle_file in sorted((PROJECT_ROOT / "projects").glob("*/Audio/Subtitles.json")):
+            with open(subtitle_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        scenes = 50
+    parent_scenes = []
+    for i in range(scenes):
+        start = (i * 7) % len(WORDS)
+        text = (WORDS * 2)[start:start + 12 + i % 20] + "。"
+        parent_scenes.append({"parent_index": i + 1, "text": text})
+    return {"parent_scenes": parent_scenes, "total_child_scenes": scenes}
+
+
+@contextlib.contextmanager
+def quiet(verbose):
+    if verbose:
+        yield
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+
+def run_prompts(subtitle_file, in_flight, verbose):
+    from generate_prompts import PromptGenerator
+
+    generator = PromptGenerator("bench_llm_pipeline", max_in_flight=in_flight)
+    snapshot = kimi_api.get_stats()
+    start = time.perf_counter()
+    with quiet(verbose):
+        result = generator.generate_prompts(subtitle_file)
+    elapsed = time.perf_counter() - start
+    return elapsed, kimi_api.stats_since(snapshot), generator.stats, len(result['scene_prompts'])
+
+
+def run_agent(tool_time, verbose):
+    from agent import NovelToVideoAgent
+
+    def simulated_tool(name):
+        def tool(**kwargs):
+            time.sleep(tool_time)
+            if name == "evaluate_quality":
+                return {"overall_score": 0.9, "issues": []}
+            if name == "inspect_project":
+                return {"status": "success", "steps_completed": []}
+            return {"status": "success", "video_path": "output.mp4"}
+        return tool
+
+    tools = {name: simulated_tool(name) for name in [
+        "inspect_project", "generate_audio", "generate_prompts", "generate_images",
+        "compose_video", "evaluate_quality", "adjust_parameters"
+    ]}
+    agent = NovelToVideoAgent(kimi_api.get_kimi_api(), tools)
+    snapshot = kimi_api.get_stats()
+    start = time.perf_counter()
+    with quiet(verbose):
+        result = agent.run("bench_llm_pipeline", "测试小说", quality_target=0.8)
+    elapsed = time.perf_counter() - start
+    steps = len(agent.memory["history"])
+    return elapsed, kimi_api.stats_since(snapshot), steps, result["quality_score"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM流程端到端基准测试（本地模拟服务）')
+    parser.add_argument('--scenes', type=int, default=0, help='父分镜数（默认使用示例项目的字幕）')
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[1, 5], help='批次生成的并发请求数')
+    parser.add_argument('--repeat', type=int, default=1, help='每种并发数的运行次数')
+    parser.add_argument('--fixtures', help='录制目录（LLM响应缓存格式）')
+    parser.add_argument('--latency', type=float, default=0.3, help='模拟接口每个请求的固定延迟（秒）')
+    parser.add_argument('--prefill', type=float, default=0.02, help='每1000个输入token的耗时（秒）')
+    parser.add_argument('--decode', type=float, default=0.002, help='每个输出token的耗时（秒）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟随机浮动比例')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的概率')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='随机返回429的概率')
+    parser.add_argument('--rpm', type=int, default=0, help='模拟接口每分钟请求数上限（0表示不限）')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429响应的Retry-After（秒）')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='回复被截断的概率')
+    parser.add_argument('--short-rate', type=float, default=0.0, help='提示词批次少返回分镜的概率')
+    parser.add_argument('--client-rpm', type=int, default=600, help='客户端限速器的每分钟请求数')
+    parser.add_argument('--hedge', action='store_true', help='开启对冲请求（kimi_hedge_enabled）')
+    parser.add_argument('--agent-runs', type=int, default=1, help='Agent主循环运行次数（0表示跳过）')
+    parser.add_argument('--tool-time', type=float, default=0.05, help='Agent模拟工具的耗时（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--verbose', '-v', action='store_true', help='显示流程日志')
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        fixtures=args.fixtures, latency=args.latency, prefill_per_1k=args.prefill,
+        decode_per_token=args.decode, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, requests_per_minute=args.rpm, retry_after=args.retry_after,
+        truncate_rate=args.truncate_rate, short_rate=args.short_rate, seed=args.seed
+    ).start()
+
+    # 指向模拟服务；关闭缓存，避免回放自己的回复
+    config = load_config()
+    config.update({
+        "kimi_api_key": config.get("kimi_api_key") or "mock",
+        "kimi_base_url": server.base_url,
+        "llm_cache_enabled": False,
+        "kimi_requests_per_minute": args.client_rpm,
+        "kimi_burst": max(1, args.client_rpm // 60),
+        "kimi_hedge_enabled": args.hedge,
+    })
+
+    # PromptGenerator 按相对路径读取PE
+    os.chdir(PROJECT_ROOT)
+    subtitles = load_subtitles(args.scenes)
+    total = len(subtitles['parent_scenes'])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        subtitle_file = Path(tmp) / "Subtitles.json"
+        with open(subtitle_file, 'w', encoding='utf-8') as f:
+            json.dump(subtitles, f, ensure_ascii=False)
+
+        print("=" * 96)
+        print(f"提示词生成: {total} 个父分镜，模拟服务 {server.base_url}")
+        print("=" * 96)
+        print(f"{'并发':>4} {'耗时':>8} {'请求':>5} {'失败':>5} {'429':>4} {'重试':>4} {'对冲':>4} {'首字节':>7} "
+              f"{'保留':>5} {'重新请求':>8} {'补全':>5} {'提示词':>8}")
+        for in_flight in args.in_flight:
+            for _ in range(args.repeat):
+                elapsed, llm, stats, count = run_prompts(subtitle_file, in_flight, args.verbose)
+                avg_ttfb = llm['ttfb_time'] / llm['requests'] if llm['requests'] else 0.0
+                print(f"{in_flight:>4} {elapsed:>7.2f}s {llm['requests']:>5} {llm['errors']:>5} "
+                      f"{llm['rate_limited']:>4} {llm['retries']:>4} {llm['hedged']:>4} "
+                      f"{avg_ttfb:>6.2f}s {stats['salvaged']:>5} "
+                      f"{stats['retried']:>8} {stats['fallback']:>5} {count:>4}/{total}")
+
+    if args.agent_runs > 0:
+        print("\n" + "=" * 96)
+        print(f"Agent主循环: 模拟工具每次 {args.tool_time}秒")
+        print("=" * 96)
+        print(f"{'运行':>4} {'耗时':>8} {'LLM请求':>8} {'LLM耗时':>8} {'步骤':>5} {'质量':>6}")
+        for run in range(1, args.agent_runs + 1):
+            elapsed, llm, steps, quality = run_agent(args.tool_time, args.verbose)
+            print(f"{run:>4} {elapsed:>7.2f}s {llm['requests']:>8} {llm['total_time']:>7.2f}s "
+                  f"{steps:>5} {quality:>6.2f}")
+
+    print(f"\n模拟服务统计: {json.dumps(server.stats, ensure_ascii=False)}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+分块元数据提取基准测试
+
+用合成的长篇小说（含固定的角色表）和本地模拟的OpenAI兼容接口对比：
+- 整篇一次请求（moonshot-v1-128k），超出上下文时接口返回400
+- 分块并行提取（map）+ 本地合并（reduce）
+模拟接口的耗时 = 输入token数 × 预填充耗时 + 输出token数 × 生成耗时，
+每块回复中的角色描述偶尔与角色表不同，用来检验合并时的去重和投票
+
+用法：
+    python benchmarks/bench_metadata_mapreduce.py
+    python benchmarks/bench_metadata_mapreduce.py --scenes 4000 --chunk-tokens 8000 16000 32000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from app_config import load_config
+from generate_prompts import PromptGenerator
+from prompt_batch_planner import estimate_tokens
+
+WORDS = "说道走过来看着笑了点头转身离开山门大殿长剑月光夜色云雾石阶风声心中暗想"
+
+# 合成小说的角色表：(名字, 外貌, 服装, 出场权重)
+CHARACTERS = [
+    ("林默", "young woman in her 20s, black long hair", "white long-sleeved robe, blue ankle-length skirt, white shoes", 10),
+    ("清微剑尊", "middle-aged man, white long hair", "blue long-sleeved robe, black long pants, black cloth shoes", 6),
+    ("殷烬", "young man in his 20s, black long hair", "black long-sleeved robe, black long pants, black boots", 5),
+    ("顾念", "young woman in her 20s, brown shoulder-length hair", "pink short-sleeved blouse, gray knee-length skirt, white sneakers", 3),
+    ("李教授", "old man, gray short hair", "gray long-sleeved jacket, black long trousers, brown shoes", 2),
+    ("老师傅", "middle-aged man, black short hair", "blue long-sleeved shirt, gray long pants, black shoes", 2),
+    ("小桃", "teenage girl, black shoulder-length hair", "green short-sleeved blouse, green knee-length skirt, red shoes", 1),
+    ("张昊", "young man in his 20s, black short hair", "black long-sleeved shirt, gray long pants, black shoes", 1),
+]
+
+MODEL_CONTEXTS = {"moonshot-v1-8k": 8192, "moonshot-v1-32k": 32768, "moonshot-v1-128k": 131072}
+
+
+def make_scenes(count, seed=0):
+    """生成父分镜文本，按权重提到角色"""
+    rng = random.Random(seed)
+    names = [c[0] for c in CHARACTERS]
+    weights = [c[3] for c in CHARACTERS]
+    scenes = []
+    for _ in range(count):
+        name = rng.choices(names, weights)[0]
+        body = "".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+        scenes.append(f"{name}{body}。")
+    return scenes
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """模拟 /chat/completions：从小说内容中找出现的角色，返回元数据JSON"""
+    protocol_version = 'HTTP/1.1'
+    prefill_per_1k = 0.02
+    decode_per_token = 0.002
+    requests = 0
+    lock = threading.Lock()
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        payload = json.loads(self.rfile.read(length))
+        content = payload['messages'][-1]['content']
+        with MockLLMHandler.lock:
+            MockLLMHandler.requests += 1
+            request_id = MockLLMHandler.requests
+
+        input_tokens = estimate_tokens(content)
+        context = MODEL_CONTEXTS.get(payload.get('model'), 131072)
+        if input_tokens > context:
+            self._reply(400, {"error": {"message": f"Invalid request: exceeded model token limit: {context}",
+                                        "type": "invalid_request_error"}})
+            return
+
+        novel = content.split("---", 1)[-1]
+        rng = random.Random(request_id)
+        characters = []
+        for name, appearance, clothing, _ in CHARACTERS:
+            if name not in novel:
+                continue
+            # 偶尔给出不同的描述或带注释的名字，合并时应按多数和规范化名字处理
+            if rng.random() < 0.15:
+                clothing = "red long-sleeved robe, red long pants, red shoes"
+            if rng.random() < 0.1:
+                name = f"{name}（主角）"
+            characters.append({"name": name, "appearance": appearance, "clothing": clothing})
+        metadata = {
+            "story_metadata": {"title": "合成小说", "genre": "玄幻", "theme_tags": ["古风", "修仙", "女主"]},
+            "global_settings": {"characters": characters}
+        }
+        reply = "```json\n" + json.dumps(metadata, ensure_ascii=False, indent=2) + "\n```"
+
+        time.sleep(input_tokens / 1000 * self.prefill_per_1k + estimate_tokens(reply) * self.decode_per_token)
+        self._reply(200, {"choices": [{"message": {"role": "assistant", "content": reply}}]})
+
+    def log_message(self, *args):
+        pass
+
+
+def run(generator, scenes, chunk_tokens):
+    """返回 (耗时, 请求数, 元数据或None)"""
+    load_config()["metadata_chunk_tokens"] = chunk_tokens
+    before = MockLLMHandler.requests
+    start = time.perf_counter()
+    try:
+        metadata = generator.generate_metadata({"parent_scenes": [{"text": t} for t in scenes]})
+    except Exception as e:
+        print(f"  ❌ {e}")
+        metadata = None
+    return time.perf_counter() - start, MockLLMHandler.requests - before, metadata
+
+
+def score(metadata):
+    """角色召回数，以及外貌/服装与角色表一致的数量"""
+    if not metadata:
+        return 0, 0
+    truth = {c[0]: (c[1], c[2]) for c in CHARACTERS}
+    found = metadata['global_settings']['characters']
+    recalled = [c for c in found if c['name'] in truth]
+    exact = sum(1 for c in recalled if (c['appearance'], c['clothing']) == truth[c['name']])
+    return len(recalled), exact
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分块元数据提取基准测试')
+    parser.add_argument('--scenes', type=int, nargs='+', default=[2000, 8000, 20000], help='父分镜数')
+    parser.add_argument('--chunk-tokens', type=int, nargs='+', default=[16000], help='每块token数')
+    parser.add_argument('--prefill', type=float, default=0.02, help='模拟接口每1k输入token的耗时（秒）')
+    parser.add_argument('--decode', type=float, default=0.002, help='模拟接口每个输出token的耗时（秒）')
+    args = parser.parse_args()
+
+    MockLLMHandler.prefill_per_1k = args.prefill
+    MockLLMHandler.decode_per_token = args.decode
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # 指向模拟接口，关闭缓存，放开限速
+    config = load_config()
+    config.update({"kimi_api_key": "mock", "llm_cache_enabled": False,
+                   "kimi_base_url": f"http://127.0.0.1:{server.server_port}/v1",
+                   "kimi_requests_per_minute": 60000, "kimi_burst": 100})
+
+    # PromptGenerator 按相对路径读取PE
+    os.chdir(PROJECT_ROOT)
+    generator = PromptGenerator("bench_metadata")
+
+    rows = []
+    for count in args.scenes:
+        scenes = make_scenes(count)
+        tokens = sum(estimate_tokens(t) for t in scenes)
+        for chunk_tokens in [0] + args.chunk_tokens:
+            label = "整篇" if chunk_tokens == 0 else f"分块{chunk_tokens}"
+            print(f"\n---- {count} 个父分镜（约 {tokens} tokens），{label} ----")
+            elapsed, requests, metadata = run(generator, scenes, chunk_tokens)
+            rows.append((count, tokens, label, elapsed, requests, metadata))
+
+    print("\n" + "=" * 80)
+    print(f"{'父分镜':>8} {'tokens':>9} {'方式':>10} {'耗时':>8} {'请求':>5} {'角色':>10} {'描述正确':>8}")
+    print("=" * 80)
+    for count, tokens, label, elapsed, requests, metadata in rows:
+        recalled, exact = score(metadata)
+        status = f"{recalled}/{len(CHARACTERS)}" if metadata else "失败"
+        print(f"{count:>8} {tokens:>9} {label:>10} {elapsed:>7.1f}s {requests:>5} {status:>10} {exact:>8}")
+    print(f"\n模拟接口: 每1k输入token {args.prefill}秒，每个输出token {args.decode}秒")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
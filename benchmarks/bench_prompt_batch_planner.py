@@ -0,0 +1,114 @@
+"""
+提示词批次规划基准测试
+
+用已录制的项目（Audio/Subtitles.json 的父分镜 + Prompts.json 中的元数据和生成结果）对比：
+- 原实现：每批固定5个父分镜，全部使用 moonshot-v1-32k
+- 批次规划：按token预算打包，每批选择放得下的最便宜模型
+统计请求数和估算的输入token数（PE等固定输入每个请求都要发送一遍），
+并用录制的提示词校验每个分镜的预计输出token数
+
+用法：
+    python benchmarks/bench_prompt_batch_planner.py
+    python benchmarks/bench_prompt_batch_planner.py --input novel.txt --max-output 4000 8000
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from generate_prompts import PromptGenerator
+from prompt_batch_planner import (
+    estimate_tokens, plan_prompt_batches, fixed_size_batches, model_budgets,
+    FIXED_BATCH_SIZE, DEFAULT_OUTPUT_TOKENS_PER_SCENE, LINE_OVERHEAD
+)
+from text_segmenter import clean_input_text, split_parent_scenes
+
+
+def load_fixtures(input_path):
+    """
+    读取录制的项目
+
+    Returns:
+        list: (名称, 元数据, 父分镜文本列表, 录制的提示词列表)
+    """
+    fixtures = []
+    for prompts_file in sorted((PROJECT_ROOT / "projects").glob("*/Prompts.json")):
+        subtitle_file = prompts_file.parent / "Audio" / "Subtitles.json"
+        if not subtitle_file.exists():
+            continue
+        with open(prompts_file, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+        with open(subtitle_file, 'r', encoding='utf-8') as f:
+            subtitles = json.load(f)
+        texts = [scene['text'] for scene in subtitles.get('parent_scenes', [])]
+        fixtures.append((prompts_file.parent.name, recorded, texts, recorded.get('scene_prompts', [])))
+
+    if input_path and fixtures:
+        # 外部小说使用第一个项目的元数据
+        with open(input_path, 'r', encoding='utf-8') as f:
+            texts = split_parent_scenes(clean_input_text(f.read()))
+        fixtures.append((Path(input_path).name, fixtures[0][1], texts, []))
+    return fixtures
+
+
+def measure_output(prompts):
+    """录制的提示词平均每个分镜的输出token数（按JSON元素计）"""
+    if not prompts:
+        return None
+    return sum(estimate_tokens(json.dumps(p, ensure_ascii=False, indent=2)) for p in prompts) / len(prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='提示词批次规划基准测试')
+    parser.add_argument('--input', '-i', help='额外的小说文本文件（使用第一个项目的元数据）')
+    parser.add_argument('--max-output', type=int, nargs='+', default=[4000],
+                        help='每个请求的输出上限（可比较多个值）')
+    parser.add_argument('--max-scenes', type=int, default=40, help='每批最多的分镜数（0表示不限）')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.input)
+    if not fixtures:
+        print("❌ 没有找到录制的项目（projects/*/Prompts.json + Audio/Subtitles.json）")
+        return
+
+    # PromptGenerator 按相对路径读取PE
+    os.chdir(PROJECT_ROOT)
+    generator = PromptGenerator(fixtures[0][0])
+    budgets = model_budgets()
+
+    print("=" * 96)
+    print("提示词批次规划")
+    print(f"模型预算: {', '.join(f'{m} {b}' for m, b in budgets.items())}")
+    print("=" * 96)
+
+    for name, metadata, texts, recorded in fixtures:
+        fixed_tokens = estimate_tokens(generator._batch_messages(metadata, [])[0]['content'])
+        scene_tokens = sum(estimate_tokens(t) + LINE_OVERHEAD for t in texts)
+        measured = measure_output(recorded)
+        print(f"\n{name}: {len(texts)} 个父分镜，分镜文本约 {scene_tokens} tokens，每个请求固定输入约 {fixed_tokens} tokens")
+        if measured is not None:
+            print(f"  录制的提示词平均 {measured:.0f} tokens/分镜（规划按 {DEFAULT_OUTPUT_TOKENS_PER_SCENE} 预估）")
+
+        fixed_requests = fixed_size_batches(len(texts))
+        fixed_input = fixed_requests * fixed_tokens + scene_tokens
+        print(f"  {'方案':<16} {'请求数':>6} {'节省':>6} {'输入tokens':>11} {'节省':>6}  模型")
+        print(f"  {f'固定每批{FIXED_BATCH_SIZE}个':<14} {fixed_requests:>6} {'':>6} {fixed_input:>11} {'':>6}  "
+              f"moonshot-v1-32k ×{fixed_requests}")
+
+        for max_output in args.max_output:
+            plan = plan_prompt_batches(texts, fixed_tokens, budgets=budgets, max_output_tokens=max_output,
+                                       max_scenes=args.max_scenes)
+            planned_input = sum(b['input_tokens'] for b in plan)
+            models = ", ".join(f"{m} ×{n}" for m, n in Counter(b['model'] for b in plan).items())
+            label = f"规划(输出≤{max_output})"
+            print(f"  {label:<14} {len(plan):>6} {1 - len(plan) / fixed_requests:>6.0%} {planned_input:>11} "
+                  f"{1 - planned_input / fixed_input:>6.0%}  {models}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+SDXL提示词编码缓存基准测试
+
+使用随机初始化的小型 StableDiffusionXLPipeline（结构与SDXL相同）在指定设备上运行：
+- 一致性：单段提示词经 PromptEncoder 编码的结果与 pipe.encode_prompt（clip_skip=2）的差异
+- 耗时：每张图都由管线重新编码“质量标签 BREAK 分镜提示词”和负面词（原方式），
+        对比按片段缓存（负面词和质量标签只编码一次）；再跑一轮模拟同一进程内重生图像（全部命中）
+
+用法：
+    python benchmarks/bench_prompt_embeddings.py
+    python benchmarks/bench_prompt_embeddings.py --scenes 64 --device cuda
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from prompt_embeddings import NEGATIVE_PROMPT, QUALITY_TAGS, CLIP_SKIP, PromptEncoder, clear_cache
+
+
+def scene_prompts(count):
+    return [f"1girl, solo, scene {i}, long hair, school uniform, classroom, window, sunlight" for i in range(count)]
+
+
+def check_equivalence(pipe, device):
+    """单段提示词：缓存编码与diffusers的encode_prompt的最大差异"""
+    encoder = PromptEncoder(pipe)
+    prompt = scene_prompts(1)[0]
+    embeds, pooled = encoder.encode_chunk(prompt, CLIP_SKIP, "检查")
+    negative_embeds, negative_pooled = encoder.encode_chunk(NEGATIVE_PROMPT, None, "检查")
+    reference = pipe.encode_prompt(prompt, device, 1, True, negative_prompt=NEGATIVE_PROMPT, clip_skip=CLIP_SKIP)
+    ours = (embeds, negative_embeds, pooled, negative_pooled)
+    return max(float((a - b).abs().max()) for a, b in zip(ours, reference))
+
+
+def run_uncached(pipe, device, prompts):
+    """原方式：每张图由管线重新编码完整提示词和负面词"""
+    start = time.perf_counter()
+    for prompt in prompts:
+        pipe.encode_prompt(f"{QUALITY_TAGS}, BREAK {prompt}", device, 1, True,
+                           negative_prompt=NEGATIVE_PROMPT, clip_skip=CLIP_SKIP)
+    return time.perf_counter() - start
+
+
+def run_cached(pipe, prompts):
+    start = time.perf_counter()
+    encoder = PromptEncoder(pipe)
+    for prompt in prompts:
+        encoder.pipeline_kwargs([prompt])
+    return time.perf_counter() - start, encoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SDXL提示词编码缓存基准测试')
+    parser.add_argument('--scenes', type=int, default=32, help='分镜数')
+    parser.add_argument('--device', type=str, default='cpu', help='运行设备')
+    args = parser.parse_args()
+
+    from bench_sdxl_pipeline import tiny_pipeline
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pipe = tiny_pipeline(tmp, args.device)
+        diff = check_equivalence(pipe, args.device)
+        clear_cache()
+
+        prompts = scene_prompts(args.scenes)
+        uncached = run_uncached(pipe, args.device, prompts)
+        cold, cold_encoder = run_cached(pipe, prompts)
+        warm, warm_encoder = run_cached(pipe, prompts)
+
+    print("\n" + "=" * 70)
+    print(f"提示词编码：{args.scenes} 个分镜，设备 {args.device}")
+    print("=" * 70)
+    print(f"{'方式':<16} {'总耗时':>10} {'每张':>10} {'加速':>8}")
+    for label, elapsed in [("每张重新编码", uncached), ("缓存（首次）", cold), ("缓存（重生）", warm)]:
+        print(f"{label:<16} {elapsed:>9.3f}s {elapsed / args.scenes * 1000:>8.2f}ms {uncached / elapsed:>7.1f}x")
+
+    print("\n缓存（首次）各阶段:")
+    cold_encoder.print_timing()
+    print("缓存（重生）各阶段:")
+    warm_encoder.print_timing()
+    print(f"\n与 encode_prompt 的最大差异: {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
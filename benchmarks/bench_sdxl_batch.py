@@ -0,0 +1,127 @@
+"""
+SDXL批量生成基准测试
+
+对比逐张生成（批大小1）与不同批大小的吞吐（张/分钟），并检查批量生成的图像与逐张生成是否一致：
+--pipeline stub 使用桩管线（不依赖torch）：每步耗时 = 固定开销 + 每张耗时 × 批大小^并行指数，
+                批大小超过 --oom-above 时抛出显存不足，用来检验自动减小批次；
+                "图像"由各自种子的随机数生成器产生，检验每个提示词使用自己的种子
+--pipeline tiny 使用随机初始化的小型 StableDiffusionXLPipeline 在CPU上运行（Euler Ancestral调度器，
+                每步都会采样噪声），比较批量与逐张生成的像素差
+
+用法：
+    python benchmarks/bench_sdxl_batch.py
+    python benchmarks/bench_sdxl_batch.py --pipeline tiny --images 8 --batch-sizes 1 2 4
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from sdxl_batch import BatchImageGenerator
+
+
+class OutOfMemoryError(RuntimeError):
+    """与 torch.cuda.OutOfMemoryError 同名，按类名识别"""
+
+
+class StubPipeline:
+    """模拟批量推理耗时和显存上限的桩管线"""
+
+    def __init__(self, step_overhead, per_image, exponent, oom_above):
+        self.step_overhead = step_overhead
+        self.per_image = per_image
+        self.exponent = exponent
+        self.oom_above = oom_above
+        self.calls = 0
+
+    def __call__(self, prompt, generator, num_inference_steps=12, **kwargs):
+        self.calls += 1
+        if self.oom_above and len(prompt) > self.oom_above:
+            raise OutOfMemoryError("CUDA out of memory (stub)")
+        time.sleep(num_inference_steps * (self.step_overhead + self.per_image * len(prompt) ** self.exponent))
+        # 每张"图像"只由自己的生成器决定
+        images = [tuple(g.random() for _ in range(num_inference_steps)) for g in generator]
+        return type("Output", (), {"images": images})()
+
+
+def run(pipe, jobs, batch_size, make_generator, pipe_kwargs, max_batch_size=None, memory_probe=None):
+    generator = BatchImageGenerator(pipe, device="cpu", batch_size=batch_size,
+                                    max_batch_size=max_batch_size or batch_size,
+                                    memory_probe=memory_probe, make_generator=make_generator,
+                                    clear_cache=lambda: None)
+    images = generator.generate(jobs, **pipe_kwargs)
+    return images, generator
+
+
+def compare(reference, images):
+    """与逐张生成结果的最大差异（桩管线为0或1，小型管线为像素最大绝对差）"""
+    try:
+        import numpy as np
+        return max(float(np.abs(np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)).max())
+                   for a, b in zip(reference, images))
+    except ImportError:
+        return float(any(a != b for a, b in zip(reference, images)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SDXL批量生成基准测试')
+    parser.add_argument('--pipeline', choices=['stub', 'tiny'], default='stub', help='桩管线或随机初始化的小型管线')
+    parser.add_argument('--images', type=int, default=16, help='生成张数')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8], help='比较的批大小')
+    parser.add_argument('--steps', type=int, default=12, help='推理步数')
+    parser.add_argument('--step-overhead', type=float, default=0.004, help='桩管线每步固定开销（秒）')
+    parser.add_argument('--per-image', type=float, default=0.006, help='桩管线每步每张图耗时（秒）')
+    parser.add_argument('--exponent', type=float, default=0.7, help='桩管线批大小的并行指数（<1表示批量更高效）')
+    parser.add_argument('--oom-above', type=int, default=4, help='桩管线批大小超过该值时显存不足（0表示不限制）')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    jobs = [{"prompt": f"1girl, scene {i}, standing", "seed": rng.randint(0, 2**32 - 1)} for i in range(args.images)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.pipeline == "tiny":
+            import torch
+            from diffusers import EulerAncestralDiscreteScheduler
+            from bench_sdxl_pipeline import tiny_pipeline
+
+            pipe = tiny_pipeline(tmp)
+            pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(pipe.scheduler.config)
+            pipe.set_progress_bar_config(disable=True)
+            make_generator = lambda seed: torch.Generator(device="cpu").manual_seed(seed)
+            pipe_kwargs = {"negative_prompt": "lowres, bad anatomy", "num_inference_steps": args.steps,
+                           "guidance_scale": 2.5, "width": 64, "height": 64, "output_type": "np"}
+        else:
+            pipe = StubPipeline(args.step_overhead, args.per_image, args.exponent, args.oom_above)
+            make_generator = random.Random
+            pipe_kwargs = {"num_inference_steps": args.steps}
+
+        rows = []
+        reference = None
+        for batch_size in args.batch_sizes:
+            images, generator = run(pipe, jobs, batch_size, make_generator, pipe_kwargs)
+            if reference is None:
+                reference = images
+            rows.append((f"{batch_size}", generator, compare(reference, images)))
+
+        # 自动选择：模拟加载模型后剩余 5GB 显存，上限为比较的最大批大小
+        images, generator = run(pipe, jobs, 0, make_generator, pipe_kwargs,
+                                max_batch_size=max(args.batch_sizes), memory_probe=lambda device: 5000)
+        rows.append((f"自动({generator.stats['batch_size']})", generator, compare(reference, images)))
+
+    print("\n" + "=" * 78)
+    print(f"{args.pipeline} 管线：{args.images} 张，{args.steps} 步")
+    print("=" * 78)
+    print(f"{'批大小':<10} {'耗时':>8} {'张/分钟':>10} {'批次':>6} {'OOM回退':>8} {'与逐张最大差异':>14}")
+    for label, generator, diff in rows:
+        stats = generator.stats
+        print(f"{label:<10} {stats['elapsed']:>7.2f}s {generator.images_per_minute:>10.1f} "
+              f"{stats['batches']:>6} {stats['oom_backoffs']:>8} {diff:>14.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+SDXL冷启动基准测试：单文件checkpoint vs diffusers快照
+
+每次加载都在新的子进程中进行（模拟服务重启后的第一次加载），分别统计：
+- 加载：from_single_file（每次重新转换模块）或 from_pretrained（快照，safetensors内存映射）并移动到设备
+- 首图：加载后生成第一张小图（1步，512x512）的耗时
+- 峰值内存：子进程的最大常驻内存（Windows上不统计）
+--drop-caches 在每次加载前清空系统文件缓存（需要Linux root权限），否则第二次起文件已在页缓存中
+
+用法：
+    python tools/sdxl_snapshot.py                     # 先转换快照（或使用 --convert）
+    python benchmarks/bench_sdxl_cold_start.py --runs 3
+    python benchmarks/bench_sdxl_cold_start.py --convert --fuse-lora --device cuda
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from sdxl_pipeline import DEFAULT_MODEL_PATH, _load_sdxl, default_loras
+from sdxl_snapshot import convert_snapshot, find_snapshot
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux上ru_maxrss单位为KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode, model, device, first_image):
+    """子进程：加载一次并输出JSON结果"""
+    import torch
+
+    start = time.perf_counter()
+    pipe = _load_sdxl(Path(model), Path(model).parent, device, None)
+    if str(device).startswith("cuda"):
+        torch.cuda.synchronize()
+    result = {"mode": mode, "load": time.perf_counter() - start}
+
+    if first_image:
+        start = time.perf_counter()
+        pipe(prompt="1girl, standing", num_inference_steps=1, guidance_scale=1.0,
+             width=512, height=512, output_type="np")
+        result["first_image"] = time.perf_counter() - start
+    result["peak_rss_mb"] = _peak_rss_mb()
+    print("RESULT " + json.dumps(result))
+
+
+def drop_caches():
+    """清空Linux页缓存，失败时返回False"""
+    try:
+        subprocess.run(["sync"], check=True)
+        with open("/proc/sys/vm/drop_caches", 'w') as f:
+            f.write("3\n")
+        return True
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+
+def run_child(mode, model, device, first_image):
+    command = [sys.executable, __file__, "--child", mode, "--model", str(model), "--device", device]
+    if not first_image:
+        command.append("--no-first-image")
+    output = subprocess.run(command, capture_output=True, text=True, cwd=str(PROJECT_ROOT))
+    for line in output.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    print(output.stdout[-2000:])
+    print(output.stderr[-2000:])
+    raise RuntimeError(f"{mode} 加载失败")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SDXL冷启动基准测试')
+    parser.add_argument('--model', type=str, default=str(DEFAULT_MODEL_PATH), help='单文件checkpoint路径')
+    parser.add_argument('--device', type=str, default='cuda', help='运行设备')
+    parser.add_argument('--runs', type=int, default=3, help='每种方式的加载次数')
+    parser.add_argument('--convert', action='store_true', help='没有可用快照时先转换')
+    parser.add_argument('--fuse-lora', action='store_true', help='使用融合了DMD2 LoRA的快照')
+    parser.add_argument('--drop-caches', action='store_true', help='每次加载前清空系统文件缓存（Linux root）')
+    parser.add_argument('--no-first-image', action='store_true', help='不统计首图耗时')
+    parser.add_argument('--child', type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    first_image = not args.no_first_image
+    if args.child:
+        child(args.child, args.model, args.device, first_image)
+        return
+
+    model = Path(args.model)
+    loras = default_loras() if args.fuse_lora else None
+    manifest = find_snapshot(model, loras)
+    if manifest is None:
+        if not args.convert:
+            print("❌ 没有可用的快照，先运行 python tools/sdxl_snapshot.py 或加 --convert")
+            return
+        start = time.perf_counter()
+        manifest = convert_snapshot(model, loras=loras)
+        print(f"一次性转换耗时: {time.perf_counter() - start:.1f}秒")
+
+    if args.drop_caches and not drop_caches():
+        print("⚠ 无法清空文件缓存（需要Linux root权限），结果为热缓存下的加载耗时")
+        args.drop_caches = False
+
+    results = {"单文件": [], "快照": []}
+    for run in range(args.runs):
+        for label, path in [("单文件", model), ("快照", Path(manifest["path"]))]:
+            if args.drop_caches:
+                drop_caches()
+            result = run_child(label, path, args.device, first_image)
+            results[label].append(result)
+            print(f"  [{run + 1}/{args.runs}] {label}: 加载 {result['load']:.1f}秒")
+
+    print("\n" + "=" * 70)
+    print(f"冷启动（{args.runs} 次，设备 {args.device}，"
+          f"{'清空文件缓存' if args.drop_caches else '热文件缓存'}）")
+    print("=" * 70)
+    print(f"{'方式':<8} {'加载中位数':>10} {'加载最快':>10} {'首图':>8} {'峰值内存':>10}")
+    for label, rows in results.items():
+        loads = [r['load'] for r in rows]
+        first = statistics.median(r['first_image'] for r in rows) if first_image else None
+        rss = max((r['peak_rss_mb'] or 0) for r in rows)
+        print(f"{label:<8} {statistics.median(loads):>9.1f}s {min(loads):>9.1f}s "
+              f"{(f'{first:.2f}s' if first is not None else '-'):>8} "
+              f"{(f'{rss:.0f}MB' if rss else '-'):>10}")
+    speedup = statistics.median(r['load'] for r in results["单文件"]) / \
+        statistics.median(r['load'] for r in results["快照"])
+    print(f"\n快照加载加速: {speedup:.1f}x")
+    if manifest.get("fused_loras"):
+        print(f"快照已融合LoRA: {', '.join(l['name'] for l in manifest['fused_loras'])}")
+
+
+if __name__ == "__main__":
+    main()
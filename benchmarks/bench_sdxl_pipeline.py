@@ -0,0 +1,285 @@
+"""
+常驻SDXL管线基准测试（CPU）
+
+模拟一次编辑会话：批量生成一批分镜 → 逐张重生若干分镜 → 在几组LoRA之间切换风格，
+对比两种方式的总耗时、模型加载次数和LoRA加载次数：
+- 每次重新加载：每个请求都新建管线并加载LoRA，用完即释放（原来的做法）
+- 常驻服务：SDXLPipelineService 只加载一次，LoRA加载后用 set_adapters 切换
+最后检查空闲超时卸载和显存紧张时的卸载
+
+--pipeline stub 使用桩管线（不依赖torch，用固定耗时模拟加载和推理）；
+--pipeline tiny 使用随机初始化的小型 StableDiffusionXLPipeline 在CPU上运行（需要torch、diffusers、transformers、peft）
+
+用法：
+    python benchmarks/bench_sdxl_pipeline.py
+    python benchmarks/bench_sdxl_pipeline.py --pipeline tiny --scenes 4 --regenerations 3
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from sdxl_pipeline import SDXLPipelineService
+
+
+class StubPipeline:
+    """模拟StableDiffusionXLPipeline的加载、LoRA和推理耗时"""
+
+    def __init__(self, lora_time, step_time):
+        self.lora_time = lora_time
+        self.step_time = step_time
+        self.adapters = {}
+        self.active = []
+        self.lora_enabled = True
+
+    def load_lora_weights(self, directory, weight_name=None, adapter_name=None):
+        time.sleep(self.lora_time)
+        self.adapters[adapter_name] = Path(directory) / weight_name
+
+    def delete_adapters(self, names):
+        for name in [names] if isinstance(names, str) else names:
+            self.adapters.pop(name, None)
+
+    def set_adapters(self, names, adapter_weights=None):
+        missing = [name for name in names if name not in self.adapters]
+        if missing:
+            raise ValueError(f"adapter未加载: {missing}")
+        self.active = list(zip(names, adapter_weights))
+
+    def enable_lora(self):
+        self.lora_enabled = True
+
+    def disable_lora(self):
+        self.lora_enabled = False
+
+    def __call__(self, prompt, num_inference_steps=2, **kwargs):
+        time.sleep(self.step_time * num_inference_steps)
+        return type("Output", (), {"images": [None]})()
+
+
+def stub_loader(load_time, lora_time, step_time):
+    def load(model_path, config_dir, device, scheduler):
+        time.sleep(load_time)
+        return StubPipeline(lora_time, step_time)
+    return load
+
+
+# ---------- 随机初始化的小型SDXL管线 ----------
+
+def _tiny_tokenizer(directory):
+    """离线构造CLIP分词器（只含字母、数字和常用标点的字符级词表）"""
+    from transformers import CLIPTokenizer
+
+    chars = list("abcdefghijklmnopqrstuvwxyz0123456789,.!?'-_()")
+    tokens = chars + [c + "</w>" for c in chars] + ["<|startoftext|>", "<|endoftext|>"]
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "vocab.json", 'w', encoding='utf-8') as f:
+        json.dump({token: i for i, token in enumerate(tokens)}, f)
+    with open(directory / "merges.txt", 'w', encoding='utf-8') as f:
+        f.write("#version: 0.2\n")
+    return CLIPTokenizer(str(directory / "vocab.json"), str(directory / "merges.txt"), model_max_length=77)
+
+
+def tiny_pipeline(work_dir, device="cpu"):
+    """随机初始化的小型StableDiffusionXLPipeline（结构与SDXL相同，参数量很小）"""
+    import torch
+    from diffusers import AutoencoderKL, EulerDiscreteScheduler, StableDiffusionXLPipeline, UNet2DConditionModel
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTextModelWithProjection
+
+    torch.manual_seed(0)
+    unet = UNet2DConditionModel(
+        block_out_channels=(32, 64),
+        layers_per_block=2,
+        sample_size=32,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        attention_head_dim=(2, 4),
+        use_linear_projection=True,
+        addition_embed_type="text_time",
+        addition_time_embed_dim=8,
+        transformer_layers_per_block=(1, 2),
+        projection_class_embeddings_input_dim=80,  # 6个时间条件 × 8 + text_encoder_2投影维度32
+        cross_attention_dim=64
+    )
+    scheduler = EulerDiscreteScheduler(
+        beta_start=0.00085, beta_end=0.012, beta_schedule="scaled_linear",
+        steps_offset=1, timestep_spacing="leading"
+    )
+    vae = AutoencoderKL(
+        block_out_channels=[32, 64],
+        in_channels=3,
+        out_channels=3,
+        down_block_types=["DownEncoderBlock2D", "DownEncoderBlock2D"],
+        up_block_types=["UpDecoderBlock2D", "UpDecoderBlock2D"],
+        latent_channels=4,
+        sample_size=128
+    )
+    text_config = CLIPTextConfig(
+        bos_token_id=0, eos_token_id=2, pad_token_id=1, hidden_size=32, intermediate_size=37,
+        layer_norm_eps=1e-05, num_attention_heads=4, num_hidden_layers=5, vocab_size=1000,
+        hidden_act="gelu", projection_dim=32
+    )
+    tokenizer = _tiny_tokenizer(Path(work_dir) / "tokenizer")
+    pipe = StableDiffusionXLPipeline(
+        vae=vae,
+        text_encoder=CLIPTextModel(text_config),
+        text_encoder_2=CLIPTextModelWithProjection(text_config),
+        tokenizer=tokenizer,
+        tokenizer_2=tokenizer,
+        unet=unet,
+        scheduler=scheduler
+    )
+    return pipe.to(device)
+
+
+def make_tiny_loras(work_dir, names):
+    """给小型管线的UNet生成随机LoRA并保存为safetensors，返回 {名称: 路径}"""
+    from diffusers import StableDiffusionXLPipeline
+    from diffusers.utils import convert_state_dict_to_diffusers
+    from peft import LoraConfig
+    from peft.utils import get_peft_model_state_dict
+
+    pipe = tiny_pipeline(work_dir)
+    lora_dir = Path(work_dir) / "loras"
+    paths = {}
+    for name in names:
+        config = LoraConfig(r=4, lora_alpha=4, init_lora_weights=False,
+                            target_modules=["to_q", "to_k", "to_v", "to_out.0"])
+        pipe.unet.add_adapter(config, adapter_name=name)
+        layers = convert_state_dict_to_diffusers(get_peft_model_state_dict(pipe.unet, adapter_name=name))
+        StableDiffusionXLPipeline.save_lora_weights(
+            str(lora_dir), unet_lora_layers=layers, weight_name=f"{name}.safetensors"
+        )
+        pipe.unet.delete_adapters(name)
+        paths[name] = lora_dir / f"{name}.safetensors"
+    return paths
+
+
+def tiny_loader(work_dir):
+    def load(model_path, config_dir, device, scheduler):
+        return tiny_pipeline(work_dir, device)
+    return load
+
+
+# ---------- 会话 ----------
+
+def session_requests(scenes, regenerations, style_switches, lora_sets):
+    """一次编辑会话的请求序列：[(说明, LoRA组合, 生成张数)]"""
+    requests = [("批量生成", lora_sets[0], scenes)]
+    requests += [("单图重生", lora_sets[0], 1)] * regenerations
+    for i in range(style_switches):
+        requests.append(("切换风格", lora_sets[(i + 1) % len(lora_sets)], 1))
+    return requests
+
+
+def run_session(requests, make_service, steps, reload_each):
+    """
+    执行会话中的请求
+
+    Args:
+        reload_each: 每个请求新建管线服务（模拟原来每次加载、用完释放）
+
+    Returns:
+        tuple: (耗时, 模型加载次数, 管线复用次数, LoRA加载次数)
+    """
+    totals = {"loads": 0, "hits": 0, "lora_loads": 0}
+    service = None
+    start = time.perf_counter()
+    for _, loras, images in requests:
+        if service is None or reload_each:
+            service = make_service()
+        snapshot = service.get_stats()
+        with service.acquire(loras) as pipe:
+            for i in range(images):
+                pipe(prompt=f"scene {i}", num_inference_steps=steps, height=64, width=64, output_type="np")
+        delta = service.stats_since(snapshot)
+        for key in totals:
+            totals[key] += delta[key]
+        if reload_each:
+            service.unload()
+    elapsed = time.perf_counter() - start
+    service.unload()
+    return elapsed, totals["loads"], totals["hits"], totals["lora_loads"]
+
+
+def check_eviction(make_loader, model_path):
+    """空闲超时和显存紧张时的卸载"""
+    service = SDXLPipelineService(model_path, device="cpu", idle_timeout=0.5, min_free_memory_mb=0,
+                                  loader=make_loader())
+    with service.acquire():
+        pass
+    time.sleep(1.0)
+    print(f"空闲超时卸载: {'✓' if not service.is_loaded else '❌'} "
+          f"(idle_unloads={service.get_stats()['idle_unloads']})")
+
+    free = {"mb": 8192}
+    service = SDXLPipelineService(model_path, device="cpu", idle_timeout=0, min_free_memory_mb=1024,
+                                  loader=make_loader(), memory_probe=lambda device: free["mb"])
+    with service.acquire():
+        pass
+    kept = service.reclaim() is False and service.is_loaded
+    free["mb"] = 512
+    released = service.reclaim() and not service.is_loaded
+    print(f"显存紧张卸载: {'✓' if kept and released else '❌'} "
+          f"(pressure_unloads={service.get_stats()['pressure_unloads']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='常驻SDXL管线基准测试')
+    parser.add_argument('--pipeline', choices=['stub', 'tiny'], default='stub', help='桩管线或随机初始化的小型管线')
+    parser.add_argument('--scenes', type=int, default=8, help='批量生成的分镜数')
+    parser.add_argument('--regenerations', type=int, default=5, help='单图重生次数')
+    parser.add_argument('--style-switches', type=int, default=4, help='切换风格次数')
+    parser.add_argument('--steps', type=int, default=2, help='每张图的推理步数')
+    parser.add_argument('--load-time', type=float, default=2.0, help='桩管线的模型加载耗时（秒）')
+    parser.add_argument('--lora-time', type=float, default=0.3, help='桩管线每个LoRA的加载耗时（秒）')
+    parser.add_argument('--step-time', type=float, default=0.02, help='桩管线每步推理耗时（秒）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 服务加载前检查模型文件是否存在，这里放一个占位文件
+        model_path = Path(tmp) / "model.safetensors"
+        model_path.touch()
+
+        if args.pipeline == "tiny":
+            lora_paths = make_tiny_loras(tmp, ["dmd2", "style"])
+            make_loader = lambda: tiny_loader(tmp)
+        else:
+            lora_paths = {name: Path(tmp) / f"{name}.safetensors" for name in ["dmd2", "style"]}
+            make_loader = lambda: stub_loader(args.load_time, args.lora_time, args.step_time)
+
+        dmd2 = {"name": "dmd2", "path": str(lora_paths["dmd2"]), "weight": 0.8}
+        style = {"name": "style", "path": str(lora_paths["style"]), "weight": 0.6}
+        lora_sets = [[dmd2], [dmd2, style], []]
+        requests = session_requests(args.scenes, args.regenerations, args.style_switches, lora_sets)
+
+        def make_service():
+            return SDXLPipelineService(model_path, device="cpu", idle_timeout=0, min_free_memory_mb=0,
+                                       loader=make_loader())
+
+        rows = [("每次重新加载", run_session(requests, make_service, args.steps, reload_each=True)),
+                ("常驻服务", run_session(requests, make_service, args.steps, reload_each=False))]
+
+        print("\n" + "=" * 70)
+        print(f"{args.pipeline} 管线：批量 {args.scenes} 张，单图重生 {args.regenerations} 次，"
+              f"切换风格 {args.style_switches} 次，每张 {args.steps} 步")
+        print("=" * 70)
+        print(f"{'方式':<12} {'耗时':>9} {'请求':>6} {'加载':>6} {'复用':>6} {'LoRA加载':>8}")
+        for label, (elapsed, loads, hits, lora_loads) in rows:
+            print(f"{label:<12} {elapsed:>8.2f}s {len(requests):>6} {loads:>6} {hits:>6} {lora_loads:>8}")
+        print(f"\n加速: {rows[0][1][0] / rows[1][1][0]:.1f}x")
+
+        print()
+        check_eviction(make_loader, model_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+结构化输出解析基准测试
+
+用本地模拟服务的回复对比原来的解析方式（split("```json") + json.loads）和 structured_output：
+1. 离线：各类回复（元数据、提示词批次、Agent思考/决策、质量评估、参数调整）分别注入每种格式问题和截断，
+   统计两种方式的解析成功率
+2. 端到端：模拟服务按 --malformed-rate / --truncate-rate 返回不规范的回复，运行提示词生成和Agent主循环，
+   比较原解析、本地修复、本地修复+JSON模式三种方式下的请求数、重新请求的分镜数和解析失败（降级）次数
+
+用法：
+    python benchmarks/bench_structured_output.py
+    python benchmarks/bench_structured_output.py --malformed-rate 0.5 --truncate-rate 0.1 --scenes 200
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+import agent
+import generate_prompts
+import json_stream
+import kimi_api
+import structured_output
+from agent_tools import EVALUATION_SCHEMA, PARAMETERS_SCHEMA
+from app_config import load_config
+from mock_llm_server import MockLLMServer, MALFORMED_KINDS, synthesize_reply, _malform
+from structured_output import parse_json, validate
+
+WORDS = "林默走过来看着窗外的雨点了点头转身离开办公室电梯里很安静她想起昨天的会议"
+
+# 各类请求：(名称, 触发模拟服务合成回复的请求内容, schema)
+REPLY_TYPES = [
+    ("元数据", f"提取角色设定\n---\n{WORDS * 3}", generate_prompts.METADATA_SCHEMA),
+    ("提示词批次", "角色设定：\n- 林默: young woman\n\n请为以下8个字幕生成提示词（必须生成8个）：\n\n"
+                  + "\n".join(f"{i}. {WORDS[i:i + 10]}" for i in range(1, 9)), generate_prompts.BATCH_SCHEMA),
+    ("Agent思考", "请分析当前状态并给出建议", agent.THOUGHT_SCHEMA),
+    ("Agent决策", "决定下一步行动\n已完成步骤: ['generate_audio']", agent.DECISION_SCHEMA),
+    ("质量评估", "请评估图像生成质量", EVALUATION_SCHEMA),
+    ("参数调整", "建议调整生成参数", PARAMETERS_SCHEMA),
+]
+
+
+def legacy_parse(text, schema=None):
+    """原来各调用点的解析方式"""
+    json_str = text.strip()
+    if "```json" in json_str:
+        json_str = json_str.split("```json")[1].split("```")[0]
+    elif "```" in json_str:
+        json_str = json_str.split("```")[1].split("```")[0]
+    data = json.loads(json_str.strip())
+    _, errors = validate(data, schema or {})
+    if errors:
+        raise ValueError(errors[0])
+    return data
+
+
+class ParseCounter:
+    """统计解析调用和失败次数"""
+
+    def __init__(self, parse):
+        self.parse = parse
+        self.calls = 0
+        self.failures = 0
+
+    def __call__(self, text, schema=None):
+        self.calls += 1
+        try:
+            return self.parse(text, schema)
+        except Exception:
+            self.failures += 1
+            raise
+
+
+def succeeds(parse, text, schema):
+    try:
+        parse(text, schema)
+        return True
+    except Exception:
+        return False
+
+
+def offline(samples, seed):
+    """离线：每类回复 × 每种格式问题，统计解析成功率"""
+    rng = random.Random(seed)
+    defects = ["正常"] + MALFORMED_KINDS + ["截断"]
+    print("=" * 96)
+    print(f"离线解析：每格 {samples} 个样本，原解析 / 本地修复 的成功数")
+    print("=" * 96)
+    print(f"{'':>10}" + "".join(f"{d:>16}" for d in defects))
+    for name, prompt, schema in REPLY_TYPES:
+        reply = synthesize_reply(prompt)
+        cells = []
+        for defect in defects:
+            legacy = repaired = 0
+            for _ in range(samples):
+                if defect == "正常":
+                    text = reply
+                elif defect == "截断":
+                    text = reply[:rng.randint(len(reply) // 4, len(reply) * 3 // 4)]
+                else:
+                    text = _malform(reply, kind=defect)
+                legacy += succeeds(legacy_parse, text, schema)
+                repaired += succeeds(parse_json, text, schema)
+            cells.append(f"{legacy}/{repaired}")
+        print(f"{name:>10}" + "".join(f"{c:>16}" for c in cells))
+
+
+@contextlib.contextmanager
+def quiet(verbose):
+    if verbose:
+        yield
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+
+def make_subtitles(scenes):
+    parent_scenes = []
+    for i in range(scenes):
+        start = (i * 7) % len(WORDS)
+        parent_scenes.append({"parent_index": i + 1, "text": (WORDS * 2)[start:start + 12 + i % 20] + "。"})
+    return {"parent_scenes": parent_scenes, "total_child_scenes": scenes}
+
+
+def use_parser(parse):
+    """替换各调用点使用的解析函数"""
+    generate_prompts.parse_json = parse
+    agent.parse_json = parse
+    json_stream.parse_json = parse
+
+
+def run_mode(label, parse, json_mode, subtitle_file, agent_runs, verbose):
+    counter = ParseCounter(parse)
+    use_parser(counter)
+    load_config()["kimi_json_mode"] = json_mode
+
+    snapshot = kimi_api.get_stats()
+    start = time.perf_counter()
+    generator = generate_prompts.PromptGenerator("bench_structured_output")
+    try:
+        with quiet(verbose):
+            result = generator.generate_prompts(subtitle_file)
+        prompts = f"{len(result['scene_prompts'])}"
+    except Exception as e:
+        prompts = f"失败({type(e).__name__})"
+    elapsed = time.perf_counter() - start
+
+    tools = {name: (lambda name: lambda **kwargs: (
+        {"overall_score": 0.9, "issues": []} if name == "evaluate_quality" else {"status": "success"}
+    ))(name) for name in ["inspect_project", "generate_audio", "generate_prompts", "generate_images",
+                          "compose_video", "evaluate_quality", "adjust_parameters"]}
+    steps = 0
+    for _ in range(agent_runs):
+        runner = agent.NovelToVideoAgent(kimi_api.get_kimi_api(), tools)
+        with quiet(verbose):
+            runner.run("bench_structured_output", "测试小说", quality_target=0.8)
+        steps += len(runner.memory["history"])
+
+    llm = kimi_api.stats_since(snapshot)
+    print(f"{label:<16} {elapsed:>7.2f}s {llm['requests']:>5} {generator.stats['retried']:>8} "
+          f"{generator.stats['fallback']:>5} {counter.calls:>6} {counter.failures:>6} {steps:>6} {prompts:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='结构化输出解析基准测试')
+    parser.add_argument('--samples', type=int, default=20, help='离线测试每格的样本数')
+    parser.add_argument('--scenes', type=int, default=200, help='端到端测试的父分镜数')
+    parser.add_argument('--batch-scenes', type=int, default=10, help='每批最多的分镜数（批次越多，注入的问题越多）')
+    parser.add_argument('--malformed-rate', type=float, default=0.3, help='模拟服务返回不规范JSON的概率')
+    parser.add_argument('--truncate-rate', type=float, default=0.05, help='模拟服务截断回复的概率')
+    parser.add_argument('--agent-runs', type=int, default=3, help='Agent主循环运行次数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--verbose', '-v', action='store_true', help='显示流程日志')
+    args = parser.parse_args()
+
+    offline(args.samples, args.seed)
+
+    # 指向模拟服务；关闭缓存，放开限速
+    config = load_config()
+    config.update({"kimi_api_key": "mock", "llm_cache_enabled": False,
+                   "kimi_requests_per_minute": 60000, "kimi_burst": 100,
+                   "prompt_batch_max_scenes": args.batch_scenes})
+    os.chdir(PROJECT_ROOT)
+
+    print("\n" + "=" * 96)
+    print(f"端到端：{args.scenes} 个父分镜，Agent {args.agent_runs} 次，"
+          f"不规范JSON {args.malformed_rate:.0%}，截断 {args.truncate_rate:.0%}")
+    print("=" * 96)
+    print(f"{'方式':<14} {'耗时':>8} {'请求':>5} {'重新请求':>8} {'补全':>5} {'解析':>6} {'失败':>6} "
+          f"{'步骤':>6} {'提示词':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        subtitle_file = Path(tmp) / "Subtitles.json"
+        with open(subtitle_file, 'w', encoding='utf-8') as f:
+            json.dump(make_subtitles(args.scenes), f, ensure_ascii=False)
+
+        for label, parse, json_mode in [("原解析", legacy_parse, False),
+                                        ("本地修复", parse_json, False),
+                                        ("本地修复+JSON模式", parse_json, True)]:
+            # 每种方式使用相同的随机种子，注入的问题相同
+            with MockLLMServer(malformed_rate=args.malformed_rate, truncate_rate=args.truncate_rate,
+                               seed=args.seed) as server:
+                config["kimi_base_url"] = server.base_url
+                kimi_api._client = None
+                run_mode(label, parse, json_mode, subtitle_file, args.agent_runs, args.verbose)
+
+    use_parser(parse_json)
+    print(f"\n解析统计: {json.dumps(structured_output.get_stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+文本分镜切分基准测试
+
+用合成的小说文本（带换行、Markdown符号、引号和各种标点）测试 1MB / 10MB / 50MB 文本的切分吞吐量，对比：
+- 原实现：多次 replace / re.sub 清理，re.split 后构造完整列表
+- 切分引擎（整段文本）：单个字符类正则单遍清理 + 预编译分割正则
+- 切分引擎（流式）：从文件按块读取，边读边产出父分镜和子分镜
+两种实现的输出逐项比较，必须完全一致
+
+用法：
+    python benchmarks/bench_text_segmenter.py
+    python benchmarks/bench_text_segmenter.py --sizes 1 10 --repeat 1
+"""
+import argparse
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from text_segmenter import (
+    clean_input_text, split_parent_scenes, split_child_scenes, clean_text_for_tts,
+    iter_scenes
+)
+
+WORDS = "他说我们走吧天色已经晚了山路不好走她点点头没有说话远处传来几声狗叫月亮从云后面出来"
+PUNCTUATION = ["，", "，", "，", "。", "。", "！", "？", "、", "；", "：", "……", "——", ",", "."]
+
+
+def make_novel(size_mb, seed=0):
+    """生成约 size_mb MB（UTF-8）的小说文本"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    paragraphs = []
+    size = 0
+    while size < target:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            clause = "".join(rng.choice(WORDS) for _ in range(rng.randint(1, 18)))
+            if rng.random() < 0.15:
+                clause = f"「{clause}」"
+            elif rng.random() < 0.1:
+                clause = f"“{clause}”"
+            sentences.append(clause + rng.choice(PUNCTUATION))
+        prefix = rng.choice(["", "", "", "# ", "> ", "- ", "**"])
+        paragraph = prefix + "".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 1
+    return "\n".join(paragraphs)
+
+
+# ---------- 原实现（对照） ----------
+
+def _legacy_valid(s):
+    if not s or len(s) <= 1:
+        return False
+    cleaned = s.strip('"\'「」『』【】《》 \t')
+    if not cleaned or len(cleaned) <= 1:
+        return False
+    if all(c in '，。！？,.:;!?、"\'「」『』【】《》—…·' for c in cleaned):
+        return False
+    return True
+
+
+def legacy_clean_input_text(text):
+    cleaned = text.replace('\\n', '').replace('\n', '')
+    cleaned = cleaned.replace('>', '').replace('#', '').replace('-', '')
+    cleaned = cleaned.replace('*', '').replace('_', '').replace('`', '')
+    cleaned = re.sub(r'[：；、"「」『』【】《》—…·（）\(\)]+', '', cleaned)
+    return re.sub(r'\s+', '', cleaned)
+
+
+def legacy_split(text, pattern):
+    parts = re.split(pattern, text)
+    result = []
+    for i in range(0, len(parts) - 1, 2):
+        part = parts[i].strip()
+        if part:
+            result.append(part + parts[i + 1])
+    if len(parts) % 2 == 1 and parts[-1].strip():
+        result.append(parts[-1].strip())
+    return result
+
+
+def legacy_clean_text_for_tts(text):
+    cleaned = text.replace('\\n', '').replace('\n', '')
+    cleaned = cleaned.replace('>', '').replace('#', '').replace('-', '')
+    cleaned = cleaned.replace('*', '').replace('_', '').replace('`', '')
+    return re.sub(r'[，。！？、；：,.:;!?"\'「」『』【】《》—…·\s]+', '', cleaned)
+
+
+def legacy_scenes(text):
+    text = legacy_clean_input_text(text)
+    parents = [s for s in legacy_split(text, r'([。！？\.!?])') if _legacy_valid(s)]
+    scenes = []
+    for parent in parents:
+        children = legacy_split(parent, r'([，,])') or [parent]
+        scenes.append((parent, children, [legacy_clean_text_for_tts(c) for c in children]))
+    return scenes
+
+
+# ---------- 切分引擎 ----------
+
+def engine_scenes(text):
+    parents = split_parent_scenes(clean_input_text(text))
+    scenes = []
+    for parent in parents:
+        children = split_child_scenes(parent)
+        scenes.append((parent, children, [clean_text_for_tts(c) for c in children]))
+    return scenes
+
+
+def engine_stream(path):
+    """流式处理：只统计数量，不保留结果"""
+    parents = children = 0
+    for parent, child_texts in iter_scenes(Path(path)):
+        parents += 1
+        children += len(child_texts)
+        for child in child_texts:
+            clean_text_for_tts(child)
+    return parents, children
+
+
+def best_of(repeat, func, *args):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本分镜切分基准测试')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 10, 50], help='文本大小（MB）')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快）')
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print("文本分镜切分基准")
+    print("=" * 78)
+    print(f"{'大小':>6} {'父分镜':>9} {'子分镜':>10} {'原实现':>10} {'引擎':>16} {'引擎(流式)':>16}")
+
+    for size_mb in args.sizes:
+        text = make_novel(size_mb)
+        megabytes = len(text.encode("utf-8")) / 1024 / 1024
+
+        legacy_time, legacy_result = best_of(args.repeat, legacy_scenes, text)
+        engine_time, engine_result = best_of(args.repeat, engine_scenes, text)
+        assert engine_result == legacy_result, "切分结果与原实现不一致"
+
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+            f.write(text)
+            path = f.name
+        try:
+            stream_time, (parents, children) = best_of(args.repeat, engine_stream, path)
+        finally:
+            Path(path).unlink()
+        assert parents == len(legacy_result)
+        assert children == sum(len(s[1]) for s in legacy_result)
+
+        print(f"{size_mb:>4g}MB {parents:>9} {children:>10} "
+              f"{megabytes / legacy_time:>7.1f}MB/s "
+              f"{megabytes / engine_time:>7.1f}MB/s({legacy_time / engine_time:.1f}x) "
+              f"{megabytes / stream_time:>7.1f}MB/s({legacy_time / stream_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
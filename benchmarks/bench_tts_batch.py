@@ -0,0 +1,140 @@
+"""
+TTS合成路径基准测试（CPU + 桩模型）
+
+IndexTTS 1.5 没有多句批量推理入口，tts_batch_size > 1 时 TTSService.infer_batch 在一次加锁内
+逐句调用 infer(output_path=None)，推理次数与逐句合成相同。这里只测量推理以外的开销：
+- 原方式：每句 infer 写WAV，再用 soundfile 整个读回计算时长
+- 逐句（tts_batch_size=1）：每句 infer(output_path=None)，音频在内存中写入单一音轨
+- 批量回退（tts_batch_size>1）：按长度分桶后一次加锁逐句推理，写入单一音轨
+
+桩模型的推理不耗时，测得的是每句的额外开销；再按假设的每句推理耗时
+（--model-seconds）估算实际加速比——推理本身耗时越长，省下的开销占比越小
+
+用法：
+    python benchmarks/bench_tts_batch.py
+    python benchmarks/bench_tts_batch.py --repeat 20 --batch-size 16 --model-seconds 0.3
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "tools"))
+
+from tts_service import TTSService
+from tts_batch import plan_batches, synthesize_batch, write_clip
+from audio_track import TrackClipStore
+
+SAMPLE_RATE = 24000
+SECONDS_PER_CHAR = 0.22
+
+
+class StubIndexTTS:
+    """模拟IndexTTS.infer的桩模型（与IndexTTS 1.5一样只有单句infer，推理不耗时）"""
+
+    @staticmethod
+    def _wav(text):
+        samples = int(max(len(text), 1) * SECONDS_PER_CHAR * SAMPLE_RATE)
+        return np.zeros((samples, 1), dtype=np.int16)
+
+    def infer(self, audio_prompt, text, output_path=None, **kwargs):
+        wav = self._wav(text)
+        if output_path:
+            write_clip(output_path, SAMPLE_RATE, wav)
+            return output_path
+        return (SAMPLE_RATE, wav)
+
+
+def load_texts(repeat):
+    """使用示例项目的子分镜文本，重复repeat次模拟长篇"""
+    texts = []
+    for subtitle_file in (PROJECT_ROOT / "projects").glob("*/Audio/Subtitles.json"):
+        with open(subtitle_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for parent in data.get('parent_scenes', []):
+            texts.extend(child['tts_text'] for child in parent['children'])
+    if not texts:
+        texts = ["深夜", "李明独自走在回家的路上", "突然", "一个穿着破旧风衣的老人拦住了他"]
+    return texts * repeat
+
+
+def run_wav_roundtrip(service, texts, out_dir):
+    """原方式：每句写WAV再读回"""
+    import soundfile as sf
+
+    start = time.perf_counter()
+    for i, text in enumerate(texts):
+        path = out_dir / f"seq_{i:05d}.wav"
+        service.infer("stub.wav", text, output_path=path)
+        audio_data, sample_rate = sf.read(str(path))
+        _ = len(audio_data) / sample_rate
+    return time.perf_counter() - start
+
+
+def run_sequential(service, texts, out_dir):
+    """逐句在内存中合成，写入单一音轨"""
+    store = TrackClipStore(out_dir)
+    start = time.perf_counter()
+    for i, text in enumerate(texts):
+        sample_rate, wav = service.infer("stub.wav", text, output_path=None)
+        store.add({"child_index": i}, sample_rate, wav)
+    store.close()
+    return time.perf_counter() - start
+
+
+def run_batched(service, texts, batch_size, out_dir):
+    """分桶后一次加锁逐句合成（IndexTTS 1.5下的批量路径），写入单一音轨"""
+    store = TrackClipStore(out_dir)
+    start = time.perf_counter()
+    for batch in plan_batches(texts, max_batch_size=batch_size):
+        results = synthesize_batch(service, "stub.wav", [texts[i] for i in batch])
+        for i, (sample_rate, wav) in zip(batch, results):
+            store.add({"child_index": i}, sample_rate, wav)
+    store.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TTS合成路径基准测试')
+    parser.add_argument('--repeat', type=int, default=5, help='示例文本重复次数')
+    parser.add_argument('--batch-size', type=int, default=8, help='每批最大句数')
+    parser.add_argument('--model-seconds', type=float, default=0.5,
+                        help='估算加速比时假设的每句推理耗时（秒），不实际等待')
+    args = parser.parse_args()
+
+    texts = load_texts(args.repeat)
+    n = len(texts)
+
+    print("=" * 60)
+    print(f"TTS合成路径基准: {n} 句，平均 {np.mean([len(t) for t in texts]):.1f} 字/句")
+    print("=" * 60)
+
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, run in [
+            ("原方式（写WAV再读回）", lambda service, d: run_wav_roundtrip(service, texts, d)),
+            ("逐句（内存）", lambda service, d: run_sequential(service, texts, d)),
+            (f"批量回退（每批{args.batch_size}句）", lambda service, d: run_batched(service, texts, args.batch_size, d)),
+        ]:
+            out_dir = Path(tmp) / str(len(timings))
+            out_dir.mkdir()
+            service = TTSService(idle_timeout=0, loader=lambda *_: StubIndexTTS())
+            timings.append((label, run(service, out_dir)))
+
+    baseline = timings[0][1] / n
+    print(f"{'方式':<22} {'每句额外开销':>12} {'推理耗时为0时':>14} {'估算加速比':>10}")
+    for label, elapsed in timings:
+        per_sentence = elapsed / n
+        projected = (args.model_seconds + baseline) / (args.model_seconds + per_sentence)
+        print(f"{label:<22} {per_sentence * 1000:>10.2f}ms {baseline / per_sentence:>13.2f}x {projected:>9.3f}x")
+    print(f"\n估算加速比按每句推理 {args.model_seconds}秒 计算；"
+          f"IndexTTS 1.5的推理次数在各方式下相同（每句一次）")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,8 @@ from datetime import datetime
 sys.path.append(str(Path(__file__).parent / "tools"))
 
 from generate_prompts import PromptGenerator
-from kimi_api import KimiAPI
+from kimi_api import get_kimi_api
+from app_config import CONFIG_PATH, get_setting
 
 # Agent相关导入
 from agent import NovelToVideoAgent
@@ -146,13 +147,29 @@ class VideoGenerator:
             print(f"❌ 字幕文件不存在: {self.subtitle_file}")
             return False
         
+        # 边生成提示词边出图（config.json 中 prompt_stream_images 开启时）：
+        # 流式解析出的分镜提示词立即交给常驻SDXL管线
+        from scene_image_stream import SceneImageStream, stream_enabled
+        image_stream = SceneImageStream(self.project_name, self.imgs_dir).start() if stream_enabled() else None
+        prompts_saved = False
+        
         try:
             # 使用PromptGenerator（传递agent_mode）
-            generator = PromptGenerator(self.project_name, agent_mode=agent_mode)
+            generator = PromptGenerator(
+                self.project_name,
+                agent_mode=agent_mode,
+                on_scene_prompt=image_stream.submit if image_stream else None
+            )
             prompts = generator.generate_prompts(str(self.subtitle_file))
             
+            if image_stream:
+                image_stream.close()
+                # 记录已生成图像的种子，步骤3跳过这些分镜
+                image_stream.apply_records(prompts)
+            
             # 保存到项目目录
             generator.save_prompts(prompts, str(self.prompts_file))
+            prompts_saved = True
             
             # 打印摘要
             generator.print_summary(prompts)
@@ -164,6 +181,13 @@ class VideoGenerator:
             import traceback
             traceback.print_exc()
             return False
+        
+        finally:
+            if image_stream:
+                image_stream.close()
+                if not prompts_saved:
+                    # 生成记录没有保存，删除已生成的图，避免步骤3沿用与提示词不符的图
+                    image_stream.discard()
     
     def step3_generate_images(self, skip_if_exists=True):
         """
@@ -171,7 +195,7 @@ class VideoGenerator:
         调用SDXL生成所有分镜图片
         
         Args:
-            skip_if_exists: 如果图片已存在则跳过
+            skip_if_exists: 如果图片已存在且提示词和生成参数与种子台账记录一致则跳过
         """
         print("\n" + "=" * 70)
         print("步骤 3/5: 生成分镜图像")
@@ -182,11 +206,14 @@ class VideoGenerator:
             return False
         
         try:
-            # 清理显存（确保TTS模型已卸载）
+            # 清理显存（确保TTS模型已卸载：常驻的TTS模型在空闲超时前仍占用显存，SDXL已常驻时也不会再触发卸载）
             import torch
             import gc
+            from tts_service import release_idle_services
             
             print("清理显存...")
+            if release_idle_services():
+                print("✓ 已卸载空闲的TTS模型")
             torch.cuda.empty_cache()
             gc.collect()
             
@@ -197,131 +224,76 @@ class VideoGenerator:
             scene_prompts = prompts_data.get('scene_prompts', [])
             total = len(scene_prompts)
             
-            # 检查已生成的图像
-            existing_images = list(self.imgs_dir.glob("scene_*.png"))
-            if skip_if_exists and len(existing_images) == total:
-                print(f"✓ 所有图像已存在（{total}张），跳过此步骤")
-                return True
-            
-            print(f"需要生成 {total} 张图像")
-            if existing_images:
-                print(f"  已存在 {len(existing_images)} 张，将跳过")
-            
-            print("加载SDXL模型...")
-            
-            # 导入SDXL生成模块
-            from diffusers import StableDiffusionXLPipeline, EulerAncestralDiscreteScheduler
-            from pathlib import Path
-            
-            # 加载模型 - 仅使用 Prefect Illustrious XL 40
-            model_dir = Path("sdxl/models/prefectIllustriousXL_40")
-            model_path_file = model_dir / "prefectIllustriousXL_40.safetensors"
-            if not model_path_file.exists():
-                raise FileNotFoundError("未找到模型: sdxl/models/prefectIllustriousXL_40/prefectIllustriousXL_40.safetensors")
-            print("✓ 使用模型: Prefect Illustrious XL 40")
-            model_path = str(model_path_file)
-            config_path = str(model_dir)
-            
-            pipe = StableDiffusionXLPipeline.from_single_file(
-                model_path,
-                torch_dtype=torch.float16,
-                config=config_path,
-                local_files_only=True
-            ).to("cuda")
-            
-            # 加载LoRA（仅DMD2加速）
-            dmd2_lora_path = Path("sdxl/models/loras/dmd2_sdxl_4step_lora.safetensors")
-            use_dmd2 = False
-            if dmd2_lora_path.exists():
-                pipe.load_lora_weights(
-                    str(dmd2_lora_path.parent), 
-                    weight_name=dmd2_lora_path.name,
-                    adapter_name="dmd2"
-                )
-                pipe.set_adapters(["dmd2"], adapter_weights=[0.8])
-                use_dmd2 = True
-                print("✓ DMD2加速LoRA已加载（权重0.8）")
-            
-            # 使用Euler Ancestral调度器（原始配置）
-            pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(
-                pipe.scheduler.config
-            )
-            print("✓ 使用调度器: Euler Ancestral")
-            
-            pipe.enable_attention_slicing()
-            pipe.enable_vae_slicing()
-            
-            print("✓ 模型加载完成")
-            
-            # 生成图像
+            # 常驻管线：首次使用时加载，之后复用（仅使用 Prefect Illustrious XL 40 + DMD2加速LoRA）
+            from sdxl_pipeline import get_pipeline_service, default_loras, sampling_params
+            from sdxl_batch import BatchImageGenerator
+            from prompt_embeddings import PromptEncoder, CLIP_SKIP
+            from seed_ledger import generation_settings, is_unchanged, make_record, save_prompts, scene_seed, seed_mode
+            
+            pipeline_service = get_pipeline_service()
+            pipeline_snapshot = pipeline_service.get_stats()
+            loras = default_loras()
+            params = sampling_params(bool(loras))
+            settings = generation_settings(pipeline_service, loras, params, 1024, 1024, CLIP_SKIP)
+            mode = seed_mode()
+            
+            # 待生成的分镜（每个分镜使用各自的种子，生成后记录到种子台账）
+            jobs = []
             for i, scene in enumerate(scene_prompts, 1):
                 index = scene['index']
-                prompt = scene['prompt']
-                
-                # 检查是否已存在
-                img_filename = f"scene_{index:04d}.png"
-                img_path = self.imgs_dir / img_filename
-                
+                img_path = self.imgs_dir / f"scene_{index:04d}.png"
                 if skip_if_exists and img_path.exists():
-                    print(f"\n[{i}/{total}] 分镜 {index} 已存在，跳过")
-                    continue
-                
-                print(f"\n[{i}/{total}] 生成分镜 {index}...")
-                print(f"提示词: {prompt[:80]}...")
-                
-                # 生成图像（使用随机种子）
-                torch.cuda.empty_cache()
-                import random
-                seed = random.randint(0, 2**32 - 1)
-                generator_obj = torch.Generator(device="cuda").manual_seed(seed)
-                
-                # 负面词（Illustrious专用 - 更全面的质量控制）
-                negative_prompt = "lazyneg, lazyhand, child, (censored, mosaic censoring, bar_censor), lowres, text, error, cropped, worst quality, low quality, jpeg artifacts, ugly, duplicate, morbid, mutilated, out of frame, extra fingers, mutated hands, poorly drawn hands, poorly drawn face, mutation, deformed, blurry, dehydrated, bad anatomy, bad proportions, extra limbs, cloned face, disfigured, gross proportions, malformed limbs, missing arms, missing legs, extra arms, extra legs, fused fingers, too many fingers, long neck, username, watermark, signature"
-                
-                # 添加质量标签到提示词（Illustrious专用PE格式）
-                quality_tags = "score_9, score_8_up, score_7_up, masterpiece, best quality, amazing quality, absurdres, newest"
-                enhanced_prompt = f"{quality_tags}, BREAK {prompt}"
-                
-                # 使用DMD2 LoRA（原始配置）
-                if use_dmd2:
-                    # DMD2: 12步，CFG=2.5（原始稳定配置）
-                    image = pipe(
-                        prompt=enhanced_prompt,
-                        negative_prompt=negative_prompt,
-                        num_inference_steps=12,
-                        guidance_scale=2.5,
-                        width=1024,
-                        height=1024,
-                        generator=generator_obj,
-                        clip_skip=2
-                    ).images[0]
-                else:
-                    # 标准模式: 20步，CFG=7.0（原始配置）
-                    image = pipe(
-                        prompt=enhanced_prompt,
-                        negative_prompt=negative_prompt,
-                        num_inference_steps=20,
-                        guidance_scale=7.0,
-                        width=1024,
-                        height=1024,
-                        generator=generator_obj,
-                        clip_skip=2
-                    ).images[0]
-                
-                # 保存图像
-                img_filename = f"scene_{index:04d}.png"
-                img_path = self.imgs_dir / img_filename
-                image.save(img_path)
-                
-                print(f"✓ 已保存: {img_filename}")
+                    if is_unchanged(scene, settings):
+                        continue
+                    print(f"[{i}/{total}] 分镜 {index} 的提示词或生成参数已变化，重新生成")
+                jobs.append({
+                    "number": i,
+                    "index": index,
+                    "scene": scene,
+                    "prompt": scene['prompt'],
+                    "seed": scene_seed(mode, self.project_name, index, scene['prompt'])
+                })
+            
+            if not jobs:
+                print(f"✓ 所有图像已存在且未变化（{total}张），跳过此步骤")
+                return True
             
-            print(f"\n✓ 所有图像生成完成！共 {total} 张")
+            print(f"需要生成 {len(jobs)} 张图像（共 {total} 张，种子模式: {mode}）")
+            if len(jobs) < total:
+                print(f"  已存在 {total - len(jobs)} 张，将跳过")
+            
+            def save_image(job, image):
+                img_filename = f"scene_{job['index']:04d}.png"
+                image.save(self.imgs_dir / img_filename)
+                job["scene"]["generation"] = make_record(job["seed"], job["prompt"], settings)
+                print(f"[{job['number']}/{total}] ✓ 已保存: {img_filename}（种子 {job['seed']}）")
+            
+            def save_ledger(batch):
+                # 每批结束后写回一次种子台账
+                save_prompts(self.prompts_file, prompts_data)
+            
+            print(f"\n生成 {len(jobs)} 张图像（{params['num_inference_steps']}步，CFG={params['guidance_scale']}）...")
+            with pipeline_service.acquire(loras) as pipe:
+                # 质量标签和负面词的编码结果缓存复用，分镜提示词以 prompt_embeds 传入
+                prompt_encoder = PromptEncoder(pipe)
+                batch_generator = BatchImageGenerator(
+                    pipe,
+                    device=pipeline_service.device,
+                    encode_prompts=prompt_encoder.pipeline_kwargs
+                )
+                batch_generator.generate(
+                    jobs,
+                    on_image=save_image,
+                    on_batch=save_ledger,
+                    width=1024,
+                    height=1024,
+                    **params
+                )
             
-            # 卸载模型，释放显存
-            print("释放显存...")
-            del pipe
-            torch.cuda.empty_cache()
-            gc.collect()
+            print(f"\n✓ 所有图像生成完成！共 {total} 张（本次生成 {len(jobs)} 张）")
+            batch_generator.print_summary()
+            prompt_encoder.print_timing()
+            pipeline_service.print_timing(pipeline_service.stats_since(pipeline_snapshot))
             
             return True
             
@@ -426,22 +398,18 @@ class VideoGenerator:
         start_time = datetime.now()
         
         try:
-            # 加载配置
-            config_path = Path("config.json")
-            if not config_path.exists():
+            # 加载配置（进程内只读取一次）
+            if not CONFIG_PATH.exists():
                 print("❌ 未找到config.json，请先配置Kimi API Key")
                 return None
             
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            
-            kimi_api_key = config.get("kimi_api_key")
+            kimi_api_key = get_setting("kimi_api_key")
             if not kimi_api_key or kimi_api_key == "sk-your-kimi-api-key":
                 print("❌ 请在config.json中配置有效的Kimi API Key")
                 return None
             
-            # 创建LLM客户端
-            llm_client = KimiAPI(kimi_api_key)
+            # 获取共享的LLM客户端（连接池在各步骤和Agent循环之间复用）
+            llm_client = get_kimi_api()
             
             # 创建工具集
             agent_tools = AgentTools(self)
@@ -7,12 +7,15 @@ import warnings
 warnings.filterwarnings('ignore', message='.*Triton.*')
 warnings.filterwarnings('ignore', message='.*triton.*')
 
+import sys
 import torch
-from diffusers import StableDiffusionXLPipeline
 import time
 from pathlib import Path
 import re
 
+sys.path.insert(0, str(Path(__file__).parent.parent / "tools"))
+from sdxl_pipeline import get_pipeline_service
+
 print("=" * 70)
 print("AnimagineXL 图像生成")
 print("=" * 70)
@@ -24,20 +27,17 @@ print(f"✓ 显存: {torch.cuda.get_device_properties(0).total_memory / 1024**3:
 
 # 加载模型
 print("\n[2/4] 加载模型...")
-model_path = str(Path(__file__).parent / "models" / "animagine-xl-4.0")
+model_path = Path(__file__).parent / "models" / "animagine-xl-4.0"
 
-pipe = StableDiffusionXLPipeline.from_pretrained(
-    model_path,
-    torch_dtype=torch.float16,
-    use_safetensors=True
-).to("cuda")
+# 使用常驻管线服务（与主流程共用加载和复用逻辑），保持模型自带的调度器
+pipeline_service = get_pipeline_service(model_path, scheduler=None)
+pipeline_service.load()
 
 print("✓ 模型加载成功")
 
 # 启用优化
 print("\n[3/4] 启用优化...")
-pipe.enable_attention_slicing()
-pipe.enable_vae_slicing()
+# 注意力切片和VAE切片在管线加载时启用
 print("✓ 优化已启用")
 
 # 中文检测
@@ -99,14 +99,15 @@ torch.cuda.reset_peak_memory_stats()
 
 start_time = time.time()
 
-image = pipe(
-    prompt=prompt_en,
-    negative_prompt="low quality, blurry, distorted",
-    num_inference_steps=28,
-    guidance_scale=7.0,
-    height=1024,
-    width=1024
-).images[0]
+with pipeline_service.acquire() as pipe:
+    image = pipe(
+        prompt=prompt_en,
+        negative_prompt="low quality, blurry, distorted",
+        num_inference_steps=28,
+        guidance_scale=7.0,
+        height=1024,
+        width=1024
+    ).images[0]
 
 elapsed = time.time() - start_time
 memory = torch.cuda.max_memory_allocated() / 1024**3
@@ -132,14 +133,15 @@ prompt_en2 = translate_prompt(prompt_cn2)
 torch.cuda.empty_cache()
 start_time = time.time()
 
-image2 = pipe(
-    prompt=prompt_en2,
-    negative_prompt="low quality, blurry",
-    num_inference_steps=28,
-    guidance_scale=7.0,
-    height=1024,
-    width=1024
-).images[0]
+with pipeline_service.acquire() as pipe:
+    image2 = pipe(
+        prompt=prompt_en2,
+        negative_prompt="low quality, blurry",
+        num_inference_steps=28,
+        guidance_scale=7.0,
+        height=1024,
+        width=1024
+    ).images[0]
 
 elapsed2 = time.time() - start_time
 output_path2 = output_dir / "test_都市.png"
@@ -0,0 +1,5 @@
+"""测试公共设置：与 main.py 相同，把 tools 目录加入导入路径"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "tools"))
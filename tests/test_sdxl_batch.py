@@ -0,0 +1,179 @@
+"""
+BatchImageGenerator 测试（桩管线，不需要GPU和diffusers）
+"""
+import types
+
+import pytest
+
+from sdxl_batch import BatchImageGenerator, auto_batch_size, is_oom_error
+
+
+class OutOfMemoryError(RuntimeError):
+    """与 torch.cuda.OutOfMemoryError 同名的桩异常"""
+
+
+class StubPipe:
+    """记录每次调用的桩管线，批大小超过 oom_above 时抛出显存不足"""
+
+    def __init__(self, oom_above=None, error=None):
+        self.oom_above = oom_above
+        self.error = error
+        self.calls = []
+
+    def __call__(self, prompt, generator, **kwargs):
+        self.calls.append({"prompt": list(prompt), "generator": list(generator), **kwargs})
+        if self.error is not None:
+            raise self.error
+        if self.oom_above is not None and len(prompt) > self.oom_above:
+            raise OutOfMemoryError("CUDA out of memory")
+        return types.SimpleNamespace(images=[f"image:{p}" for p in prompt])
+
+
+def make_jobs(count):
+    return [{"index": i, "prompt": f"scene {i}", "seed": 1000 + i} for i in range(1, count + 1)]
+
+
+def make_generator(pipe, **kwargs):
+    cleared = []
+    options = {
+        "device": "cpu",
+        "max_batch_size": 4,
+        "make_generator": lambda seed: ("generator", seed),
+        "clear_cache": lambda: cleared.append(True),
+    }
+    options.update(kwargs)
+    return BatchImageGenerator(pipe, **options), cleared
+
+
+def test_fixed_batch_size_splits_jobs():
+    pipe = StubPipe()
+    generator, _ = make_generator(pipe, batch_size=2)
+
+    images = generator.generate(make_jobs(5), width=1024, height=1024)
+
+    assert [len(call["prompt"]) for call in pipe.calls] == [2, 2, 1]
+    assert images == [f"image:scene {i}" for i in range(1, 6)]
+    assert generator.stats["images"] == 5
+    assert generator.stats["batches"] == 3
+
+
+def test_auto_batch_size_from_free_memory():
+    pipe = StubPipe()
+    probed = []
+
+    def probe(device):
+        probed.append(device)
+        return 3000
+
+    generator, _ = make_generator(pipe, batch_size=0, memory_probe=probe, mb_per_image=1000)
+    generator.generate(make_jobs(5), width=1024, height=1024)
+
+    # 3000MB * 0.85 // 1000MB = 2
+    assert probed == ["cpu"]
+    assert [len(call["prompt"]) for call in pipe.calls] == [2, 2, 1]
+
+
+def test_auto_batch_size_limits():
+    assert auto_batch_size(None, 1024, 1024, max_batch_size=3) == 3
+    assert auto_batch_size(100, 1024, 1024) == 1
+    assert auto_batch_size(100000, 1024, 1024, max_batch_size=4) == 4
+    # 分辨率减半时每张图的显存按像素数缩放
+    assert auto_batch_size(2400, 512, 512, max_batch_size=8, mb_per_image=1200) == 6
+
+
+def test_oom_halves_batch_and_recovers():
+    pipe = StubPipe(oom_above=1)
+    generator, cleared = make_generator(pipe, batch_size=4)
+    saved = []
+    batches = []
+
+    generator.generate(make_jobs(4), on_image=lambda job, image: saved.append((job["index"], image)),
+                       on_batch=lambda batch: batches.append([job["index"] for job in batch]))
+
+    # 4 -> OOM -> 2 -> OOM -> 1，之后逐张生成完全部分镜
+    assert [len(call["prompt"]) for call in pipe.calls] == [4, 2, 1, 1, 1, 1]
+    assert saved == [(i, f"image:scene {i}") for i in range(1, 5)]
+    assert batches == [[1], [2], [3], [4]]
+    assert generator.stats["oom_backoffs"] == 2
+    assert generator.stats["batch_size"] == 1
+    assert len(cleared) == 2
+
+
+def test_oom_batch_size_is_sticky():
+    pipe = StubPipe(oom_above=2)
+    generator, _ = make_generator(pipe, batch_size=0, memory_probe=lambda device: None)
+
+    generator.generate(make_jobs(4))
+    assert generator.max_batch_size == 2
+
+    pipe.calls.clear()
+    generator.generate(make_jobs(4))
+    # 后续调用直接使用减小后的批大小，不再触发OOM
+    assert [len(call["prompt"]) for call in pipe.calls] == [2, 2]
+    assert generator.stats["oom_backoffs"] == 1
+
+
+def test_oom_at_batch_size_one_is_raised():
+    pipe = StubPipe(oom_above=0)
+    generator, _ = make_generator(pipe, batch_size=1)
+
+    with pytest.raises(OutOfMemoryError):
+        generator.generate(make_jobs(2))
+
+
+def test_other_errors_are_not_retried():
+    pipe = StubPipe(error=ValueError("bad prompt"))
+    generator, cleared = make_generator(pipe, batch_size=4)
+
+    with pytest.raises(ValueError):
+        generator.generate(make_jobs(4))
+    assert len(pipe.calls) == 1
+    assert not cleared
+
+
+def test_is_oom_error():
+    assert is_oom_error(OutOfMemoryError("x"))
+    assert is_oom_error(RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB"))
+    assert not is_oom_error(RuntimeError("shape mismatch"))
+    assert not is_oom_error(ValueError("out of memory"))
+
+
+def test_each_prompt_gets_its_own_seed():
+    pipe = StubPipe(oom_above=2)
+    generator, _ = make_generator(pipe, batch_size=3)
+    jobs = make_jobs(3)
+
+    generator.generate(jobs)
+
+    # OOM重试后每个提示词仍使用自己的种子，且与提示词一一对应
+    for call in pipe.calls:
+        assert call["generator"] == [("generator", 1000 + int(p.split()[-1])) for p in call["prompt"]]
+    assert pipe.calls[-1]["generator"] == [("generator", 1003)]
+
+
+def test_encode_prompts_replaces_prompt():
+    calls = []
+
+    def pipe(generator, **kwargs):
+        calls.append(kwargs)
+        return types.SimpleNamespace(images=[None] * len(generator))
+
+    generator = BatchImageGenerator(pipe, device="cpu", batch_size=2, make_generator=lambda seed: seed,
+                                    encode_prompts=lambda prompts: {"prompt_embeds": tuple(prompts)})
+    generator.generate(make_jobs(2), num_inference_steps=8)
+
+    assert calls == [{"prompt_embeds": ("scene 1", "scene 2"), "num_inference_steps": 8}]
+
+
+def test_torch_generators_match_single_image_seeds():
+    torch = pytest.importorskip("torch")
+    pipe = StubPipe()
+    generator = BatchImageGenerator(pipe, device="cpu", batch_size=2, clear_cache=lambda: None)
+
+    generator.generate(make_jobs(2))
+
+    generators = pipe.calls[0]["generator"]
+    assert all(isinstance(g, torch.Generator) for g in generators)
+    for job, g in zip(make_jobs(2), generators):
+        expected = torch.Generator(device="cpu").manual_seed(job["seed"])
+        assert torch.equal(torch.randn(4, generator=g), torch.randn(4, generator=expected))
@@ -0,0 +1,254 @@
+"""
+SDXLPipelineService 测试（桩加载函数和桩管线，不需要GPU和diffusers）
+"""
+import time
+
+import pytest
+
+import sdxl_pipeline
+from sdxl_pipeline import SDXLPipelineService, release_idle_pipelines
+
+
+class StubPipe:
+    """记录LoRA相关调用的桩管线"""
+
+    def __init__(self):
+        self.calls = []
+
+    def load_lora_weights(self, directory, weight_name, adapter_name):
+        self.calls.append(("load", adapter_name, weight_name))
+
+    def set_adapters(self, names, adapter_weights):
+        self.calls.append(("set", list(names), list(adapter_weights)))
+
+    def enable_lora(self):
+        self.calls.append(("enable",))
+
+    def disable_lora(self):
+        self.calls.append(("disable",))
+
+    def delete_adapters(self, name):
+        self.calls.append(("delete", name))
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = tmp_path / "model.safetensors"
+    path.write_bytes(b"stub")
+    return path
+
+
+@pytest.fixture
+def make_service(model_path):
+    services = []
+
+    def make(path=model_path, **kwargs):
+        loaded = []
+
+        def loader(load_path, config_dir, device, scheduler):
+            pipe = StubPipe()
+            loaded.append(pipe)
+            return pipe
+
+        options = {
+            "device": "cpu",
+            "idle_timeout": 0,
+            "min_free_memory_mb": 0,
+            "loader": loader,
+            "snapshot": False,
+            "fuse_loras": [],
+        }
+        options.update(kwargs)
+        service = SDXLPipelineService(path, **options)
+        service.loaded = loaded
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.unload()
+
+
+@pytest.fixture
+def lora_files(tmp_path):
+    paths = {}
+    for name in ("dmd2", "style", "style_v2"):
+        path = tmp_path / "loras" / f"{name}.safetensors"
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"lora")
+        paths[name] = str(path)
+    return paths
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_acquire_loads_once_and_reuses(make_service):
+    service = make_service()
+    assert not service.is_loaded
+
+    with service.acquire() as first:
+        pass
+    with service.acquire() as second:
+        pass
+
+    assert first is second
+    assert len(service.loaded) == 1
+    stats = service.get_stats()
+    assert stats["loads"] == 1
+    assert stats["acquires"] == 2
+    assert stats["hits"] == 1
+    assert stats["loaded"]
+
+
+def test_missing_model_raises(make_service, tmp_path):
+    service = make_service(tmp_path / "missing.safetensors")
+    with pytest.raises(FileNotFoundError):
+        with service.acquire():
+            pass
+    assert service.get_stats()["acquires"] == 1
+    assert not service.is_loaded
+
+
+def test_lora_adapters_switch_without_reloading(make_service, lora_files):
+    service = make_service()
+    dmd2 = {"name": "dmd2", "path": lora_files["dmd2"], "weight": 0.8}
+    style = {"name": "style", "path": lora_files["style"], "weight": 0.5}
+
+    with service.acquire([dmd2]) as pipe:
+        pass
+    assert pipe.calls == [
+        ("load", "dmd2", "dmd2.safetensors"),
+        ("enable",),
+        ("set", ["dmd2"], [0.8]),
+    ]
+
+    # 相同组合不再调用管线
+    pipe.calls.clear()
+    with service.acquire([dmd2]):
+        pass
+    assert pipe.calls == []
+
+    # 新增LoRA只加载新的那个
+    with service.acquire([dmd2, style]):
+        pass
+    assert pipe.calls == [
+        ("load", "style", "style.safetensors"),
+        ("set", ["dmd2", "style"], [0.8, 0.5]),
+    ]
+
+    # 不使用LoRA时关闭，之后切回不重新加载
+    pipe.calls.clear()
+    with service.acquire():
+        pass
+    with service.acquire([dmd2]):
+        pass
+    assert pipe.calls == [("disable",), ("enable",), ("set", ["dmd2"], [0.8])]
+
+    stats = service.get_stats()
+    assert stats["loads"] == 1
+    assert stats["lora_loads"] == 2
+    assert stats["adapter_switches"] == 4
+    assert stats["adapters"] == ["dmd2"]
+
+
+def test_same_adapter_name_with_new_file_is_replaced(make_service, lora_files):
+    service = make_service()
+
+    with service.acquire([{"name": "style", "path": lora_files["style"]}]) as pipe:
+        pass
+    pipe.calls.clear()
+    with service.acquire([{"name": "style", "path": lora_files["style_v2"]}]):
+        pass
+
+    assert pipe.calls == [
+        ("delete", "style"),
+        ("load", "style", "style_v2.safetensors"),
+        ("set", ["style"], [1.0]),
+    ]
+
+
+def test_idle_timeout_unloads_and_reloads(make_service, lora_files):
+    service = make_service(idle_timeout=0.05)
+
+    with service.acquire([{"name": "dmd2", "path": lora_files["dmd2"]}]):
+        pass
+    assert wait_until(lambda: not service.is_loaded)
+    stats = service.get_stats()
+    assert stats["idle_unloads"] == 1
+    assert stats["unloads"] == 1
+    assert stats["adapters"] == []
+
+    # 卸载后再次使用时重新加载，LoRA也重新加载
+    with service.acquire([{"name": "dmd2", "path": lora_files["dmd2"]}]) as pipe:
+        pass
+    assert len(service.loaded) == 2
+    assert pipe.calls[0] == ("load", "dmd2", "dmd2.safetensors")
+
+
+def test_eviction_is_deferred_while_in_use(make_service):
+    service = make_service(idle_timeout=0.05)
+
+    with service.acquire():
+        time.sleep(0.1)
+        service._evict_if_idle()
+        service.unload()
+        assert service.is_loaded
+        assert service.get_stats()["unloads"] == 0
+
+    # 使用结束后空闲超时才卸载
+    assert wait_until(lambda: not service.is_loaded)
+    assert service.get_stats()["idle_unloads"] == 1
+
+
+def test_memory_pressure_evicts_idle_pipeline(make_service):
+    free = {"mb": 4096}
+    service = make_service(min_free_memory_mb=1024, memory_probe=lambda device: free["mb"])
+
+    with service.acquire():
+        free["mb"] = 512
+        # 使用期间显存紧张也不卸载
+        assert not service.reclaim()
+        service._evict_if_idle()
+        assert service.is_loaded
+
+    service._evict_if_idle()
+    assert not service.is_loaded
+    assert service.get_stats()["pressure_unloads"] == 1
+
+
+def test_reclaim_only_under_memory_pressure(make_service):
+    free = {"mb": 4096}
+    service = make_service(min_free_memory_mb=1024, memory_probe=lambda device: free["mb"])
+    service.load()
+
+    assert not service.reclaim()
+    assert service.is_loaded
+
+    free["mb"] = 512
+    assert service.reclaim()
+    assert not service.is_loaded
+    assert not service.reclaim()
+
+
+def test_release_idle_pipelines(make_service, monkeypatch):
+    free = {"mb": 512}
+    probe = lambda device: free["mb"]
+    idle = make_service(min_free_memory_mb=1024, memory_probe=probe)
+    busy = make_service(min_free_memory_mb=1024, memory_probe=probe)
+    unloaded = make_service(min_free_memory_mb=1024, memory_probe=probe)
+    monkeypatch.setattr(sdxl_pipeline, "_services", {"idle": idle, "busy": busy, "unloaded": unloaded})
+    idle.load()
+
+    with busy.acquire():
+        assert release_idle_pipelines() == 1
+
+    assert not idle.is_loaded
+    assert busy.is_loaded
+    assert not unloaded.is_loaded
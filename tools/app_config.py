@@ -0,0 +1,44 @@
+"""
+全局配置读取模块
+config.json 在进程内只读取一次，所有模块共享同一份配置
+"""
+import json
+import threading
+from pathlib import Path
+
+CONFIG_PATH = Path(__file__).parent.parent / "config.json"
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def load_config(reload=False):
+    """
+    读取config.json（带进程内缓存）
+
+    Args:
+        reload: 是否强制重新读取
+
+    Returns:
+        dict: 配置内容，文件不存在时返回空字典
+    """
+    global _config
+    with _config_lock:
+        if _config is None or reload:
+            if CONFIG_PATH.exists():
+                with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                    _config = json.load(f)
+            else:
+                _config = {}
+        return _config
+
+
+def get_setting(key, default=None):
+    """
+    获取单个配置项
+
+    Args:
+        key: 配置键名
+        default: 默认值
+    """
+    return load_config().get(key, default)
@@ -0,0 +1,176 @@
+"""
+TTS音频后处理（NumPy向量化）
+IndexTTS输出的片段首尾带有静音，会累加到时间轴中拉长整个视频。
+在写入音频存储之前，对一组片段一次性完成：
+- 按阈值裁剪首尾静音（保留少量留白）
+- 可选限制相邻片段间的停顿长度
+- 响度归一化（RMS目标电平 + 峰值限制）
+所有片段拼接为一个数组处理，不逐片段、逐采样点循环
+"""
+import numpy as np
+
+# 默认参数
+DEFAULT_TRIM_DB = -45.0       # 低于该电平（dBFS）视为静音
+DEFAULT_PAD_MS = 80           # 裁剪后首尾保留的静音（毫秒）
+DEFAULT_TARGET_DBFS = -20.0   # 响度归一化的目标RMS电平
+DEFAULT_PEAK_LIMIT = 0.97     # 归一化后的峰值上限（满幅度的比例）
+
+# 每次向量化处理的采样点数上限：片段按顺序拼接成块，临时数组保持在CPU缓存量级
+BLOCK_SAMPLES = 1 << 20
+
+
+def _db_to_amp(db):
+    return 10.0 ** (db / 20.0)
+
+
+class AudioPostProcessor:
+    """片段后处理器"""
+
+    def __init__(self, trim_db=DEFAULT_TRIM_DB, pad_ms=DEFAULT_PAD_MS, max_gap_ms=None,
+                 target_dbfs=DEFAULT_TARGET_DBFS, peak_limit=DEFAULT_PEAK_LIMIT):
+        """
+        Args:
+            trim_db: 静音阈值（dBFS），None表示不裁剪静音
+            pad_ms: 裁剪后首尾各保留的静音（毫秒）
+            max_gap_ms: 相邻片段之间的最大停顿（毫秒），即上一片段尾部与下一片段头部静音之和，
+                        None表示不限制
+            target_dbfs: 响度归一化的目标RMS电平，None表示不归一化
+            peak_limit: 归一化增益的峰值上限
+        """
+        self.trim_db = trim_db
+        self.pad_ms = pad_ms
+        self.max_gap_ms = max_gap_ms
+        self.target_dbfs = target_dbfs
+        self.peak_limit = peak_limit
+
+    @classmethod
+    def from_config(cls, options):
+        """
+        根据config.json中的 tts_postprocess 创建
+
+        Args:
+            options: dict（参数同构造函数），False/None表示关闭后处理
+
+        Returns:
+            AudioPostProcessor 或 None
+        """
+        if not options:
+            return None
+        if options is True:
+            return cls()
+        return cls(**options)
+
+    def settings(self):
+        """影响输出的参数（用于检查点签名）"""
+        return {
+            "trim_db": self.trim_db,
+            "pad_ms": self.pad_ms,
+            "max_gap_ms": self.max_gap_ms,
+            "target_dbfs": self.target_dbfs,
+            "peak_limit": self.peak_limit
+        }
+
+    def _keep_samples(self, sample_rate):
+        """首尾各保留的静音采样点数"""
+        keep_ms = self.pad_ms if self.trim_db is not None else float('inf')
+        if self.max_gap_ms is not None:
+            keep_ms = min(keep_ms, self.max_gap_ms / 2)
+        return int(sample_rate * keep_ms / 1000)
+
+    def process(self, clips, sample_rate):
+        """
+        一次性处理一组片段
+
+        Args:
+            clips: int16数组列表，每个形状为 (采样点数,) 或 (采样点数, 声道数)
+            sample_rate: 采样率（同一组片段相同）
+
+        Returns:
+            list: 处理后的int16数组（形状与输入一致）
+        """
+        if not clips:
+            return []
+
+        squeeze = clips[0].ndim == 1
+        arrays = [np.asarray(c).reshape(-1, 1) if np.ndim(c) == 1 else np.asarray(c) for c in clips]
+
+        pieces = []
+        block = []
+        block_samples = 0
+        for array in arrays:
+            block.append(array)
+            block_samples += len(array)
+            if block_samples >= BLOCK_SAMPLES:
+                pieces.extend(self._process_block(block, sample_rate))
+                block = []
+                block_samples = 0
+        if block:
+            pieces.extend(self._process_block(block, sample_rate))
+
+        if squeeze:
+            pieces = [p[:, 0] for p in pieces]
+        return pieces
+
+    def _process_block(self, arrays, sample_rate):
+        """向量化处理一块片段（形状均为 (采样点数, 声道数)）"""
+        lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+
+        data = np.concatenate(arrays)
+
+        # 1. 静音裁剪：求出每个片段第一个/最后一个超过阈值的采样点
+        keep_start = starts.copy()
+        keep_end = ends.copy()
+        if self.trim_db is not None or self.max_gap_ms is not None:
+            trim_db = self.trim_db if self.trim_db is not None else DEFAULT_TRIM_DB
+            threshold = int(_db_to_amp(trim_db) * 32768)
+            # |x| > t 等价于 (x + t) 按无符号16位解释后 > 2t（整数域比较，不转浮点）
+            loud = ((data + np.int16(threshold)).view(np.uint16) > 2 * threshold).any(axis=1)
+
+            positions = np.flatnonzero(loud)
+
+            # 超阈值位置是有序的，二分查找即可得到各片段首尾的超阈值位置
+            first_idx = np.searchsorted(positions, starts)
+            last_idx = np.searchsorted(positions, ends) - 1
+            has_sound = first_idx <= last_idx
+            first = positions[first_idx[has_sound]]
+            last = positions[last_idx[has_sound]]
+
+            # 全程静音的片段保持原样
+            keep = self._keep_samples(sample_rate)
+            keep_start[has_sound] = np.maximum(first - keep, starts[has_sound])
+            keep_end[has_sound] = np.minimum(last + 1 + keep, ends[has_sound])
+        kept = keep_end - keep_start
+
+        data = np.concatenate([data[s:e] for s, e in zip(keep_start, keep_end)])
+        bounds = np.cumsum(kept) - kept
+
+        # 2. 响度归一化：各片段的RMS和峰值由 reduceat 一次算出（保持int16刻度，不做额外缩放）
+        gains = np.ones(len(arrays), dtype=np.float32)
+        if self.target_dbfs is not None and len(data):
+            valid = kept > 0
+            segments = bounds[valid]
+            flat = data.reshape(-1)
+            samples = flat.astype(np.float32)
+            energy = np.add.reduceat(np.square(samples), segments * data.shape[1])
+            peaks = np.maximum(
+                np.maximum.reduceat(flat, segments * data.shape[1]).astype(np.float32),
+                -np.minimum.reduceat(flat, segments * data.shape[1]).astype(np.float32)
+            )
+            rms = np.sqrt(energy / (kept[valid] * data.shape[1])) / 32768.0
+            peaks /= 32768.0
+
+            clip_gains = np.ones(len(segments), dtype=np.float32)
+            audible = rms > 1e-6
+            clip_gains[audible] = _db_to_amp(self.target_dbfs) / rms[audible]
+            limited = peaks * clip_gains > self.peak_limit
+            clip_gains[limited] = self.peak_limit / peaks[limited]
+            gains[valid] = clip_gains
+
+            # 3. 施加增益（峰值限制保证结果不超出int16范围）
+            samples *= np.repeat(gains, kept * data.shape[1])
+            np.rint(samples, out=samples)
+            data = samples.astype(np.int16).reshape(data.shape)
+
+        return np.split(data, bounds[1:])
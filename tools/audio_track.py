@@ -0,0 +1,249 @@
+"""
+项目音轨存储
+所有子分镜的PCM数据追加写入同一个WAV文件（Audio/track.wav），
+Subtitles.json 中记录每个子分镜的采样点偏移；读取时通过内存映射按偏移访问，
+不再为每个逗号片段单独生成一个WAV文件
+"""
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+TRACK_FILENAME = "track.wav"
+
+# PCM 16bit WAV 头长度
+WAV_HEADER_SIZE = 44
+
+
+def _to_pcm16(wav):
+    """将合成结果统一为 (采样点数, 声道数) 的 int16 数组"""
+    wav = np.asarray(wav)
+    if wav.ndim == 1:
+        wav = wav.reshape(-1, 1)
+    if np.issubdtype(wav.dtype, np.floating):
+        wav = np.clip(wav, -1.0, 1.0) * 32767
+    return wav.astype('<i2', copy=False)
+
+
+def _wav_header(sample_rate, channels, data_bytes):
+    byte_rate = sample_rate * channels * 2
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_bytes, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, byte_rate, channels * 2, 16,
+        b'data', data_bytes
+    )
+
+
+class AudioTrackWriter:
+    """单文件音轨写入器（追加PCM，关闭时回填WAV头）"""
+
+    def __init__(self, path, sample_rate=None, channels=1, resume_samples=None):
+        """
+        Args:
+            path: 音轨文件路径
+            sample_rate: 采样率，None表示由第一段音频决定
+            channels: 声道数
+            resume_samples: 续写已有音轨，保留前 resume_samples 个采样点，之后的数据截断
+        """
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        if resume_samples is not None and self.path.exists():
+            self.total_samples = resume_samples
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(WAV_HEADER_SIZE + resume_samples * channels * 2)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self.total_samples = 0
+            self._file = open(self.path, 'wb')
+            self._file.write(_wav_header(sample_rate or 0, channels, 0))
+
+    def append(self, sample_rate, wav):
+        """
+        追加一段音频
+
+        Returns:
+            tuple: (sample_offset, sample_count)
+        """
+        if self.sample_rate is None:
+            self.sample_rate = sample_rate
+        elif sample_rate != self.sample_rate:
+            raise ValueError(f"采样率不一致: {sample_rate} != {self.sample_rate}")
+
+        pcm = _to_pcm16(wav)
+        if pcm.shape[1] != self.channels:
+            raise ValueError(f"声道数不一致: {pcm.shape[1]} != {self.channels}")
+
+        offset = self.total_samples
+        self._file.write(pcm.tobytes())
+        self.total_samples += len(pcm)
+        return offset, len(pcm)
+
+    def close(self):
+        """回填WAV头并落盘（整个音轨只fsync一次）"""
+        if self._file.closed:
+            return
+        data_bytes = self.total_samples * self.channels * 2
+        self._file.seek(0)
+        self._file.write(_wav_header(self.sample_rate or 0, self.channels, data_bytes))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AudioTrackReader:
+    """内存映射的音轨读取器"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            header = f.read(WAV_HEADER_SIZE)
+        fields = struct.unpack('<4sI4s4sIHHIIHH4sI', header)
+        if fields[0] != b'RIFF' or fields[2] != b'WAVE' or fields[11] != b'data':
+            raise ValueError(f"不是有效的音轨文件: {self.path}")
+
+        self.channels = fields[6]
+        self.sample_rate = fields[7]
+        data_bytes = fields[12]
+        self.total_samples = data_bytes // (self.channels * 2)
+        self._data = np.memmap(
+            self.path, dtype='<i2', mode='r', offset=WAV_HEADER_SIZE,
+            shape=(self.total_samples, self.channels)
+        )
+
+    def clip(self, sample_offset, sample_count):
+        """按偏移读取一段音频（返回内存映射视图，不复制数据）"""
+        if sample_offset < 0 or sample_offset + sample_count > self.total_samples:
+            raise IndexError(
+                f"片段超出音轨范围: {sample_offset}+{sample_count} > {self.total_samples}"
+            )
+        return self._data[sample_offset:sample_offset + sample_count]
+
+    def clip_duration(self, sample_count):
+        return sample_count / self.sample_rate
+
+    @property
+    def duration(self):
+        return self.total_samples / self.sample_rate
+
+
+class TrackClipStore:
+    """子分镜音频写入单一音轨"""
+
+    mode = "track"
+
+    def __init__(self, audio_dir):
+        self.audio_dir = Path(audio_dir)
+        self.path = self.audio_dir / TRACK_FILENAME
+        self.writer = None
+
+    def resume(self, records):
+        """
+        续写中断的音轨：校验检查点记录的片段是否完整写入，截掉之后的残缺数据
+
+        Args:
+            records: 检查点记录列表（含 sample_rate、sample_count、location）
+
+        Returns:
+            list: 音轨中完整存在的记录
+        """
+        valid = []
+        if records and self.path.exists():
+            available = max(self.path.stat().st_size - WAV_HEADER_SIZE, 0) // 2
+            sample_rate = records[0]['sample_rate']
+            valid = [
+                r for r in records
+                if r['sample_rate'] == sample_rate
+                and r['location'].get('sample_offset', 0) + r['sample_count'] <= available
+            ]
+        if valid:
+            end = max(r['location']['sample_offset'] + r['sample_count'] for r in valid)
+            self.writer = AudioTrackWriter(self.path, valid[0]['sample_rate'], resume_samples=end)
+        return valid
+
+    def add(self, child, sample_rate, wav):
+        """
+        保存子分镜音频
+
+        Returns:
+            dict: 写入 Subtitles.json 子分镜条目的音频定位字段
+        """
+        if self.writer is None:
+            self.writer = AudioTrackWriter(self.path)
+        offset, count = self.writer.append(sample_rate, wav)
+        return {
+            "filename": TRACK_FILENAME,
+            "sample_offset": offset,
+            "sample_count": count
+        }
+
+    def close(self):
+        """
+        完成写入
+
+        Returns:
+            dict: 写入 Subtitles.json 顶层的音轨信息
+        """
+        if self.writer is None:
+            self.writer = AudioTrackWriter(self.path)
+        self.writer.close()
+        return {
+            "filename": TRACK_FILENAME,
+            "sample_rate": self.writer.sample_rate,
+            "channels": self.writer.channels,
+            "total_samples": self.writer.total_samples
+        }
+
+
+class FileClipStore:
+    """每个子分镜单独保存一个WAV文件（旧格式）"""
+
+    mode = "files"
+
+    def __init__(self, audio_dir, project_name):
+        self.audio_dir = Path(audio_dir)
+        self.project_name = project_name
+
+    def resume(self, records):
+        """校验检查点记录的WAV文件是否存在且采样点数一致"""
+        import soundfile as sf
+
+        valid = []
+        for r in records:
+            try:
+                info = sf.info(str(self.audio_dir / r['location']['filename']))
+            except Exception:
+                continue
+            if info.frames == r['sample_count'] and info.samplerate == r['sample_rate']:
+                valid.append(r)
+        return valid
+
+    def add(self, child, sample_rate, wav):
+        import soundfile as sf
+
+        filename = f"{self.project_name}_{child['child_index']:04d}.wav"
+        sf.write(str(self.audio_dir / filename), _to_pcm16(wav), sample_rate, subtype='PCM_16')
+        return {"filename": filename}
+
+    def close(self):
+        return None
+
+
+def open_clip_store(mode, audio_dir, project_name):
+    """
+    创建子分镜音频存储
+
+    Args:
+        mode: "track"（单一音轨）或 "files"（每句一个WAV）
+    """
+    if mode == "files":
+        return FileClipStore(audio_dir, project_name)
+    return TrackClipStore(audio_dir)
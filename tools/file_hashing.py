@@ -0,0 +1,14 @@
+"""
+文件内容哈希
+TTS缓存、音色目录和SDXL快照共用
+"""
+import hashlib
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """计算文件内容的SHA256"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
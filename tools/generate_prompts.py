@@ -5,19 +5,92 @@
 """
 import json
 from pathlib import Path
-from kimi_api import KimiAPI
+import kimi_api
+from kimi_api import get_kimi_api, AsyncKimiAPI, discard_cached
+from llm_resilience import LLMError
+from llm_cache import get_llm_cache
+from json_stream import JSONArrayStreamParser
+from structured_output import parse_json
+from prompt_batch_planner import (
+    estimate_tokens, plan_prompt_batches, fixed_size_batches, choose_model, FIXED_BATCH_SIZE
+)
+from metadata_reducer import split_into_chunks, merge_metadata, DEFAULT_CHUNK_TOKENS, METADATA_OUTPUT_TOKENS
+from app_config import get_setting
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import time
+from collections import Counter
+
+# 元数据回复的结构
+METADATA_SCHEMA = {
+    "type": "object",
+    "required": ["story_metadata", "global_settings"],
+    "properties": {
+        "story_metadata": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "genre": {"type": "string"},
+                "theme_tags": {"type": "array", "items": {"type": "string"}}
+            }
+        },
+        "global_settings": {
+            "type": "object",
+            "required": ["characters"],
+            "properties": {
+                "characters": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "required": ["name", "appearance", "clothing"],
+                        "properties": {
+                            "name": {"type": "string"},
+                            "appearance": {"type": "string"},
+                            "clothing": {"type": "string"}
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+# 提示词批次回复的结构
+BATCH_SCHEMA = {
+    "type": "object",
+    "required": ["scene_prompts"],
+    "properties": {
+        "scene_prompts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["prompt"],
+                "properties": {"line": {"type": "integer"}, "prompt": {"type": "string"}}
+            }
+        }
+    }
+}
 
 
 class PromptGenerator:
-    def __init__(self, project_name, agent_mode=False):
+    def __init__(self, project_name, agent_mode=False, max_in_flight=None, on_scene_prompt=None):
+        """
+        Args:
+            project_name: 项目名称
+            agent_mode: Agent模式标记
+            max_in_flight: 批次生成时同时进行的LLM请求数，默认读取config.json中的 kimi_max_in_flight
+            on_scene_prompt: 流式回调 on_scene_prompt(分镜序号, prompt)，
+                             每个提示词解析出来（已替换角色通配符）就调用，可用于提前开始生成图片
+        """
         self.project_name = project_name
         self.project_dir = Path("projects") / project_name
         self.audio_dir = self.project_dir / "Audio"
         self.subtitle_file = self.audio_dir / "Subtitles.json"
         self.prompts_file = self.project_dir / "Prompts.json"
         self.agent_mode = agent_mode  # Agent模式标记
+        self.max_in_flight = max_in_flight
+        self.on_scene_prompt = on_scene_prompt
+        # 本次运行的提示词统计：不完整回复中保留的、重新请求的、用简单提示词补全的（保存为 generation_stats）
+        self.stats = {"salvaged": 0, "retried": 0, "fallback": 0}
         
         # 加载两个PE
         self.pe_metadata = Path("PE") / "novel_to_prompts_metadata.txt"
@@ -32,17 +105,41 @@ class PromptGenerator:
     def generate_metadata(self, subtitles_data):
         """
         阶段1: 生成全局元数据（角色、风格等）
+        
+        小说超过 metadata_chunk_tokens 时分块并行提取后合并（见 metadata_reducer），
+        否则整篇一次请求
         """
         print("\n[阶段1] 生成全局元数据...")
         
         # 提取所有父分镜文本（如果是新格式）
         if 'parent_scenes' in subtitles_data:
-            all_text = "\n".join([scene['text'] for scene in subtitles_data['parent_scenes']])
+            texts = [scene['text'] for scene in subtitles_data['parent_scenes']]
         else:
             # 兼容旧格式
-            all_text = "\n".join([sub['text'] for sub in subtitles_data.get('subtitles', [])])
+            texts = [sub['text'] for sub in subtitles_data.get('subtitles', [])]
+        
+        chunk_tokens = int(get_setting("metadata_chunk_tokens", DEFAULT_CHUNK_TOKENS))
+        chunks = split_into_chunks(texts, chunk_tokens)
+        if len(chunks) > 1:
+            start = time.perf_counter()
+            print(f"  小说约 {sum(estimate_tokens(t) for t in texts)} tokens，分{len(chunks)}块并行提取后合并")
+            metadata = asyncio.run(self._generate_metadata_chunked(chunks))
+            print(f"  分块提取耗时: {time.perf_counter() - start:.1f}秒")
+        else:
+            metadata = self._generate_metadata_single("\n".join(texts))
         
-        api = KimiAPI()
+        print(f"✓ 元数据生成完成")
+        print(f"  主题标签: {metadata['story_metadata'].get('theme_tags', [])}")
+        print(f"  角色数: {len(metadata['global_settings']['characters'])}")
+        
+        return metadata
+    
+    def _metadata_messages(self, novel_text, part=None):
+        """构建元数据请求的消息，part=(第几块, 共几块)"""
+        if part:
+            heading = f"小说内容（第{part[0]}/{part[1]}部分，只根据这部分提取）："
+        else:
+            heading = "小说内容："
         
         # 将PE作为参考，而不是严格的system prompt
         user_content = f"""参考以下指导（可灵活调整）：
@@ -51,41 +148,92 @@ class PromptGenerator:
 
 ---
 
-小说内容：
+{heading}
 
-{all_text}"""
+{novel_text}"""
         
-        messages = [
+        return [
             {"role": "user", "content": user_content}
         ]
+    
+    @staticmethod
+    def _parse_metadata(response):
+        """解析元数据回复中的JSON（见 structured_output）"""
+        return parse_json(response, METADATA_SCHEMA)
+    
+    def _generate_metadata_single(self, all_text):
+        """整篇小说一次请求生成元数据"""
+        api = get_kimi_api()
         
-        response = api.chat(messages, model="moonshot-v1-128k", temperature=0.5)
+        messages = self._metadata_messages(all_text)
+        
+        response = api.chat(messages, model="moonshot-v1-128k", temperature=0.5, json_mode=True)
         
         if not response:
             raise Exception("元数据生成失败")
         
-        # 解析JSON
-        json_str = response
-        if "```json" in json_str:
-            json_str = json_str.split("```json")[1].split("```")[0]
-        elif "```" in json_str:
-            json_str = json_str.split("```")[1].split("```")[0]
+        try:
+            return self._parse_metadata(response)
+        except ValueError:
+            # 不缓存无法解析的回复，下次重新生成
+            discard_cached(messages, model="moonshot-v1-128k", temperature=0.5, json_mode=True)
+            raise
+    
+    async def _generate_metadata_chunked(self, chunks, max_retries=3):
+        """
+        分块并行提取元数据（map），再合并（reduce）
         
-        metadata = json.loads(json_str.strip())
-        print(f"✓ 元数据生成完成")
-        print(f"  主题标签: {metadata['story_metadata'].get('theme_tags', [])}")
-        print(f"  角色数: {len(metadata['global_settings']['characters'])}")
+        Args:
+            chunks: 分块后的父分镜文本
+            max_retries: 每块的最大尝试次数
+        """
+        total = len(chunks)
+        
+        async def extract(api, chunk_num, texts):
+            messages = self._metadata_messages("\n".join(texts), part=(chunk_num, total))
+            model = choose_model(estimate_tokens(messages[0]['content']) + METADATA_OUTPUT_TOKENS)
+            for retry in range(max_retries):
+                try:
+                    response = await api.chat(messages, model=model, temperature=0.5,
+                                              refresh_cache=retry > 0, json_mode=True)
+                    if not response:
+                        raise ValueError("空回复")
+                    return self._parse_metadata(response)
+                except LLMError as e:
+                    # 接口错误已由客户端退避重试（或已熔断），这里不再重复请求
+                    print(f"  ❌ 第{chunk_num}块提取失败: {e}")
+                    return None
+                except Exception as e:
+                    if retry < max_retries - 1:
+                        print(f"  ⚠ 第{chunk_num}块提取失败: {e}，第{retry+1}次重试...")
+                    else:
+                        print(f"  ❌ 第{chunk_num}块提取失败: {e}")
+            return None
+        
+        async with AsyncKimiAPI(max_in_flight=self.max_in_flight) as api:
+            results = await asyncio.gather(*(extract(api, i, texts) for i, texts in enumerate(chunks, 1)))
+        
+        parts = [r for r in results if r]
+        if not parts:
+            raise Exception("元数据生成失败")
+        if len(parts) < total:
+            print(f"  ⚠ {total - len(parts)}/{total} 块提取失败，使用其余 {len(parts)} 块的结果")
         
+        metadata = merge_metadata(parts)
+        extracted = sum(len(part.get('global_settings', {}).get('characters', [])) for part in parts)
+        print(f"  合并: 各块共提取 {extracted} 个角色，去重后 {len(metadata['global_settings']['characters'])} 个")
         return metadata
     
-    def generate_batch_prompts(self, metadata, subtitles_batch, start_index, max_retries=5):
+    def _batch_messages(self, metadata, subtitles_batch, lines=None):
         """
-        阶段2: 批次生成提示词（带重试机制）
+        构建批次请求的消息（不包含风格信息，风格由LoRA控制）
+        
+        Args:
+            lines: 各字幕的编号，默认 1..n；补充请求时保留原编号，回复按编号对应回字幕
         """
-        api = KimiAPI()
         expected_count = len(subtitles_batch)
-        
-        # 构建消息（不包含风格信息，风格由LoRA控制）
+        if lines is None:
+            lines = range(1, expected_count + 1)
         global_info = f"""
 角色设定：
 """
@@ -97,12 +245,10 @@ class PromptGenerator:
             story = metadata['story_metadata']
             global_info += f"\n故事类型: {story.get('genre', '未知')}\n"
         
-        subtitles_text = "\n".join([f"{i+1}. {sub['text']}" for i, sub in enumerate(subtitles_batch)])
+        subtitles_text = "\n".join([f"{line}. {sub['text']}" for line, sub in zip(lines, subtitles_batch)])
         
-        for retry in range(max_retries):
-            try:
-                # 将PE作为参考，而不是严格的system prompt
-                user_content = f"""参考以下指导（可灵活调整）：
+        # 将PE作为参考，而不是严格的system prompt
+        user_content = f"""参考以下指导（可灵活调整）：
 
 {self.system_prompt_batch}
 
@@ -113,54 +259,121 @@ class PromptGenerator:
 请为以下{expected_count}个字幕生成提示词（必须生成{expected_count}个）：
 
 {subtitles_text}"""
-                
-                messages = [
-                    {"role": "user", "content": user_content}
-                ]
-                
-                # 使用32k模型，更稳定，并限制输出长度
-                response = api.chat(
+        
+        return [
+            {"role": "user", "content": user_content}
+        ]
+    
+    def plan_batches(self, metadata, subtitles):
+        """
+        按token预算规划批次（见 prompt_batch_planner）
+        
+        Returns:
+            list[dict]: 批次规划
+        """
+        fixed_tokens = estimate_tokens(self._batch_messages(metadata, [])[0]['content'])
+        return plan_prompt_batches([sub['text'] for sub in subtitles], fixed_tokens)
+    
+    async def generate_batch_prompts(self, api, metadata, subtitles_batch, start_index, max_retries=5,
+                                     on_prompt=None, model="moonshot-v1-32k", max_tokens=4000):
+        """
+        阶段2: 批次生成提示词（带重试机制）
+        
+        回复以流式读取，scene_prompts 中每个对象一结束就交给 on_prompt，不必等整批写完。
+        回复中的提示词按 line 编号对应到字幕（没有编号的按顺序填入），回复不完整时保留已收到的，
+        只为缺少的字幕重新请求
+        
+        Args:
+            api: AsyncKimiAPI（所有批次共用，限速和并发由客户端控制）
+            on_prompt: 回调 on_prompt(批次内序号, prompt)
+            model: 使用的模型（由批次规划选择）
+            max_tokens: 输出上限
+        
+        Returns:
+            list: 与字幕一一对应的提示词，最终仍缺少的位置为None
+        """
+        expected_count = len(subtitles_batch)
+        slots = [None] * expected_count
+        
+        def emit(prompt, requested, pending):
+            """把一个提示词放到对应的字幕位置"""
+            if not isinstance(prompt, dict) or not prompt.get('prompt'):
+                return
+            line = prompt.pop('line', None)
+            try:
+                position = int(line) - 1
+            except (TypeError, ValueError):
+                position = None
+            if position not in requested:
+                # 没有编号（或编号不在本次请求中）时按顺序填入
+                position = next((p for p in pending if slots[p] is None), None)
+            if position is None or slots[position] is not None:
+                return
+            slots[position] = prompt
+            if on_prompt:
+                on_prompt(position, prompt)
+        
+        for retry in range(max_retries):
+            requested = [p for p in range(expected_count) if slots[p] is None]
+            if not requested:
+                break
+            if retry > 0:
+                self.stats['retried'] += len(requested)
+            
+            messages = self._batch_messages(
+                metadata, [subtitles_batch[p] for p in requested], lines=[p + 1 for p in requested]
+            )
+            requested_set = set(requested)
+            streamed = 0
+            try:
+                parser = JSONArrayStreamParser("scene_prompts")
+                parts = []
+                async for content in api.chat_stream(
                     messages, 
-                    model="moonshot-v1-32k", 
+                    model=model, 
                     temperature=0.5,  # 提高灵活性
-                    max_tokens=4000  # 限制输出，防止截断
-                )
+                    max_tokens=max_tokens,  # 按批次预估的输出预留，防止截断
+                    refresh_cache=retry > 0,  # 重试时不再使用缓存中的同一个回复
+                    json_mode=True
+                ):
+                    parts.append(content)
+                    for prompt in parser.feed(content):
+                        emit(prompt, requested_set, requested)
+                        streamed += 1
+                response = "".join(parts)
                 
                 if not response:
-                    if retry < max_retries - 1:
-                        print(f"  ⚠ 第{retry+1}次尝试失败，重试中...")
-                        continue
-                    return None
-                
-                # 解析JSON
-                json_str = response
-                if "```json" in json_str:
-                    json_str = json_str.split("```json")[1].split("```")[0]
-                elif "```" in json_str:
-                    json_str = json_str.split("```")[1].split("```")[0]
-                
-                batch_result = json.loads(json_str.strip())
-                prompts = batch_result.get('scene_prompts', [])
-                
-                # 验证数量
-                if len(prompts) < expected_count:
-                    if retry < max_retries - 1:
-                        print(f"  ⚠ 返回{len(prompts)}个，期望{expected_count}个，第{retry+1}次重试...")
-                        continue
-                    else:
-                        print(f"  ⚠ 最终只返回{len(prompts)}/{expected_count}个提示词")
-                
-                return prompts
+                    raise ValueError("空回复")
                 
+                if not streamed:
+                    # 流式解析没有识别出元素（如格式不规范）时，修复并解析完整回复
+                    batch_result = parse_json(response, BATCH_SCHEMA)
+                    for prompt in batch_result['scene_prompts']:
+                        emit(prompt, requested_set, requested)
+                error = None
             except Exception as e:
-                if retry < max_retries - 1:
-                    print(f"  ⚠ 解析失败: {e}，第{retry+1}次重试...")
-                    continue
-                else:
-                    print(f"  ❌ 解析失败: {e}")
-                    return None
-        
-        return None
+                error = e
+            
+            received = sum(1 for p in requested if slots[p] is not None)
+            if received == len(requested):
+                break
+            
+            # 不完整的回复中已收到的提示词保留下来
+            if received:
+                self.stats['salvaged'] += received
+            reason = f"解析失败: {error}" if error else f"返回{received}个，期望{len(requested)}个"
+            missing = len(requested) - received
+            if isinstance(error, LLMError) and not received:
+                # 接口错误已由客户端退避重试（或已熔断），这里不再重复请求；
+                # 回复中途断开时已收到部分提示词，继续补充请求缺少的
+                print(f"  ❌ {error}，缺少{missing}/{expected_count}个提示词")
+                break
+            if retry < max_retries - 1:
+                print(f"  ⚠ {reason}，保留{received}个，第{retry+1}次重试（只请求缺少的{missing}个）...")
+            else:
+                print(f"  ❌ {reason}，最终缺少{missing}/{expected_count}个提示词")
+        
+        return slots
     
     def generate_prompts(self, subtitle_file):
         """
@@ -193,104 +406,147 @@ class PromptGenerator:
             print(f"\n总字幕数: {total}")
         
         print("采用两阶段并发生成策略")
+        llm_snapshot = kimi_api.get_stats()
+        llm_cache = get_llm_cache()
+        cache_snapshot = llm_cache.stats() if llm_cache else None
+        
+        self.stats = {"salvaged": 0, "retried": 0, "fallback": 0}
         
         # 阶段1: 生成元数据
         metadata = self.generate_metadata(subtitles_data)
         
-        # 阶段2: 并发批次生成（每批5个，提高稳定性）
-        batch_size = 5
+        # 阶段2: 并发批次生成（按token预算打包批次，每批选择放得下的最便宜模型）
+        plan = self.plan_batches(metadata, subtitles)
         batches = []
         
         # 准备所有批次
-        for i in range(0, total, batch_size):
-            batch = subtitles[i:i+batch_size]
-            batches.append((metadata, batch, i+1, i // batch_size + 1))
+        for batch_num, batch_plan in enumerate(plan, 1):
+            i = batch_plan['start']
+            batch = subtitles[i:i+batch_plan['count']]
+            batches.append((metadata, batch, i+1, batch_num, batch_plan['model'], batch_plan['max_tokens']))
         
         total_batches = len(batches)
-        print(f"\n[阶段2] 并发生成提示词（{total_batches}个批次，每批{batch_size}个）...")
-        
-        # 使用线程池并发执行
-        all_prompts = [None] * total_batches
+        models = ", ".join(f"{m} ×{n}" for m, n in Counter(b['model'] for b in plan).items())
+        print(f"\n[阶段2] 并发生成提示词（{total_batches}个批次，固定每批{FIXED_BATCH_SIZE}个需"
+              f"{fixed_size_batches(total)}个；{models}）...")
         
-        def process_batch(args):
-            metadata, batch, start_index, batch_num = args
-            try:
-                print(f"\n批次 {batch_num}/{total_batches}: 第{start_index}-{start_index+len(batch)-1}个分镜 [开始]")
-                prompts = self.generate_batch_prompts(metadata, batch, start_index)
-                if prompts:
-                    print(f"✓ 批次{batch_num}完成，已生成{len(prompts)}个提示词")
-                    return (batch_num - 1, prompts)
-                else:
-                    print(f"❌ 批次{batch_num}失败")
-                    return (batch_num - 1, [])
-            except Exception as e:
-                print(f"❌ 批次{batch_num}出错: {e}")
-                return (batch_num - 1, [])
-        
-        # 并发执行（最多5个并发）
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            results = executor.map(process_batch, batches)
-            
-            for batch_idx, prompts in results:
-                all_prompts[batch_idx] = prompts
+        # 所有批次作为协程一次提交，同时进行的请求数和速率由异步客户端及全局限速器控制
+        character_map = self._character_map(metadata)
+        all_prompts = asyncio.run(self._generate_all_batches(batches, total_batches, character_map))
         
         # 合并结果（按顺序）并重新生成正确的index
         final_prompts = []
         current_index = 1
-        
-        # 构建角色通配符映射
-        character_map = {}
-        for char in metadata['global_settings']['characters']:
-            name = char['name']
-            full_desc = f"{char['appearance']}, {char['clothing']}"
-            character_map[f"{{{name}}}"] = full_desc
+        missing_indices = []
         
         for prompts in all_prompts:
-            if prompts:
-                for prompt in prompts:
+            for prompt in prompts:
+                if prompt is None:
+                    # 最终仍缺少的分镜用简单提示词补全
+                    prompt = {
+                        "prompt": f"{metadata['global_settings']['characters'][0]['appearance']}, {metadata['global_settings']['characters'][0]['clothing']}, {metadata['global_settings']['art_style']}, masterpiece, best quality, highly detailed, anime"
+                    }
+                    missing_indices.append(current_index)
+                else:
                     # 替换角色通配符
-                    prompt_text = prompt['prompt']
-                    for placeholder, full_desc in character_map.items():
-                        prompt_text = prompt_text.replace(placeholder, full_desc)
-                    
-                    # 重新设置index，确保连续
-                    prompt['index'] = current_index
-                    prompt['prompt'] = prompt_text
-                    final_prompts.append(prompt)
-                    current_index += 1
-        
-        # 检查是否有缺失的分镜
-        if len(final_prompts) < total:
-            print(f"\n⚠ 警告：只生成了{len(final_prompts)}/{total}个提示词，缺失{total - len(final_prompts)}个")
-            print("正在补全缺失的分镜...")
-            
-            # 找出缺失的index
-            existing_indices = set(range(1, len(final_prompts) + 1))
-            missing_indices = set(range(1, total + 1)) - existing_indices
-            
-            # 为缺失的分镜生成简单提示词
-            for idx in sorted(missing_indices):
-                subtitle = subtitles[idx - 1]
-                simple_prompt = {
-                    "index": idx,
-                    "prompt": f"{metadata['global_settings']['characters'][0]['appearance']}, {metadata['global_settings']['characters'][0]['clothing']}, {metadata['global_settings']['art_style']}, masterpiece, best quality, highly detailed, anime"
-                }
-                final_prompts.insert(idx - 1, simple_prompt)
-                print(f"  补全分镜 {idx}")
-            
-            # 重新排序
-            final_prompts.sort(key=lambda x: x['index'])
+                    prompt['prompt'] = self._replace_characters(prompt['prompt'], character_map)
+                
+                # 重新设置index，确保连续
+                prompt['index'] = current_index
+                final_prompts.append(prompt)
+                current_index += 1
+        
+        self.stats['fallback'] = len(missing_indices)
+        if missing_indices:
+            print(f"\n⚠ 警告：{len(missing_indices)}/{total}个分镜没有生成提示词，已用简单提示词补全: "
+                  f"{', '.join(map(str, missing_indices))}")
         
         result = {
             "story_metadata": metadata['story_metadata'],
             "global_settings": metadata['global_settings'],
-            "scene_prompts": final_prompts
+            "scene_prompts": final_prompts,
+            # 本次运行的提示词统计，随提示词一起保存
+            "generation_stats": dict(self.stats, total=total)
         }
         
         print(f"\n✓ 全部完成！共生成{len(final_prompts)}/{total}个提示词")
+        print(f"  不完整回复中保留 {self.stats['salvaged']} 个，重新请求 {self.stats['retried']} 个，"
+              f"简单提示词补全 {self.stats['fallback']} 个")
+        kimi_api.print_timing(kimi_api.stats_since(llm_snapshot))
+        if llm_cache:
+            cache_stats = llm_cache.stats_since(cache_snapshot)
+            print(f"  LLM缓存: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，"
+                  f"命中率 {cache_stats['hit_rate']:.0%}")
         
         return result
     
+    @staticmethod
+    def _character_map(metadata):
+        """构建角色通配符映射 {角色名} -> 外貌, 服装"""
+        character_map = {}
+        for char in metadata['global_settings']['characters']:
+            name = char['name']
+            full_desc = f"{char['appearance']}, {char['clothing']}"
+            character_map[f"{{{name}}}"] = full_desc
+        return character_map
+    
+    @staticmethod
+    def _replace_characters(prompt_text, character_map):
+        """替换提示词中的角色通配符"""
+        for placeholder, full_desc in character_map.items():
+            prompt_text = prompt_text.replace(placeholder, full_desc)
+        return prompt_text
+    
+    async def _generate_all_batches(self, batches, total_batches, character_map):
+        """并发生成所有批次，返回按批次顺序排列的提示词列表（缺少的位置为None）"""
+        phase_start = time.perf_counter()
+        first_prompt_times = []  # 每个批次从开始到流出第一个提示词的秒数
+        batch_times = []         # 每个批次完成的秒数
+        first_prompt_at = []     # 阶段2开始到第一个提示词的秒数
+        
+        async with AsyncKimiAPI(max_in_flight=self.max_in_flight) as api:
+            async def process_batch(metadata, batch, start_index, batch_num, model, max_tokens):
+                batch_start = time.perf_counter()
+                emitted = []
+                
+                def on_prompt(position, prompt):
+                    emitted.append(position)
+                    if len(emitted) == 1:
+                        now = time.perf_counter()
+                        first_prompt_times.append(now - batch_start)
+                        if not first_prompt_at:
+                            first_prompt_at.append(now - phase_start)
+                    if self.on_scene_prompt:
+                        prompt = dict(prompt)
+                        prompt['prompt'] = self._replace_characters(prompt.get('prompt', ''), character_map)
+                        self.on_scene_prompt(start_index + position, prompt)
+                
+                try:
+                    print(f"\n批次 {batch_num}/{total_batches}: 第{start_index}-{start_index+len(batch)-1}个分镜 [开始]")
+                    prompts = await self.generate_batch_prompts(api, metadata, batch, start_index,
+                                                                on_prompt=on_prompt, model=model,
+                                                                max_tokens=max_tokens)
+                    batch_times.append(time.perf_counter() - batch_start)
+                    received = sum(1 for prompt in prompts if prompt is not None)
+                    if received:
+                        print(f"✓ 批次{batch_num}完成，已生成{received}/{len(batch)}个提示词")
+                    else:
+                        print(f"❌ 批次{batch_num}失败")
+                    return prompts
+                except Exception as e:
+                    print(f"❌ 批次{batch_num}出错: {e}")
+                    return [None] * len(batch)
+            
+            print(f"  同时进行的请求: {api.max_in_flight} 个")
+            results = await asyncio.gather(*(process_batch(*args) for args in batches))
+        
+        if first_prompt_times:
+            # 首个提示词耗时 = 阶段2开始到任意批次流出第一个提示词
+            print(f"  首个提示词耗时: {first_prompt_at[0]:.1f}秒（阶段2共 {time.perf_counter() - phase_start:.1f}秒）")
+            print(f"  流式输出: 批次平均 {sum(first_prompt_times) / len(first_prompt_times):.1f}秒出首个提示词，"
+                  f"{sum(batch_times) / len(batch_times):.1f}秒完成")
+        return results
+    
     def save_prompts(self, prompts, output_file):
         """保存提示词到文件"""
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -318,6 +574,10 @@ class PromptGenerator:
         
         scenes = prompts.get('scene_prompts', [])
         print(f"\n分镜数量: {len(scenes)}")
+        stats = prompts.get('generation_stats')
+        if stats:
+            print(f"  不完整回复中保留 {stats['salvaged']} 个，重新请求 {stats['retried']} 个，"
+                  f"简单提示词补全 {stats['fallback']} 个")
         
         # 显示前3个示例
         print(f"\n前3个分镜示例:")
@@ -0,0 +1,36 @@
+"""
+常驻GPU模型登记
+TTS服务和SDXL管线服务各自登记释放空闲模型的函数，加载模型前通过这里释放其他服务的空闲模型，
+两个服务互不导入
+"""
+import threading
+
+_releasers = {}  # 名称 -> 释放函数 release() -> 释放的模型数
+_lock = threading.Lock()
+
+
+def register_resident(name, release):
+    """
+    登记一类常驻模型
+
+    Args:
+        name: 名称（如 "tts"、"sdxl"），重复登记时覆盖
+        release: 释放空闲模型的函数，返回释放的模型数（是否释放由各服务自己判断，如只在显存紧张时）
+    """
+    with _lock:
+        _releasers[name] = release
+
+
+def release_idle_residents(exclude=None):
+    """
+    释放已登记的其他服务的空闲模型（加载模型前调用）
+
+    Args:
+        exclude: 不释放的名称（调用方自己）
+
+    Returns:
+        int: 释放的模型数
+    """
+    with _lock:
+        releasers = [release for name, release in _releasers.items() if name != exclude]
+    return sum(release() for release in releasers)
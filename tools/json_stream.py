@@ -0,0 +1,103 @@
+"""
+增量JSON数组解析
+流式回复逐段到达时，找到指定键（如 scene_prompts）对应的数组，
+数组中每个对象的右括号一出现就解析并返回该对象，不必等整个回复结束
+"""
+import json
+
+from structured_output import parse_json
+
+
+class JSONArrayStreamParser:
+    """从逐段到达的文本中增量解出 "key": [ {...}, {...} ] 的各个元素"""
+
+    def __init__(self, key="scene_prompts"):
+        """
+        Args:
+            key: 目标数组的键名（在任意嵌套层级首次出现的那个）
+        """
+        self.key = key
+        self.done = False        # 目标数组已结束
+        self.elements = []       # 已解析出的元素
+        self._buffer = []        # 当前元素的文本（只保留正在解析的对象）
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string = []        # 当前字符串的内容（用于识别键名）
+        self._last_string = None
+        self._value_key = None   # 冒号前的键名
+        self._array_depth = None # 目标数组所在的层级
+        self._in_element = False
+
+    def feed(self, text):
+        """
+        输入新到达的文本
+
+        Returns:
+            list: 本次新解析出的元素
+        """
+        emitted = []
+        if self.done:
+            return emitted
+
+        buffer = self._buffer
+        for c in text:
+            if self._in_element:
+                buffer.append(c)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if not self._in_element:
+                        self._last_string = "".join(self._string)
+                elif not self._in_element:
+                    self._string.append(c)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if not self._in_element:
+                    self._string = []
+            elif c == ':':
+                self._value_key = self._last_string
+            elif c == '{' or c == '[':
+                self._depth += 1
+                if self._array_depth is None:
+                    if c == '[' and self._value_key == self.key:
+                        self._array_depth = self._depth
+                elif c == '{' and self._depth == self._array_depth + 1 and not self._in_element:
+                    self._in_element = True
+                    buffer.append(c)
+                self._value_key = None
+            elif c == '}' or c == ']':
+                if self._in_element and self._depth == self._array_depth + 1:
+                    self._in_element = False
+                    element = self._parse("".join(buffer))
+                    buffer.clear()
+                    if element is not None:
+                        self.elements.append(element)
+                        emitted.append(element)
+                elif c == ']' and self._depth == self._array_depth:
+                    self.done = True
+                    break
+                self._depth -= 1
+                self._value_key = None
+            elif c == ',':
+                self._value_key = None
+        return emitted
+
+    @staticmethod
+    def _parse(text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+        # 尾逗号、未转义的引号等常见问题在本地修复
+        try:
+            return parse_json(text, {"type": "object"})
+        except ValueError:
+            return None
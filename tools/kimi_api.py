@@ -2,57 +2,519 @@
 Kimi API工具
 支持超长文本处理
 """
-import requests
+import asyncio
 import json
-from pathlib import Path
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app_config import get_setting
+from rate_limiter import TokenBucket, parse_retry_after
+from llm_cache import get_llm_cache
+from llm_resilience import (
+    RetryPolicy, RetryState, CircuitBreaker, LatencyTracker, LLMError, error_for_status,
+    DEFAULT_MAX_ATTEMPTS, DEFAULT_BASE_DELAY, DEFAULT_MAX_DELAY,
+    DEFAULT_FAILURE_THRESHOLD, DEFAULT_RESET_TIMEOUT
+)
+
+DEFAULT_BASE_URL = "https://api.moonshot.cn/v1"
+DEFAULT_MODEL = "moonshot-v1-auto"  # 使用 auto 自动选择最佳模型（包括k2）
+
+# 默认最大连接数（与提示词批次的并发数一致）
+DEFAULT_MAX_CONNECTIONS = 5
+
+# 默认限速：每分钟请求数、允许的突发请求数、异步客户端同时进行的请求数
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_BURST = 5
+DEFAULT_MAX_IN_FLIGHT = 5
+
+# 429限流后最多重试的次数
+RATE_LIMIT_RETRIES = 5
+
+# 对冲请求最早在发出后多少秒触发（近期p95更长时按p95）
+DEFAULT_HEDGE_MIN_DELAY = 5.0
+
+# 保留最近多少次请求的耗时明细
+RECENT_REQUESTS = 1000
+
+# 当前线程内本次请求新建连接的耗时（TCP + TLS握手）
+_connect_timing = threading.local()
+
+
+class _TimedConnectionMixin:
+    """记录建立连接（含TLS握手）的耗时"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_timing.connects = getattr(_connect_timing, 'connects', 0) + 1
+        _connect_timing.seconds = getattr(_connect_timing, 'seconds', 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _PooledAdapter(HTTPAdapter):
+    """连接池适配器：连接保持复用，并记录新建连接的耗时"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    获取进程内共享的HTTP会话（keep-alive连接池）
+
+    连接数上限读取config.json中的 kimi_max_connections；
+    连接都在使用中时，新请求等待空闲连接，而不是额外建立连接
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            max_connections = get_setting("kimi_max_connections", DEFAULT_MAX_CONNECTIONS)
+            adapter = _PooledAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    获取进程内共享的限速器（同步和异步客户端、所有任务共用）
+
+    速率读取config.json中的 kimi_requests_per_minute 和 kimi_burst
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = TokenBucket.per_minute(
+                get_setting("kimi_requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE),
+                get_setting("kimi_burst", DEFAULT_BURST)
+            )
+        return _limiter
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """
+    获取进程内共享的熔断器（同步和异步客户端、所有任务共用）
+
+    参数读取config.json中的 kimi_breaker_threshold（连续失败次数，0表示不熔断）和 kimi_breaker_reset（秒）
+    """
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                get_setting("kimi_breaker_threshold", DEFAULT_FAILURE_THRESHOLD),
+                get_setting("kimi_breaker_reset", DEFAULT_RESET_TIMEOUT)
+            )
+        return _breaker
+
+
+def _retry_policy():
+    """重试策略（config.json中的 kimi_retry_attempts、kimi_retry_base_delay、kimi_retry_max_delay）"""
+    return RetryPolicy(
+        get_setting("kimi_retry_attempts", DEFAULT_MAX_ATTEMPTS),
+        get_setting("kimi_retry_base_delay", DEFAULT_BASE_DELAY),
+        get_setting("kimi_retry_max_delay", DEFAULT_MAX_DELAY)
+    )
+
+
+# 成功请求的耗时（按模型），对冲请求按近期p95触发
+_latency = LatencyTracker()
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor():
+    """同步客户端发送对冲请求用的线程池"""
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            workers = 2 * get_setting("kimi_max_connections", DEFAULT_MAX_CONNECTIONS)
+            _hedge_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kimi-hedge")
+        return _hedge_executor
+
+
+# 请求耗时统计（进程内所有KimiAPI实例共享）
+_stats = {
+    "requests": 0,
+    "errors": 0,
+    "new_connections": 0,
+    "connect_time": 0.0,
+    "ttfb_time": 0.0,
+    "total_time": 0.0,
+    "rate_limited": 0,
+    "wait_time": 0.0,
+    "retries": 0,
+    "backoff_time": 0.0,
+    "breaker_opens": 0,
+    "breaker_rejections": 0,
+    "hedged": 0,
+    "hedge_wins": 0
+}
+_recent = deque(maxlen=RECENT_REQUESTS)
+_stats_lock = threading.Lock()
+
+
+def _record_wait(seconds):
+    """记录限速器等待时间"""
+    if seconds > 0:
+        with _stats_lock:
+            _stats["wait_time"] += seconds
+
+
+def _record_event(name, value=1):
+    """记录容错事件（重试、退避时间、熔断、对冲）"""
+    with _stats_lock:
+        _stats[name] += value
+
+
+def _record_request(model, connects, connect_time, ttfb, total, error=None):
+    with _stats_lock:
+        _stats["requests"] += 1
+        if error == "429":
+            _stats["rate_limited"] += 1
+        _stats["new_connections"] += connects
+        _stats["connect_time"] += connect_time
+        _stats["ttfb_time"] += ttfb
+        _stats["total_time"] += total
+        if error:
+            _stats["errors"] += 1
+        _recent.append({
+            "model": model,
+            "reused": connects == 0,
+            "connect": connect_time,
+            "ttfb": ttfb,
+            "total": total,
+            "error": error
+        })
+
+
+def get_stats():
+    """获取累计请求统计"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def stats_since(snapshot):
+    """计算从snapshot（get_stats的返回值）到现在的增量"""
+    current = get_stats()
+    return {key: current[key] - snapshot.get(key, 0) for key in current}
+
+
+def recent_requests():
+    """最近请求的耗时明细（connect：建立连接耗时，ttfb：收到响应头的耗时，total：总耗时，单位秒）"""
+    with _stats_lock:
+        return list(_recent)
+
+
+def print_timing(delta):
+    """打印LLM请求耗时"""
+    count = delta["requests"]
+    if not count:
+        return
+    print(f"  LLM请求: {count} 次（失败 {delta['errors']} 次），新建连接 {delta['new_connections']} 次，"
+          f"握手共 {delta['connect_time']:.2f}秒")
+    print(f"  LLM耗时: 平均首字节 {delta['ttfb_time'] / count:.2f}秒，"
+          f"平均总耗时 {delta['total_time'] / count:.2f}秒")
+    if delta.get("rate_limited") or delta.get("wait_time"):
+        print(f"  LLM限速: 排队等待共 {delta['wait_time']:.1f}秒，服务端限流(429) {delta['rate_limited']} 次")
+    if delta.get("retries") or delta.get("breaker_rejections") or delta.get("hedged"):
+        print(f"  LLM容错: 重试 {delta['retries']} 次（退避共 {delta['backoff_time']:.1f}秒），"
+              f"熔断 {delta['breaker_opens']} 次、拒绝请求 {delta['breaker_rejections']} 次，"
+              f"对冲请求 {delta['hedged']} 次（先返回 {delta['hedge_wins']} 次）")
+
+
+def _check_response(response):
+    """错误响应转为分类后的LLMError（requests与httpx的响应通用，流式响应需先读取响应体）"""
+    status = response.status_code
+    if status < 400:
+        return
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    retry_after = parse_retry_after(response.headers.get("Retry-After")) if status == 429 else None
+    raise error_for_status(status, body, retry_after)
+
+
+def _before_retry(limiter, error, state):
+    """
+    打印重试原因；429按Retry-After暂停所有调用方
+
+    Returns:
+        float: 本调用方还需等待的秒数（退避时间）
+    """
+    if error.kind == "rate_limit":
+        print(f"  ⚠ API限流(429)，{state.delay:.1f}秒后重试...")
+        limiter.pause(state.delay)
+        return 0.0
+    print(f"  ⚠ {error}，{state.delay:.1f}秒后第{state.attempts}次重试...")
+    return state.delay
+
+
+def _build_payload(messages, model, temperature, stream=False, max_tokens=None, json_mode=False):
+    """构建chat/completions请求体（json_mode：要求接口只返回JSON对象，可用config.json中的 kimi_json_mode 关闭）"""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "stream": stream
+    }
+    
+    # 只有指定了max_tokens才添加
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    if json_mode and get_setting("kimi_json_mode", True):
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+def discard_cached(messages, model=DEFAULT_MODEL, temperature=0.3, max_tokens=None, json_mode=False):
+    """删除某个请求的缓存回复（回复无法解析时调用，下次重新请求；参数与原请求一致）"""
+    cache = get_llm_cache()
+    if cache is not None:
+        payload = _build_payload(messages, model, temperature, max_tokens=max_tokens, json_mode=json_mode)
+        cache.discard(_cache_key(cache, payload))
+
+
+def _cache_key(cache, payload):
+    return cache.make_key(payload["model"], payload["messages"], payload["temperature"],
+                          payload.get("max_tokens"), payload.get("response_format"))
+
+
+def _cache_lookup(payload, use_cache, refresh_cache):
+    """
+    查询响应缓存（流式与非流式请求共用同一个缓存键）
+
+    Returns:
+        tuple: (缓存对象或None, 缓存键, 命中的回复或None)
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return None, None, None
+    if not use_cache:
+        cache.skip()
+        return None, None, None
+    key = _cache_key(cache, payload)
+    if refresh_cache:
+        cache.skip()
+        return cache, key, None
+    return cache, key, cache.get(key)
+
 
 class KimiAPI:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=None):
         """
         初始化Kimi API
         
         Args:
             api_key: API密钥，如果不提供则从config.json读取
+            base_url: 接口地址，默认读取config.json中的 kimi_base_url（如本地模拟服务），未配置时使用Moonshot
         """
-        if api_key:
-            self.api_key = api_key
-        else:
-            # 从config.json读取
-            config_path = Path(__file__).parent.parent / "config.json"
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                self.api_key = config.get('kimi_api_key')
+        self.api_key = api_key or get_setting('kimi_api_key')
         
         if not self.api_key:
             raise ValueError("未找到API密钥")
         
-        self.base_url = "https://api.moonshot.cn/v1"
-        self.model = "moonshot-v1-auto"  # 使用 auto 自动选择最佳模型（包括k2）
+        self.base_url = (base_url or get_setting("kimi_base_url") or DEFAULT_BASE_URL).rstrip("/")
+        self.model = DEFAULT_MODEL
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.session = get_session()
+        self.limiter = get_rate_limiter()
+        self.breaker = get_circuit_breaker()
+        self.retry_policy = _retry_policy()
+        self.hedge = get_setting("kimi_hedge_enabled", False)
+        self.hedge_min_delay = get_setting("kimi_hedge_min_delay", DEFAULT_HEDGE_MIN_DELAY)
+        self.max_connections = get_setting("kimi_max_connections", DEFAULT_MAX_CONNECTIONS)
     
-    def test_connection(self):
-        """测试API连接"""
+    def _wait_for_token(self):
+        """从共享限速器取令牌，需要时等待"""
+        wait = self.limiter.reserve()
+        if wait > 0:
+            _record_wait(wait)
+            time.sleep(wait)
+    
+    def _retry_state(self):
+        return RetryState(self.retry_policy, self.breaker, _record_event, RATE_LIMIT_RETRIES)
+    
+    def _hedge_after(self, model):
+        """对冲请求的触发时间（未开启或耗时样本不足时为None）"""
+        if not self.hedge:
+            return None
+        p95 = _latency.percentile(model)
+        return None if p95 is None else max(p95, self.hedge_min_delay)
+    
+    def _post(self, payload, timeout):
+        """
+        发送请求：熔断器放行后从共享限速器取令牌；429按Retry-After暂停所有调用方，
+        5xx、超时和连接错误按指数退避重试，其余错误直接抛出（均为LLMError）
+        """
+        state = self._retry_state()
+        while True:
+            state.check()
+            try:
+                self._wait_for_token()
+                return state.succeeded(self._attempt(payload, timeout))
+            except Exception as e:
+                error = state.failed(e)
+                time.sleep(_before_retry(self.limiter, error, state))
+    
+    def _attempt(self, payload, timeout):
+        """
+        发送一次请求；开启对冲时，超过近期p95仍未返回且限速器有空闲令牌，就再发一个相同的请求，
+        先成功的结果生效（同步请求无法中途取消，落后的请求在后台完成后丢弃）
+        """
+        hedge_after = self._hedge_after(payload.get("model"))
+        if hedge_after is None:
+            return self._send_once(payload, timeout)
+        
+        executor = _get_hedge_executor()
+        primary = executor.submit(self._send_once, payload, timeout)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done or not self.limiter.try_acquire():
+            return primary.result()
+        
+        _record_event("hedged")
+        hedge = executor.submit(self._send_once, payload, timeout)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        _record_event("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def _send_once(self, payload, timeout):
+        """发送一次非流式请求，返回解析后的响应体，成功时记录耗时供对冲使用"""
+        start = time.perf_counter()
+        response = self._send(payload, timeout)
+        _check_response(response)
+        result = response.json()
+        _latency.add(payload.get("model"), time.perf_counter() - start)
+        return result
+    
+    def _stream(self, payload, timeout):
+        """
+        流式请求（熔断、限速和重试同 _post，只在收到内容之前重试），逐段产出回复内容，读完响应体后记录耗时
+        """
+        state = self._retry_state()
+        while True:
+            state.check()
+            yielded = False
+            try:
+                self._wait_for_token()
+                response = self._send(payload, timeout, stream=True)
+                model, connects, connect_time, ttfb, start = response.timing
+                error = str(response.status_code) if response.status_code >= 400 else None
+                try:
+                    _check_response(response)
+                    for content in _iter_sse_content(response.iter_lines()):
+                        yielded = True
+                        yield content
+                except Exception as e:
+                    error = error or type(e).__name__
+                    raise
+                finally:
+                    response.close()
+                    _record_request(model, connects, connect_time, ttfb, time.perf_counter() - start, error)
+                state.succeeded(None)
+                return
+            except Exception as e:
+                error = state.failed(e, retry=not yielded)
+                time.sleep(_before_retry(self.limiter, error, state))
+    
+    def _send(self, payload, timeout, stream=False):
+        """
+        发送一次请求（复用连接池）并记录耗时
+        流式请求收到响应后把计时信息放在 response.timing，由 _stream 读完响应体后记录
+        """
+        _connect_timing.connects = 0
+        _connect_timing.seconds = 0.0
+        start = time.perf_counter()
+        ttfb = 0.0
+        error = None
+        response = None
         try:
-            print("正在测试Kimi API连接...")
-            
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/chat/completions",
                 headers=self.headers,
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "user", "content": "你好"}
-                    ],
-                    "temperature": 0.3
-                },
-                timeout=10
+                json=payload,
+                timeout=timeout,
+                stream=stream
             )
+            ttfb = response.elapsed.total_seconds()
+            if response.status_code >= 400:
+                error = str(response.status_code)
+            if stream:
+                response.timing = (payload.get("model"), _connect_timing.connects,
+                                   _connect_timing.seconds, ttfb, start)
+            return response
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            if not stream or response is None:
+                _record_request(payload.get("model"), _connect_timing.connects, _connect_timing.seconds,
+                                ttfb, time.perf_counter() - start, error)
+    
+    def test_connection(self):
+        """测试API连接"""
+        try:
+            print("正在测试Kimi API连接...")
             
-            response.raise_for_status()
-            result = response.json()
+            result = self._post({
+                "model": self.model,
+                "messages": [
+                    {"role": "user", "content": "你好"}
+                ],
+                "temperature": 0.3
+            }, timeout=10)
             
             print("✓ API连接成功！")
             print(f"✓ 模型响应: {result['choices'][0]['message']['content']}")
@@ -62,7 +524,8 @@ class KimiAPI:
             print(f"❌ API连接失败: {e}")
             return False
     
-    def chat(self, messages, model=None, temperature=0.3, stream=False, max_tokens=None):
+    def chat(self, messages, model=None, temperature=0.3, stream=False, max_tokens=None,
+             use_cache=True, refresh_cache=False, json_mode=False):
         """
         调用Kimi聊天API
         
@@ -76,41 +539,61 @@ class KimiAPI:
             temperature: 温度参数 0-1
             stream: 是否流式输出
             max_tokens: 最大输出token数，None表示不限制
+            use_cache: 是否使用响应缓存（需在config.json中开启 llm_cache_enabled），False时本次既不读也不写
+            refresh_cache: 跳过缓存读取、重新请求并覆盖缓存（如重试时不想拿回同一个不合格的回复）
+            json_mode: 使用接口的JSON模式（response_format=json_object），回复为纯JSON对象
         
         Returns:
             str: AI回复内容
+        
+        Raises:
+            LLMError: 重试后仍然失败（kind 区分限流、服务端错误、超时、连接错误、请求错误和熔断）
         """
+        # 如果没指定模型，使用默认的auto模型
+        if model is None:
+            model = self.model
+        
+        payload = _build_payload(messages, model, temperature, stream, max_tokens, json_mode)
+        cache, key, cached = _cache_lookup(payload, use_cache, refresh_cache)
+        if cached is not None:
+            return cached
+        
         try:
-            # 如果没指定模型，使用默认的auto模型
-            if model is None:
-                model = self.model
-            
-            payload = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature,
-                "stream": stream
-            }
-            
-            # 只有指定了max_tokens才添加
-            if max_tokens is not None:
-                payload["max_tokens"] = max_tokens
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=300  # 增加超时时间到300秒（5分钟）
-            )
-            
-            response.raise_for_status()
-            result = response.json()
-            
-            return result['choices'][0]['message']['content']
-            
-        except Exception as e:
+            if stream:
+                # 流式读取后拼接为完整回复
+                content = "".join(self._stream(payload, timeout=300))
+            else:
+                result = self._post(payload, timeout=300)  # 增加超时时间到300秒（5分钟）
+                content = result['choices'][0]['message']['content']
+        except LLMError as e:
             print(f"API调用失败: {e}")
-            return None
+            raise
+        if cache is not None and content:
+            cache.put(key, content, model=model)
+        return content
+    
+    def chat_stream(self, messages, model=None, temperature=0.3, max_tokens=None,
+                    use_cache=True, refresh_cache=False, json_mode=False):
+        """
+        流式调用Kimi聊天API，回复内容边生成边产出（参数同chat）
+        
+        缓存命中时一次产出完整回复；请求失败时抛出LLMError
+        
+        Yields:
+            str: 回复内容片段
+        """
+        payload = _build_payload(messages, model or self.model, temperature, True, max_tokens, json_mode)
+        cache, key, cached = _cache_lookup(payload, use_cache, refresh_cache)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        for content in self._stream(payload, timeout=300):
+            parts.append(content)
+            yield content
+        if cache is not None and parts:
+            cache.put(key, "".join(parts), model=payload["model"])
     
     def translate_prompt(self, chinese_text):
         """
@@ -161,6 +644,309 @@ class KimiAPI:
         return self.chat(messages, model="moonshot-v1-128k")
 
 
+class AsyncKimiAPI:
+    """
+    asyncio版Kimi API（httpx.AsyncClient）
+    与同步KimiAPI共享限速器和请求统计，多个任务同时运行时合计不超过配额；
+    同一客户端内同时进行的请求数不超过 max_in_flight
+    
+    用法：
+        async with AsyncKimiAPI() as api:
+            reply = await api.chat(messages)
+    """
+    
+    def __init__(self, api_key=None, max_in_flight=None, base_url=None):
+        """
+        Args:
+            api_key: API密钥，如果不提供则从config.json读取
+            max_in_flight: 同时进行的请求数，默认读取config.json中的 kimi_max_in_flight
+            base_url: 接口地址，默认读取config.json中的 kimi_base_url，未配置时使用Moonshot
+        """
+        self.api_key = api_key or get_setting('kimi_api_key')
+        if not self.api_key:
+            raise ValueError("未找到API密钥")
+        
+        self.base_url = (base_url or get_setting("kimi_base_url") or DEFAULT_BASE_URL).rstrip("/")
+        self.model = DEFAULT_MODEL
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        self.limiter = get_rate_limiter()
+        self.breaker = get_circuit_breaker()
+        self.retry_policy = _retry_policy()
+        self.hedge = get_setting("kimi_hedge_enabled", False)
+        self.hedge_min_delay = get_setting("kimi_hedge_min_delay", DEFAULT_HEDGE_MIN_DELAY)
+        self.max_in_flight = max_in_flight or get_setting("kimi_max_in_flight", DEFAULT_MAX_IN_FLIGHT)
+        self._client = None
+        self._in_flight = None
+    
+    async def __aenter__(self):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("AsyncKimiAPI需要httpx，请运行: pip install httpx（或 pip install -r requirements.txt）")
+        
+        self._client = httpx.AsyncClient(
+            timeout=300,  # 与同步客户端一致，5分钟
+            limits=httpx.Limits(
+                # 对冲请求不占用并发名额，另外预留连接
+                max_connections=self.max_in_flight * (2 if self.hedge else 1),
+                max_keepalive_connections=self.max_in_flight
+            )
+        )
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+        self._client = None
+    
+    async def _wait_for_token(self):
+        """从共享限速器取令牌（等待时不阻塞事件循环）"""
+        wait = self.limiter.reserve()
+        if wait > 0:
+            _record_wait(wait)
+            await asyncio.sleep(wait)
+    
+    def _retry_state(self):
+        return RetryState(self.retry_policy, self.breaker, _record_event, RATE_LIMIT_RETRIES)
+    
+    def _hedge_after(self, model):
+        """对冲请求的触发时间（未开启或耗时样本不足时为None）"""
+        if not self.hedge:
+            return None
+        p95 = _latency.percentile(model)
+        return None if p95 is None else max(p95, self.hedge_min_delay)
+    
+    async def _post(self, payload):
+        """发送请求（熔断、限速、退避重试和对冲同 KimiAPI._post），退避等待时不占用并发名额"""
+        state = self._retry_state()
+        while True:
+            state.check()
+            try:
+                async with self._in_flight:
+                    await self._wait_for_token()
+                    result = await self._attempt(payload)
+                return state.succeeded(result)
+            except Exception as e:
+                error = state.failed(e)
+                await asyncio.sleep(_before_retry(self.limiter, error, state))
+    
+    async def _attempt(self, payload):
+        """发送一次请求；对冲规则同 KimiAPI._attempt，先成功的结果生效，落后的请求被取消"""
+        hedge_after = self._hedge_after(payload.get("model"))
+        if hedge_after is None:
+            return await self._send_once(payload)
+        
+        primary = asyncio.ensure_future(self._send_once(payload))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if done or not self.limiter.try_acquire():
+                return await primary
+            
+            _record_event("hedged")
+            hedge = asyncio.ensure_future(self._send_once(payload))
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            _record_event("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+    
+    async def _send_once(self, payload):
+        """发送一次非流式请求，返回解析后的响应体，成功时记录耗时供对冲使用"""
+        response, timing, start = await self._send(payload)
+        error = str(response.status_code) if response.status_code >= 400 else None
+        _record_request(*timing, time.perf_counter() - start, error)
+        _check_response(response)
+        result = response.json()
+        _latency.add(payload.get("model"), time.perf_counter() - start)
+        return result
+    
+    async def _stream(self, payload):
+        """流式请求（熔断、限速和重试同 _post，只在收到内容之前重试），逐段产出回复内容，读完响应体后记录耗时"""
+        state = self._retry_state()
+        while True:
+            state.check()
+            yielded = False
+            try:
+                async with self._in_flight:
+                    await self._wait_for_token()
+                    response, timing, start = await self._send(payload, stream=True)
+                    error = str(response.status_code) if response.status_code >= 400 else None
+                    try:
+                        if error:
+                            await response.aread()
+                            _check_response(response)
+                        async for line in response.aiter_lines():
+                            parsed = _parse_sse_line(line)
+                            if parsed is _SSE_DONE:
+                                break
+                            for content in parsed or ():
+                                yielded = True
+                                yield content
+                    except Exception as e:
+                        error = error or type(e).__name__
+                        raise
+                    finally:
+                        await response.aclose()
+                        _record_request(*timing, time.perf_counter() - start, error)
+                state.succeeded(None)
+                return
+            except Exception as e:
+                error = state.failed(e, retry=not yielded)
+                await asyncio.sleep(_before_retry(self.limiter, error, state))
+    
+    async def _send(self, payload, stream=False):
+        """
+        发送一次请求，通过httpx的trace事件记录建连和首字节耗时
+        
+        Returns:
+            tuple: (response, (model, 新建连接数, 建连耗时, 首字节耗时), 开始时间)，
+                   总耗时由调用方读完响应体后计算；请求异常时在这里记录
+        """
+        marks = {}
+        
+        async def trace(event_name, info):
+            marks.setdefault(event_name, time.perf_counter())
+        
+        def timing():
+            connects = 0
+            connect_time = 0.0
+            if "connection.connect_tcp.started" in marks:
+                connects = 1
+                connected = marks.get("connection.start_tls.complete",
+                                      marks.get("connection.connect_tcp.complete", start))
+                connect_time = connected - marks["connection.connect_tcp.started"]
+            headers_at = marks.get("http11.receive_response_headers.complete",
+                                   marks.get("http2.receive_response_headers.complete"))
+            ttfb = headers_at - start if headers_at else 0.0
+            return payload.get("model"), connects, connect_time, ttfb
+        
+        start = time.perf_counter()
+        request = self._client.build_request(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            json=payload,
+            extensions={"trace": trace}
+        )
+        try:
+            response = await self._client.send(request, stream=stream)
+        except Exception as e:
+            _record_request(*timing(), time.perf_counter() - start, type(e).__name__)
+            raise
+        return response, timing(), start
+    
+    async def chat(self, messages, model=None, temperature=0.3, max_tokens=None,
+                   use_cache=True, refresh_cache=False, json_mode=False):
+        """
+        调用Kimi聊天API（参数与KimiAPI.chat一致）
+        
+        Returns:
+            str: AI回复内容
+        
+        Raises:
+            LLMError: 重试后仍然失败
+        """
+        payload = _build_payload(messages, model or self.model, temperature, max_tokens=max_tokens,
+                                 json_mode=json_mode)
+        cache, key, cached = _cache_lookup(payload, use_cache, refresh_cache)
+        if cached is not None:
+            return cached
+        
+        try:
+            result = await self._post(payload)
+        except LLMError as e:
+            print(f"API调用失败: {e}")
+            raise
+        content = result['choices'][0]['message']['content']
+        if cache is not None and content:
+            cache.put(key, content, model=payload["model"])
+        return content
+    
+    async def chat_stream(self, messages, model=None, temperature=0.3, max_tokens=None,
+                          use_cache=True, refresh_cache=False, json_mode=False):
+        """
+        流式调用Kimi聊天API（参数与KimiAPI.chat_stream一致）
+        
+        Yields:
+            str: 回复内容片段
+        """
+        payload = _build_payload(messages, model or self.model, temperature, True, max_tokens, json_mode)
+        cache, key, cached = _cache_lookup(payload, use_cache, refresh_cache)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        async for content in self._stream(payload):
+            parts.append(content)
+            yield content
+        if cache is not None and parts:
+            cache.put(key, "".join(parts), model=payload["model"])
+
+
+# SSE结束标记
+_SSE_DONE = object()
+
+
+def _parse_sse_line(line):
+    """
+    解析流式回复（SSE）的一行
+
+    Returns:
+        None（非数据行）、_SSE_DONE（结束）或本行 delta.content 片段的列表
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return _SSE_DONE
+    chunk = json.loads(data)
+    return [
+        (choice.get("delta") or {}).get("content")
+        for choice in chunk.get("choices") or []
+        if (choice.get("delta") or {}).get("content")
+    ]
+
+
+def _iter_sse_content(lines):
+    """逐段产出流式回复的内容"""
+    for line in lines:
+        parsed = _parse_sse_line(line)
+        if parsed is _SSE_DONE:
+            break
+        if parsed:
+            yield from parsed
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_kimi_api():
+    """获取进程内共享的KimiAPI客户端（config.json只读取一次，连接池在所有调用方之间复用）"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = KimiAPI()
+        return _client
+
+
 def main():
     """测试Kimi API"""
     print("=" * 70)
@@ -170,7 +956,7 @@ def main():
     try:
         # 初始化
         print("\n[1/3] 初始化API...")
-        api = KimiAPI()
+        api = get_kimi_api()
         print("✓ API初始化成功")
         
         # 测试连接
@@ -190,6 +976,8 @@ def main():
             translated = api.translate_prompt(prompt)
             print(f"英文: {translated}")
         
+        print()
+        print_timing(get_stats())
         print("\n" + "=" * 70)
         print("✓ 测试完成！")
         print("=" * 70)
@@ -0,0 +1,219 @@
+"""
+LLM响应缓存
+按（模型, 消息列表, 温度, 最大输出token数）的哈希把回复保存在磁盘上，
+重跑同一篇小说时，请求完全相同的元数据、提示词批次、Agent推理都直接返回缓存，不再调用API。
+默认关闭，在config.json中设置 llm_cache_enabled 开启
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from app_config import get_setting
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_CACHE_DIR = PROJECT_ROOT / "cache" / "llm_responses"
+
+# 默认缓存上限 256MB，默认有效期 7天
+DEFAULT_MAX_MB = 256
+DEFAULT_TTL_HOURS = 168
+
+# 缓存格式版本，格式变化时修改以使旧缓存失效
+CACHE_VERSION = "2"
+
+
+class LLMResponseCache:
+    """LLM响应磁盘缓存（过期失效 + LRU淘汰）"""
+
+    def __init__(self, cache_dir=None, max_bytes=None, ttl=None):
+        """
+        Args:
+            cache_dir: 缓存目录，默认读取config.json中的 llm_cache_dir，
+                       未配置时使用 <项目根目录>/cache/llm_responses
+            max_bytes: 缓存容量上限（字节），默认读取 llm_cache_max_mb
+            ttl: 有效期（秒），默认读取 llm_cache_ttl_hours，<=0 表示永不过期
+        """
+        if cache_dir is None:
+            cache_dir = get_setting("llm_cache_dir") or DEFAULT_CACHE_DIR
+        if max_bytes is None:
+            max_bytes = int(get_setting("llm_cache_max_mb", DEFAULT_MAX_MB)) * 1024 * 1024
+        if ttl is None:
+            ttl = float(get_setting("llm_cache_ttl_hours", DEFAULT_TTL_HOURS)) * 3600
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_tokens=None, response_format=None):
+        """
+        生成缓存键（消息列表按JSON规范化后参与哈希，JSON模式与普通请求的回复格式不同，分开缓存）
+        """
+        request = json.dumps(
+            [CACHE_VERSION, model, messages, temperature, max_tokens, response_format],
+            ensure_ascii=False, sort_keys=True, separators=(',', ':')
+        )
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """
+        查询缓存
+
+        Returns:
+            str: 缓存的回复内容，未命中或已过期返回None
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is not None and self.ttl > 0 and time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            entry = None
+
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新访问时间，用于LRU淘汰
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return entry["response"]
+
+    def skip(self):
+        """记录一次跳过缓存的请求（调用方指定不使用缓存）"""
+        with self._lock:
+            self.bypassed += 1
+
+    def put(self, key, response, **extra):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            response: 回复内容
+            extra: 额外记录的信息（如model）
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        old_size = path.stat().st_size if path.exists() else 0
+
+        entry = {"created": time.time(), "response": response, **extra}
+
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes += path.stat().st_size - old_size
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def discard(self, key):
+        """删除一条缓存（调用方发现缓存的回复不可用时，避免下次再命中同一个回复）"""
+        self._remove(self._path(key))
+
+    def _remove(self, path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def evict(self):
+        """按最近访问时间淘汰旧条目，直到低于容量上限的90%"""
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                total -= size
+                removed += 1
+
+            self._total_bytes = total
+        if removed:
+            print(f"  LLM缓存淘汰 {removed} 条旧回复")
+        return removed
+
+    def stats(self):
+        """命中/未命中统计"""
+        with self._lock:
+            hits, misses, bypassed = self.hits, self.misses, self.bypassed
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "bypassed": bypassed,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "size_mb": self._total_bytes / 1024 / 1024
+        }
+
+    def stats_since(self, snapshot):
+        """计算从snapshot（stats的返回值）到现在的命中统计"""
+        current = self.stats()
+        delta = {key: current[key] - snapshot.get(key, 0) for key in ("hits", "misses", "bypassed")}
+        lookups = delta["hits"] + delta["misses"]
+        delta["hit_rate"] = delta["hits"] / lookups if lookups else 0.0
+        delta["size_mb"] = current["size_mb"]
+        return delta
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    获取进程内共享的LLM响应缓存
+
+    Returns:
+        LLMResponseCache，config.json中未开启 llm_cache_enabled 时返回None
+    """
+    global _cache
+    if not get_setting("llm_cache_enabled", False):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
@@ -0,0 +1,328 @@
+"""
+LLM调用的容错策略
+- 错误分类：限流(429)、服务端错误(5xx)、超时、连接错误可以重试；请求本身有误(4xx)直接失败
+- 重试：指数退避 + 随机抖动（full jitter），避免大量调用方在同一时刻重试
+- 熔断：连续失败达到阈值后一段时间内直接失败，不再请求已经不可用的接口，
+  冷却后放行一个探测请求，成功则恢复
+- 对冲请求：耗时超过近期p95仍未返回时再发一个相同的请求，先返回的结果生效
+熔断器、耗时统计与限速器一样在进程内共享，同步和异步客户端共用
+"""
+import random
+import threading
+import time
+from collections import deque
+
+# 默认重试参数：每次请求最多尝试次数、退避基数和上限（秒）
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+# 默认熔断参数：连续失败次数、熔断后的冷却时间（秒）
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# 对冲请求：统计耗时的样本数、开始对冲所需的最少样本数
+LATENCY_SAMPLES = 200
+MIN_LATENCY_SAMPLES = 20
+
+# 按异常类名识别超时和连接错误（requests与httpx，不在这里导入httpx）
+_TIMEOUT_ERRORS = {"Timeout", "ReadTimeout", "ConnectTimeout", "TimeoutException", "WriteTimeout",
+                   "PoolTimeout", "TimeoutError"}
+_CONNECTION_ERRORS = {"ConnectionError", "ConnectError", "ChunkedEncodingError", "ProtocolError",
+                      "RemoteProtocolError", "ReadError", "WriteError", "NetworkError", "TransportError"}
+
+
+class LLMError(Exception):
+    """
+    分类后的LLM调用错误
+
+    Attributes:
+        kind: rate_limit / server / timeout / connection / client / circuit_open
+        status: HTTP状态码（没有响应时为None）
+        retryable: 是否可以重试
+        retry_after: 429响应要求的等待秒数
+    """
+    kind = "error"
+    retryable = False
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimitError(LLMError):
+    kind = "rate_limit"
+    retryable = True
+
+
+class ServerError(LLMError):
+    kind = "server"
+    retryable = True
+
+
+class LLMTimeoutError(LLMError):
+    kind = "timeout"
+    retryable = True
+
+
+class LLMConnectionError(LLMError):
+    kind = "connection"
+    retryable = True
+
+
+class ClientError(LLMError):
+    kind = "client"
+
+
+class CircuitOpenError(LLMError):
+    kind = "circuit_open"
+
+
+def _error_message(status, body):
+    """从错误响应体中取出接口返回的说明"""
+    try:
+        return f"HTTP {status}: {body['error']['message']}"
+    except (TypeError, KeyError):
+        return f"HTTP {status}"
+
+
+def error_for_status(status, body=None, retry_after=None):
+    """
+    按HTTP状态码生成分类错误
+
+    Args:
+        status: 状态码（>=400）
+        body: 解析后的响应体（用于错误说明，可为None）
+        retry_after: 429的等待秒数
+    """
+    message = _error_message(status, body)
+    if status == 429:
+        return RateLimitError(message, status, retry_after)
+    if status == 408:
+        return LLMTimeoutError(message, status)
+    if status >= 500:
+        return ServerError(message, status)
+    return ClientError(message, status)
+
+
+def classify_error(exc):
+    """
+    把异常归类为LLMError（已分类的原样返回）
+
+    requests/httpx 的 HTTPError 按响应状态码分类；超时和连接错误按异常类名识别；
+    其他异常（如回复不是JSON）不重试
+    """
+    if isinstance(exc, LLMError):
+        return exc
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None and status >= 400:
+        return error_for_status(status)
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & _TIMEOUT_ERRORS:
+        return LLMTimeoutError(f"请求超时: {exc}")
+    if names & _CONNECTION_ERRORS:
+        return LLMConnectionError(f"连接失败: {exc}")
+    return LLMError(f"{type(exc).__name__}: {exc}")
+
+
+class RetryPolicy:
+    """指数退避重试策略（full jitter：在 0 ~ min(上限, 基数×2^n) 之间随机等待）"""
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, rng=None):
+        """
+        Args:
+            max_attempts: 每次调用最多尝试次数（含第一次），429另按限速器处理
+            base_delay: 第一次重试的退避上限（秒）
+            max_delay: 退避上限（秒）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def delay(self, retry):
+        """第retry次重试（从1开始）前的等待秒数"""
+        cap = min(self.max_delay, self.base_delay * (2 ** (retry - 1)))
+        return self._rng.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    熔断器（closed → open → half_open）
+
+    只有服务端错误、超时和连接错误计为失败；429和4xx说明接口仍在正常响应，计为成功
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后熔断，<=0 表示不熔断
+            reset_timeout: 熔断后多少秒放行探测请求
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def retry_in(self):
+        """熔断状态下距离放行探测请求的秒数"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self):
+        """是否放行本次请求（半开状态只放行一个探测请求）"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """
+        记录一次失败
+
+        Returns:
+            bool: 本次失败是否触发了熔断
+        """
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (
+                    state == self.CLOSED and 0 < self.failure_threshold <= self._failures):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+                return True
+            return False
+
+
+class LatencyTracker:
+    """按模型统计最近成功请求的耗时，给出p95作为对冲请求的触发时间"""
+
+    def __init__(self, samples=LATENCY_SAMPLES, min_samples=MIN_LATENCY_SAMPLES):
+        self.samples = samples
+        self.min_samples = min_samples
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def add(self, model, seconds):
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.samples)).append(seconds)
+
+    def percentile(self, model, q=0.95):
+        """
+        Returns:
+            float: 该模型最近耗时的q分位数，样本不足时返回None
+        """
+        with self._lock:
+            values = sorted(self._latencies.get(model, ()))
+        if len(values) < self.min_samples:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class RetryState:
+    """
+    一次调用的重试状态（同步和异步客户端共用）
+
+    用法：
+        state = RetryState(policy, breaker, on_event)
+        while True:
+            state.check()
+            try:
+                return state.succeeded(send())
+            except Exception as e:
+                error = state.failed(e)   # 不再重试时抛出分类后的错误
+                sleep(error.retry_after if error.kind == "rate_limit" else state.delay)
+    """
+
+    def __init__(self, policy, breaker, on_event=None, rate_limit_retries=5):
+        """
+        Args:
+            on_event: 事件回调 on_event(名称, 数值)，用于统计重试、退避和熔断
+            rate_limit_retries: 429最多重试次数（不占用 policy.max_attempts）
+        """
+        self.policy = policy
+        self.breaker = breaker
+        self.on_event = on_event or (lambda name, value=1: None)
+        self.rate_limit_retries = rate_limit_retries
+        self.attempts = 0
+        self.rate_limited = 0
+        self.delay = 0.0
+
+    def check(self):
+        """请求前检查熔断器，熔断中直接抛出 CircuitOpenError"""
+        if not self.breaker.allow():
+            self.on_event("breaker_rejections")
+            raise CircuitOpenError(f"接口连续失败，已熔断，{self.breaker.retry_in():.1f}秒后再试")
+
+    def succeeded(self, result):
+        self.breaker.record_success()
+        return result
+
+    def failed(self, exc, retry=True):
+        """
+        记录一次失败并决定是否重试
+
+        Args:
+            retry: False表示本次不能重试（如流式回复已经产出部分内容），只记录熔断并抛出
+
+        Returns:
+            LLMError: 分类后的错误（可以重试；需要等待的秒数在 self.delay）
+        Raises:
+            LLMError: 不可重试或重试次数用完
+        """
+        error = classify_error(exc)
+        if error.kind in ("server", "timeout", "connection"):
+            if self.breaker.record_failure():
+                self.on_event("breaker_opens")
+        else:
+            # 接口仍在响应（429、4xx等），半开状态下的探测也算成功
+            self.breaker.record_success()
+
+        if retry and error.kind == "rate_limit" and self.rate_limited < self.rate_limit_retries:
+            # 429按Retry-After等待，不计入重试次数
+            self.rate_limited += 1
+            self.delay = error.retry_after or 0.0
+            return error
+
+        self.attempts += 1
+        if (not retry or not error.retryable or error.kind == "rate_limit"
+                or self.attempts >= self.policy.max_attempts):
+            raise error from exc
+        self.delay = self.policy.delay(self.attempts)
+        self.on_event("retries")
+        self.on_event("backoff_time", self.delay)
+        return error
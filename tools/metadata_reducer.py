@@ -0,0 +1,131 @@
+"""
+分块元数据提取的切分与合并
+整本小说超出单次请求的上下文时，按固定token数把父分镜切成若干块，各块并行提取角色和设定（map），
+再在本地合并为一份元数据（reduce）：同名角色去重，外貌/服装等描述按出现次数投票，
+输出与单次请求相同的 story_metadata / global_settings 结构
+"""
+import re
+from collections import Counter
+
+from prompt_batch_planner import estimate_tokens
+
+# 每块的默认token数（小说正文部分）
+DEFAULT_CHUNK_TOKENS = 16000
+
+# 每块请求预留的输出token数（角色列表）
+METADATA_OUTPUT_TOKENS = 2000
+
+# 角色名中去除的括号注释和符号，如 "林默（女主）"、"「林默」"
+_NAME_NOTE = re.compile(r'[（(【\[].*?[）)】\]]')
+_NAME_STRIP = '"\'「」『』《》 \t·.'
+
+
+def split_into_chunks(texts, max_tokens=DEFAULT_CHUNK_TOKENS):
+    """
+    按token数把相邻的父分镜文本分块（不拆开单个父分镜）
+
+    Args:
+        texts: 父分镜文本列表
+        max_tokens: 每块的token上限，<=0 表示不分块
+
+    Returns:
+        list[list[str]]: 分块后的文本
+    """
+    if max_tokens <= 0:
+        return [list(texts)] if texts else []
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def normalize_name(name):
+    """角色名规范化（去掉括号注释、引号和空白），用于去重"""
+    name = _NAME_NOTE.sub('', str(name or ''))
+    return name.strip(_NAME_STRIP).casefold()
+
+
+def _vote(values):
+    """出现次数最多的非空值，次数相同取最早出现的（列表、字典等取最早出现的）"""
+    values = [v for v in values if v]
+    if any(isinstance(v, (list, dict)) for v in values):
+        return values[0]
+    counts = Counter(values)
+    if not counts:
+        return ""
+    best = max(counts.values())
+    return next(v for v in values if counts[v] == best)
+
+
+def merge_metadata(parts):
+    """
+    合并各块提取的元数据
+
+    Args:
+        parts: 各块的元数据（按小说顺序），结构同单次请求的结果
+
+    Returns:
+        dict: {"story_metadata": {...}, "global_settings": {"characters": [...], ...}}
+    """
+    # ---------- 角色：按规范化的名字分组 ----------
+    groups = {}
+    for chunk_index, part in enumerate(parts):
+        for char in part.get('global_settings', {}).get('characters', []):
+            key = normalize_name(char.get('name'))
+            if not key:
+                continue
+            group = groups.setdefault(key, {"first": chunk_index, "chunks": set(), "entries": []})
+            group["chunks"].add(chunk_index)
+            group["entries"].append(char)
+
+    characters = []
+    # 出现在越多块中的角色越靠前（主角通常排第一），次数相同按首次出现顺序
+    for group in sorted(groups.values(), key=lambda g: (-len(g["chunks"]), g["first"])):
+        entries = group["entries"]
+        merged = {}
+        for field in dict.fromkeys(k for entry in entries for k in entry):
+            merged[field] = _vote([entry.get(field) for entry in entries])
+        # 名字用最短的写法（通常是不带注释的本名）
+        merged['name'] = min((str(e['name']).strip() for e in entries if e.get('name')), key=len)
+        characters.append(merged)
+
+    # ---------- 其他全局设定：按出现次数投票 ----------
+    global_settings = {}
+    setting_keys = dict.fromkeys(k for part in parts for k in part.get('global_settings', {}))
+    for key in setting_keys:
+        if key == 'characters':
+            continue
+        global_settings[key] = _vote([part.get('global_settings', {}).get(key) for part in parts])
+    global_settings['characters'] = characters
+
+    # ---------- 故事信息 ----------
+    story_metadata = {}
+    stories = [part.get('story_metadata', {}) for part in parts]
+    for key in dict.fromkeys(k for story in stories for k in story):
+        if key == 'theme_tags':
+            continue
+        story_metadata[key] = _vote([story.get(key) for story in stories])
+
+    # 标签按出现次数排序，数量不超过单块返回的最大数量
+    tag_lists = [story.get('theme_tags') or [] for story in stories]
+    tag_counts = Counter(tag for tags in tag_lists for tag in dict.fromkeys(tags))
+    first_seen = list(dict.fromkeys(tag for tags in tag_lists for tag in tags))
+    ranked = sorted(first_seen, key=lambda tag: -tag_counts[tag])
+    story_metadata['theme_tags'] = ranked[:max((len(tags) for tags in tag_lists), default=0)]
+
+    return {
+        "story_metadata": story_metadata,
+        "global_settings": global_settings
+    }
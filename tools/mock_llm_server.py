@@ -0,0 +1,443 @@
+"""
+本地模拟LLM服务（OpenAI兼容的 /v1/chat/completions，支持流式SSE）
+不需要Moonshot密钥就能运行提示词生成和Agent流程，用于离线调整并发、限速和重试参数：
+- 回放录制的回复：录制目录与LLM响应缓存格式相同（开启 llm_cache_enabled 并把 llm_cache_dir 指向录制目录，
+  用真实接口跑一遍即可录制），按（模型, 消息, 温度, max_tokens）查找
+- 没有录制时按请求内容合成回复：元数据、提示词批次、Agent思考/决策、质量评估、参数调整
+- 可配置的故障：固定延迟 + 按token计的预填充/生成耗时、随机500错误、随机429和每分钟请求数上限（带Retry-After）、
+  截断的JSON、格式不规范的JSON（夹杂说明文字、尾逗号、中文引号等）、少返回分镜的批次、超出模型上下文时返回400
+- 请求带 response_format={"type": "json_object"}（JSON模式）时返回纯JSON，不加代码块和说明文字，也不注入格式问题
+
+用法：
+    python tools/mock_llm_server.py --port 8001 --latency 0.3 --error-rate 0.05 --short-rate 0.2
+    然后在config.json中设置 "kimi_base_url": "http://127.0.0.1:8001/v1"
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from llm_cache import LLMResponseCache
+from prompt_batch_planner import estimate_tokens
+
+# 各模型的上下文长度
+MODEL_CONTEXTS = {
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+    "moonshot-v1-auto": 131072,
+}
+
+# Agent工作流的步骤顺序（合成决策时按顺序选择下一步）
+AGENT_STEPS = ["generate_audio", "generate_prompts", "generate_images", "compose_video"]
+
+# 流式回复每个分片的字符数
+STREAM_CHUNK_CHARS = 16
+
+# 注入的JSON格式问题：夹杂说明文字、尾逗号、中文引号键名、代码块没有结束标记
+MALFORMED_KINDS = ["prose", "trailing_comma", "chinese_quotes", "unclosed_fence"]
+
+
+class MockLLMServer:
+    """模拟LLM服务（后台线程运行，可作为上下文管理器使用）"""
+
+    def __init__(self, host="127.0.0.1", port=0, fixtures=None, latency=0.0, prefill_per_1k=0.0,
+                 decode_per_token=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 requests_per_minute=0, retry_after=1.0, truncate_rate=0.0, short_rate=0.0,
+                 malformed_rate=0.0, seed=None):
+        """
+        Args:
+            host, port: 监听地址，port=0 时自动分配
+            fixtures: 录制目录（LLM响应缓存格式），None表示只合成回复
+            latency: 每个请求的固定延迟（秒）
+            prefill_per_1k: 每1000个输入token的耗时（秒）
+            decode_per_token: 每个输出token的耗时（秒），流式回复按分片逐步发送
+            jitter: 延迟的随机浮动比例（0.2表示±20%）
+            error_rate: 返回500的概率
+            rate_limit_rate: 随机返回429的概率
+            requests_per_minute: 每分钟请求数上限，超出返回429，0表示不限
+            retry_after: 429响应的Retry-After（秒）
+            truncate_rate: 回复被截断（JSON不完整）的概率
+            short_rate: 提示词批次少返回分镜的概率
+            malformed_rate: JSON回复格式不规范的概率（JSON模式的请求不受影响）
+            seed: 随机种子
+        """
+        self.fixtures = LLMResponseCache(fixtures, max_bytes=float('inf'), ttl=0) if fixtures else None
+        self.latency = latency
+        self.prefill_per_1k = prefill_per_1k
+        self.decode_per_token = decode_per_token
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests_per_minute = requests_per_minute
+        self.retry_after = retry_after
+        self.truncate_rate = truncate_rate
+        self.short_rate = short_rate
+        self.malformed_rate = malformed_rate
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()  # 最近一分钟内的请求时间
+        self.stats = {
+            "requests": 0,
+            "replayed": 0,
+            "synthesized": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "too_long": 0,
+            "truncated": 0,
+            "short": 0,
+            "malformed": 0,
+        }
+
+        handler = type("Handler", (_MockHandler,), {"mock": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _chance(self, probability):
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < probability
+
+    def _rate_limited(self):
+        """每分钟请求数上限"""
+        if self.requests_per_minute <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.requests_per_minute:
+                return True
+            self._recent.append(now)
+            return False
+
+    def delay(self, seconds):
+        """按jitter随机浮动后休眠"""
+        if seconds <= 0:
+            return
+        if self.jitter > 0:
+            with self._lock:
+                seconds *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, seconds))
+
+    def handle(self, payload):
+        """
+        处理一个请求
+
+        Returns:
+            tuple: (HTTP状态码, 回复文本或错误体, 额外响应头)
+        """
+        self._count("requests")
+        if self._rate_limited() or self._chance(self.rate_limit_rate):
+            self._count("rate_limited")
+            return 429, _error("rate_limit_reached_error", "Rate limit reached"), \
+                {"Retry-After": f"{self.retry_after:g}"}
+        if self._chance(self.error_rate):
+            self._count("errors")
+            return 500, _error("server_error", "The engine is currently overloaded"), {}
+
+        messages = payload.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        input_tokens = estimate_tokens(prompt)
+        context = MODEL_CONTEXTS.get(payload.get("model"), MODEL_CONTEXTS["moonshot-v1-auto"])
+        if input_tokens > context:
+            self._count("too_long")
+            return 400, _error("invalid_request_error",
+                               f"Invalid request: exceeded model token limit: {context}"), {}
+
+        reply = None
+        if self.fixtures is not None:
+            key = self.fixtures.make_key(payload.get("model"), messages, payload.get("temperature"),
+                                         payload.get("max_tokens"), payload.get("response_format"))
+            reply = self.fixtures.get(key)
+        if reply is not None:
+            self._count("replayed")
+        else:
+            reply = synthesize_reply(prompt)
+            self._count("synthesized")
+
+        if self._chance(self.short_rate):
+            shortened = _drop_scenes(reply, self._random, self._lock)
+            if shortened is not None:
+                reply = shortened
+                self._count("short")
+        if (payload.get("response_format") or {}).get("type") == "json_object":
+            reply = _unfenced(reply)
+        elif self._chance(self.malformed_rate):
+            malformed = _malform(reply, self._random, self._lock)
+            if malformed is not None:
+                reply = malformed
+                self._count("malformed")
+        if self._chance(self.truncate_rate) and len(reply) > 1:
+            with self._lock:
+                cut = self._random.randint(len(reply) // 4, len(reply) * 3 // 4)
+            reply = reply[:cut]
+            self._count("truncated")
+
+        self.delay(self.latency + input_tokens / 1000 * self.prefill_per_1k)
+        return 200, reply, {}
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock = None
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已放弃请求（如对冲请求中落后的一个被取消）
+            pass
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list",
+                                  "data": [{"id": model, "object": "model"} for model in MODEL_CONTEXTS]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, dict(self.mock.stats))
+        else:
+            self._send_json(404, _error("not_found", self.path))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._send_json(400, _error("invalid_request_error", "Invalid JSON body"))
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, _error("not_found", self.path))
+            return
+
+        status, reply, headers = self.mock.handle(payload)
+        if status != 200:
+            self._send_json(status, reply, headers)
+            return
+
+        model = payload.get("model")
+        if not payload.get("stream"):
+            self.mock.delay(estimate_tokens(reply) * self.mock.decode_per_token)
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                             "finish_reason": "stop"}],
+                "usage": {"completion_tokens": estimate_tokens(reply)}
+            })
+            return
+
+        # 流式：按分片发送，每片的耗时按其token数计算
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for start in range(0, len(reply), STREAM_CHUNK_CHARS):
+                piece = reply[start:start + STREAM_CHUNK_CHARS]
+                self.mock.delay(estimate_tokens(piece) * self.mock.decode_per_token)
+                event = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def _error(error_type, message):
+    return {"error": {"type": error_type, "message": message}}
+
+
+def _fenced(data):
+    return "```json\n" + json.dumps(data, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _unfenced(reply):
+    """JSON模式：去掉代码块标记"""
+    match = re.fullmatch(r"```json\n(.*)\n```", reply, re.S)
+    return match.group(1) if match else reply
+
+
+def _malform(reply, rng=None, lock=None, kind=None):
+    """给JSON回复加上一种常见的格式问题（kind见 MALFORMED_KINDS，None时随机选择），不是JSON回复时返回None"""
+    match = re.search(r"\{.*\}", reply, re.S)
+    if not match:
+        return None
+    data = match.group(0)
+    if kind is None:
+        with lock:
+            kind = rng.choice(MALFORMED_KINDS)
+    if kind == "prose":
+        # 没有代码块，前后夹杂说明文字
+        return f"好的，结果如下：\n{data}\n以上内容可根据需要调整。"
+    if kind == "trailing_comma":
+        return reply.replace(data, re.sub(r'(["\d\]}])(\s*\n\s*[}\]])', r'\1,\2', data))
+    if kind == "chinese_quotes":
+        # 键名用中文引号和全角冒号
+        return reply.replace(data, re.sub(r'"(\w+)": ', r'“\1”：', data))
+    # 代码块没有结束标记，后面还有说明文字
+    return f"```json\n{data}\n\n如需修改请告诉我。"
+
+
+def _drop_scenes(reply, rng, lock):
+    """从提示词批次回复中随机去掉部分分镜，不是批次回复时返回None"""
+    match = re.search(r"\{.*\}", reply, re.S)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    scenes = data.get("scene_prompts") if isinstance(data, dict) else None
+    if not scenes or len(scenes) < 2:
+        return None
+    with lock:
+        keep = sorted(rng.sample(range(len(scenes)), rng.randint(1, len(scenes) - 1)))
+    data["scene_prompts"] = [scenes[i] for i in keep]
+    return _fenced(data)
+
+
+def synthesize_reply(prompt):
+    """按请求内容合成符合格式的回复"""
+    # 提示词批次：按字幕编号逐个返回
+    if "个字幕生成提示词" in prompt:
+        names = re.findall(r"^- ([^:\n]+):", prompt, re.M)
+        lines = re.findall(r"^(\d+)\. (.+)$", prompt.split("个字幕生成提示词", 1)[1], re.M)
+        subject = f"{{{names[0]}}}" if names else "1girl"
+        return _fenced({"scene_prompts": [
+            {"line": int(number), "prompt": f"{subject} standing, scene {number}, outdoor, white background"}
+            for number, _ in lines
+        ]})
+
+    # 元数据：小说中出现次数最多的两三个字的词作为角色名
+    if "提取角色设定" in prompt:
+        novel = prompt.split("---", 1)[-1]
+        words = re.findall(r"[一-鿿]{2,3}", novel)
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        names = sorted(counts, key=counts.get, reverse=True)[:2] or ["主角"]
+        return _fenced({
+            "story_metadata": {"title": "模拟故事", "genre": "都市", "theme_tags": ["现代", "都市", "女主"]},
+            "global_settings": {"characters": [
+                {"name": name, "appearance": "young woman in her 20s, black long hair",
+                 "clothing": "white long-sleeved shirt, blue long jeans, white sneakers"}
+                for name in names
+            ]}
+        })
+
+    # Agent 决策：按工作流顺序选择第一个未完成的步骤
+    if "决定下一步行动" in prompt:
+        match = re.search(r"已完成步骤: (\[.*?\])", prompt)
+        completed = re.findall(r"'(\w+)'", match.group(1)) if match else []
+        tool = next((step for step in AGENT_STEPS if step not in completed), "evaluate_quality")
+        return _fenced({"tool": tool, "parameters": {}, "reason": f"按流程执行 {tool}"})
+
+    # Agent 思考
+    if "请分析当前状态并给出建议" in prompt:
+        return _fenced({"progress_analysis": "按工作流推进", "next_step_suggestion": "执行下一个未完成的步骤",
+                        "reasoning": "前置步骤已完成，继续下一步"})
+
+    # 质量评估
+    if "请评估图像生成质量" in prompt:
+        return _fenced({"overall_score": 0.9, "completeness": 1.0, "consistency": 0.9, "quality": 0.85,
+                        "issues": [], "suggestions": []})
+
+    # 参数调整
+    if "建议调整生成参数" in prompt:
+        return _fenced({"sampling_steps": 16, "cfg_scale": 3.0, "sampler": "EulerA", "reason": "提高细节"})
+
+    return "好的。"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟LLM服务（OpenAI兼容）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--fixtures', help='录制目录（LLM响应缓存格式）')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--prefill', type=float, default=0.0, help='每1000个输入token的耗时（秒）')
+    parser.add_argument('--decode', type=float, default=0.0, help='每个输出token的耗时（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟随机浮动比例')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的概率')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='随机返回429的概率')
+    parser.add_argument('--rpm', type=int, default=0, help='每分钟请求数上限（0表示不限）')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429响应的Retry-After（秒）')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='回复被截断的概率')
+    parser.add_argument('--short-rate', type=float, default=0.0, help='提示词批次少返回分镜的概率')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='JSON回复格式不规范的概率')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    args = parser.parse_args()
+
+    if args.fixtures and not Path(args.fixtures).exists():
+        print(f"❌ 录制目录不存在: {args.fixtures}")
+        return
+
+    server = MockLLMServer(
+        host=args.host, port=args.port, fixtures=args.fixtures, latency=args.latency,
+        prefill_per_1k=args.prefill, decode_per_token=args.decode, jitter=args.jitter,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, requests_per_minute=args.rpm,
+        retry_after=args.retry_after, truncate_rate=args.truncate_rate, short_rate=args.short_rate,
+        malformed_rate=args.malformed_rate, seed=args.seed
+    )
+    print(f"✓ 模拟LLM服务已启动: {server.base_url}")
+    print(f"  在config.json中设置 \"kimi_base_url\": \"{server.base_url}\"")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务已停止")
+        print(json.dumps(server.stats, ensure_ascii=False))
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
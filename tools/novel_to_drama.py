@@ -6,13 +6,14 @@
 3. 生成字幕文件（SRT + JSON）
 4. 记录时间轴信息
 """
-import re
 import json
 from pathlib import Path
 from typing import List, Dict, Tuple
 import wave
 import logging
 from tts_tool import ShortDramaTTS
+from tts_chunk_planner import plan_chunks, split_samples
+from text_segmenter import split_sentences
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
@@ -43,50 +44,7 @@ class NovelToDrama:
         Returns:
             拆分后的句子列表
         """
-        # 清理文本
-        text = text.strip().replace('\n', ' ').replace('\r', '')
-        
-        # 按句号、问号、感叹号拆分
-        sentences = re.split(r'([。！？!?])', text)
-        
-        # 重新组合句子和标点
-        result = []
-        temp = ""
-        for i, part in enumerate(sentences):
-            if i % 2 == 0:  # 句子内容
-                temp = part
-            else:  # 标点符号
-                sentence = (temp + part).strip()
-                if sentence:
-                    # 如果句子太长，按逗号再拆分
-                    if len(sentence) > max_length:
-                        sub_parts = re.split(r'([，,、；;])', sentence)
-                        sub_temp = ""
-                        for j, sub_part in enumerate(sub_parts):
-                            if j % 2 == 0:
-                                sub_temp = sub_part
-                            else:
-                                sub_sentence = (sub_temp + sub_part).strip()
-                                if sub_sentence:
-                                    result.append(sub_sentence)
-                    else:
-                        result.append(sentence)
-        
-        # 过滤空句子和无效内容
-        def is_valid_sentence(s):
-            """判断是否为有效句子"""
-            if not s or len(s) <= 1:
-                return False
-            # 移除引号和空格后检查
-            cleaned = s.strip('"\'""''「」『』【】《》 \t')
-            if not cleaned or len(cleaned) <= 1:
-                return False
-            # 只包含标点符号的不要
-            if all(c in '，。！？,.:;!?、""''"\'「」『』【】《》—…·' for c in cleaned):
-                return False
-            return True
-        
-        result = [s for s in result if is_valid_sentence(s)]
+        result = split_sentences(text, max_length)
         
         logger.info(f"✓ 文本拆分完成: {len(result)} 句")
         return result
@@ -112,12 +70,34 @@ class NovelToDrama:
             # 估算：假设平均每个字0.3秒
             return 0.0
     
+    def _split_wav(self, chunk_path: Path, output_paths: List[Path], weights: List[int]):
+        """
+        将合并合成的音频按字数比例拆分为各句的WAV文件
+        
+        Args:
+            chunk_path: 合并合成的音频
+            output_paths: 各句输出路径
+            weights: 各句字数
+        """
+        with wave.open(str(chunk_path), 'rb') as src:
+            params = src.getparams()
+            frames = src.readframes(params.nframes)
+        
+        frame_size = params.nchannels * params.sampwidth
+        offset = 0
+        for path, count in zip(output_paths, split_samples(params.nframes, weights)):
+            with wave.open(str(path), 'wb') as dst:
+                dst.setparams(params)
+                dst.writeframes(frames[offset * frame_size:(offset + count) * frame_size])
+            offset += count
+    
     def generate_audio_files(
         self,
         sentences: List[str],
         output_dir: Path,
         timbre_name: str = None,
-        prefix: str = "scene"
+        prefix: str = "scene",
+        chunk_max_chars: int = 0
     ) -> List[Dict]:
         """
         为每句话生成音频文件
@@ -127,6 +107,8 @@ class NovelToDrama:
             output_dir: 输出目录
             timbre_name: 音色名称
             prefix: 文件名前缀
+            chunk_max_chars: 相邻短句合并合成的字数上限（0表示逐句合成），
+                             合成后按字数比例拆回各句的音频文件
             
         Returns:
             包含时间轴信息的列表
@@ -141,41 +123,58 @@ class NovelToDrama:
         logger.info(f"输出目录: {output_dir}")
         logger.info(f"=" * 60)
         
-        for i, sentence in enumerate(sentences, 1):
+        chunks = plan_chunks(sentences, max_chars=chunk_max_chars)
+        if len(chunks) < len(sentences):
+            logger.info(f"合并短句: {len(sentences)} 句 -> {len(chunks)} 次合成")
+        
+        for chunk in chunks:
             # 生成文件名
-            filename = f"{prefix}_{i:04d}.wav"
-            output_path = output_dir / filename
+            indices = [i + 1 for i in chunk]
+            output_paths = [output_dir / f"{prefix}_{i:04d}.wav" for i in indices]
+            chunk_text = "".join(sentences[i] for i in chunk)
             
             # 显示进度
-            logger.info(f"[{i}/{len(sentences)}] {sentence[:30]}...")
+            logger.info(f"[{indices[-1]}/{len(sentences)}] {chunk_text[:30]}...")
             
-            # 生成音频
+            # 生成音频（多句合并时先合成到临时文件再拆分）
+            if len(chunk) == 1:
+                synth_path = output_paths[0]
+            else:
+                synth_path = output_dir / f"{prefix}_chunk_{indices[0]:04d}.wav"
             success = self.tts.synthesize(
-                text=sentence,
+                text=chunk_text,
                 timbre_name=timbre,
-                output_path=str(output_path)
+                output_path=str(synth_path)
             )
             
             if not success:
                 logger.warning(f"  ✗ 生成失败，跳过")
                 continue
             
-            # 获取音频时长
-            duration = self.get_audio_duration(str(output_path))
-            
-            # 记录时间轴
-            timeline.append({
-                "index": i,
-                "text": sentence,
-                "filename": filename,
-                "start_time": round(current_time, 2),
-                "end_time": round(current_time + duration, 2),
-                "duration": round(duration, 2)
-            })
-            
-            logger.info(f"  ✓ {filename} ({duration:.2f}秒)")
+            if len(chunk) > 1:
+                self._split_wav(synth_path, output_paths, [len(sentences[i]) for i in chunk])
+                synth_path.unlink()
             
-            current_time += duration
+            for i, output_path in zip(indices, output_paths):
+                sentence = sentences[i - 1]
+                filename = output_path.name
+                
+                # 获取音频时长
+                duration = self.get_audio_duration(str(output_path))
+                
+                # 记录时间轴
+                timeline.append({
+                    "index": i,
+                    "text": sentence,
+                    "filename": filename,
+                    "start_time": round(current_time, 2),
+                    "end_time": round(current_time + duration, 2),
+                    "duration": round(duration, 2)
+                })
+                
+                logger.info(f"  ✓ {filename} ({duration:.2f}秒)")
+                
+                current_time += duration
         
         logger.info(f"=" * 60)
         logger.info(f"✓ 音频生成完成: {len(timeline)}/{len(sentences)} 成功")
@@ -239,7 +238,8 @@ class NovelToDrama:
         text: str,
         project_name: str,
         timbre_name: str = None,
-        max_sentence_length: int = 50
+        max_sentence_length: int = 50,
+        chunk_max_chars: int = 0
     ) -> Path:
         """
         处理完整小说文本
@@ -249,6 +249,7 @@ class NovelToDrama:
             project_name: 项目名称
             timbre_name: 音色名称
             max_sentence_length: 单句最大长度
+            chunk_max_chars: 相邻短句合并合成的字数上限（0表示逐句合成）
             
         Returns:
             项目目录路径
@@ -273,7 +274,8 @@ class NovelToDrama:
             sentences=sentences,
             output_dir=audio_dir,
             timbre_name=timbre_name,
-            prefix=project_name
+            prefix=project_name,
+            chunk_max_chars=chunk_max_chars
         )
         
         # 3. 生成SRT字幕
@@ -332,6 +334,7 @@ def main():
     parser.add_argument('--project', '-p', required=True, help='项目名称')
     parser.add_argument('--timbre', '-t', default='抖音-读小说', help='音色名称')
     parser.add_argument('--max-length', '-m', type=int, default=50, help='单句最大长度')
+    parser.add_argument('--chunk-max-chars', type=int, default=0, help='相邻短句合并合成的字数上限（0表示逐句合成）')
     parser.add_argument('--list-timbres', action='store_true', help='列出可用音色')
     
     args = parser.parse_args()
@@ -355,7 +358,8 @@ def main():
         text=text,
         project_name=args.project,
         timbre_name=args.timbre,
-        max_sentence_length=args.max_length
+        max_sentence_length=args.max_length,
+        chunk_max_chars=args.chunk_max_chars
     )
 
 
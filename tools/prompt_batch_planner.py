@@ -0,0 +1,138 @@
+"""
+提示词批次规划
+原来每批固定5个父分镜：短句时请求数多、每次都重复发送一遍PE，长句时输出容易被截断。
+规划器按token估算每个分镜的输入和输出，把相邻分镜装进一个请求直到预算用完，
+再为每个批次选择放得下的最便宜的模型（8k < 32k < 128k）
+"""
+import math
+
+from app_config import get_setting
+
+# 可用模型及每次请求的token预算（输入+预留输出，低于上下文长度留出余量），上下文越短价格越低
+DEFAULT_MODEL_BUDGETS = {
+    "moonshot-v1-8k": 7000,
+    "moonshot-v1-32k": 28000,
+    "moonshot-v1-128k": 112000,
+}
+
+# 每个请求的输出上限（输出越长，单个请求越慢，截断时损失越大）
+DEFAULT_MAX_OUTPUT_TOKENS = 4000
+
+# 每批最多的分镜数（列表太长时模型容易漏掉分镜）
+DEFAULT_MAX_SCENES = 40
+
+# 每个分镜的预计输出token数（{"index": n, "prompt": "..."}，英文提示词约100字符）
+DEFAULT_OUTPUT_TOKENS_PER_SCENE = 80
+
+# 输出预留倍数，以及代码块、scene_prompts 外层结构的固定输出
+OUTPUT_HEADROOM = 1.5
+OUTPUT_OVERHEAD = 50
+
+# 每个分镜在输入中的编号、换行
+LINE_OVERHEAD = 4
+
+# 原来的固定批次大小（用于对比）
+FIXED_BATCH_SIZE = 5
+
+
+def estimate_tokens(text):
+    """
+    估算文本的token数（偏保守）：中日韩字符每字按1个token，其余字符每4个按1个token
+    """
+    if not text:
+        return 0
+    wide = sum(1 for c in text if ord(c) >= 0x2E80)
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def model_budgets():
+    """读取各模型的token预算（config.json中的 prompt_batch_model_budgets 可覆盖部分或全部）"""
+    budgets = dict(DEFAULT_MODEL_BUDGETS)
+    budgets.update(get_setting("prompt_batch_model_budgets") or {})
+    return budgets
+
+
+def choose_model(total_tokens, budgets=None):
+    """
+    选择放得下的最便宜（预算最小）的模型，超出所有预算时返回预算最大的模型
+
+    Args:
+        total_tokens: 请求的输入+预留输出token数
+        budgets: {模型: token预算}，默认读取 model_budgets()
+    """
+    if budgets is None:
+        budgets = model_budgets()
+    return next((m for m, budget in sorted(budgets.items(), key=lambda item: item[1])
+                 if budget >= total_tokens), max(budgets, key=budgets.get))
+
+
+def _reserve_output(output_tokens):
+    return math.ceil(output_tokens * OUTPUT_HEADROOM) + OUTPUT_OVERHEAD
+
+
+def plan_prompt_batches(scene_texts, fixed_tokens, budgets=None, max_output_tokens=None,
+                        max_scenes=None, output_tokens_per_scene=DEFAULT_OUTPUT_TOKENS_PER_SCENE):
+    """
+    将相邻分镜打包为请求批次
+
+    Args:
+        scene_texts: 分镜文本列表（按顺序）
+        fixed_tokens: 每个请求固定的输入token数（PE、角色设定等）
+        budgets: {模型: token预算}，预算越小的模型越便宜，默认读取 model_budgets()
+        max_output_tokens: 每个请求的输出上限，默认读取 prompt_batch_max_output_tokens
+        max_scenes: 每批最多的分镜数，默认读取 prompt_batch_max_scenes，<=0 表示不限
+        output_tokens_per_scene: 每个分镜的预计输出token数
+
+    Returns:
+        list[dict]: 每个批次 {"start": 起始下标, "count": 分镜数, "model": 模型,
+                    "input_tokens": 预计输入, "output_tokens": 预计输出, "max_tokens": 输出上限}
+    """
+    if budgets is None:
+        budgets = model_budgets()
+    if max_output_tokens is None:
+        max_output_tokens = int(get_setting("prompt_batch_max_output_tokens", DEFAULT_MAX_OUTPUT_TOKENS))
+    if max_scenes is None:
+        max_scenes = int(get_setting("prompt_batch_max_scenes", DEFAULT_MAX_SCENES))
+    largest = max(budgets.values())
+
+    batches = []
+    start = 0
+    input_tokens = fixed_tokens
+    output_tokens = 0
+
+    def close(end):
+        reserve = _reserve_output(output_tokens)
+        total = input_tokens + reserve
+        model = choose_model(total, budgets)
+        batches.append({
+            "start": start,
+            "count": end - start,
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "max_tokens": max(reserve, min(max_output_tokens, budgets[model] - input_tokens))
+        })
+
+    for i, text in enumerate(scene_texts):
+        scene_input = estimate_tokens(text) + LINE_OVERHEAD
+        count = i - start
+        if count and (
+            (max_scenes > 0 and count >= max_scenes)
+            or _reserve_output(output_tokens + output_tokens_per_scene) > max_output_tokens
+            or input_tokens + scene_input + _reserve_output(output_tokens + output_tokens_per_scene) > largest
+        ):
+            close(i)
+            start = i
+            input_tokens = fixed_tokens
+            output_tokens = 0
+        input_tokens += scene_input
+        output_tokens += output_tokens_per_scene
+
+    if start < len(scene_texts):
+        close(len(scene_texts))
+    return batches
+
+
+def fixed_size_batches(count, batch_size=FIXED_BATCH_SIZE):
+    """原来的固定大小批次的请求数"""
+    return math.ceil(count / batch_size)
@@ -0,0 +1,201 @@
+"""
+SDXL提示词编码缓存
+每个分镜都要把相同的Illustrious负面词和质量标签前缀送进两个文本编码器；
+这里按（文本片段, 编码器指纹, clip_skip）缓存编码结果，进程内共享：
+负面词和质量标签每次运行只编码一次，分镜提示词编码后以 prompt_embeds 传给管线
+
+提示词按 BREAK 分段，每段单独编码为一个77 token的窗口后在序列维度拼接（Illustrious提示词格式的约定），
+池化向量取第一段；同一批次内段数不同时用空字符串段补齐
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Illustrious专用负面词（更全面的质量控制）
+NEGATIVE_PROMPT = "lazyneg, lazyhand, child, (censored, mosaic censoring, bar_censor), lowres, text, error, cropped, worst quality, low quality, jpeg artifacts, ugly, duplicate, morbid, mutilated, out of frame, extra fingers, mutated hands, poorly drawn hands, poorly drawn face, mutation, deformed, blurry, dehydrated, bad anatomy, bad proportions, extra limbs, cloned face, disfigured, gross proportions, malformed limbs, missing arms, missing legs, extra arms, extra legs, fused fingers, too many fingers, long neck, username, watermark, signature"
+
+# 质量标签前缀（Illustrious专用PE格式：质量标签 BREAK 分镜提示词）
+QUALITY_TAGS = "score_9, score_8_up, score_7_up, masterpiece, best quality, amazing quality, absurdres, newest"
+
+CLIP_SKIP = 2
+
+# 缓存的片段数上限（每段约0.3MB，fp16）
+MAX_CACHE_ENTRIES = 256
+
+_BREAK = re.compile(r"\bBREAK\b")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def split_chunks(text):
+    """按 BREAK 分段（去掉首尾空白和多余逗号）"""
+    chunks = [chunk.strip().strip(",").strip() for chunk in _BREAK.split(text)]
+    return [chunk for chunk in chunks if chunk] or [""]
+
+
+def encoder_fingerprint(pipe):
+    """
+    文本编码器指纹：配置、各参数的和、生效的LoRA
+
+    不同checkpoint、融合了LoRA的快照或切换了作用于文本编码器的LoRA时指纹不同
+    """
+    import torch
+
+    h = hashlib.sha256()
+    for name in ("text_encoder", "text_encoder_2"):
+        encoder = getattr(pipe, name, None)
+        if encoder is None:
+            continue
+        h.update(name.encode('utf-8'))
+        h.update(json.dumps(encoder.config.to_dict(), sort_keys=True, default=str).encode('utf-8'))
+        with torch.no_grad():
+            sums = torch.stack([p.detach().float().sum() for p in encoder.parameters()])
+        h.update(sums.cpu().numpy().tobytes())
+    if hasattr(pipe, "get_active_adapters"):
+        try:
+            h.update(json.dumps(sorted(pipe.get_active_adapters())).encode('utf-8'))
+        except ValueError:
+            pass  # 没有加载LoRA（未安装peft）
+    return h.hexdigest()[:16]
+
+
+class PromptEncoder:
+    """带缓存的SDXL提示词编码器（按Illustrious格式组合质量标签、分镜提示词和负面词）"""
+
+    def __init__(self, pipe, negative_prompt=NEGATIVE_PROMPT, quality_tags=QUALITY_TAGS, clip_skip=CLIP_SKIP):
+        """
+        Args:
+            pipe: StableDiffusionXLPipeline（已切换到本次使用的LoRA）
+            negative_prompt: 负面词
+            quality_tags: 质量标签前缀（空字符串表示不加）
+            clip_skip: 正面提示词使用的文本编码器层（与 pipe(clip_skip=...) 相同），
+                       负面词与diffusers一致使用默认层
+        """
+        self.pipe = pipe
+        self.negative_prompt = negative_prompt
+        self.quality_tags = quality_tags
+        self.clip_skip = clip_skip
+        start = time.perf_counter()
+        self.fingerprint = encoder_fingerprint(pipe)
+        self.fingerprint_time = time.perf_counter() - start
+        self.stats = {}  # 阶段 -> {"encoded", "hits", "time"}
+
+    def _stage(self, stage):
+        return self.stats.setdefault(stage, {"encoded": 0, "hits": 0, "time": 0.0})
+
+    def _encode_text(self, text, clip_skip):
+        """用两个文本编码器编码一段文本（与diffusers的encode_prompt相同）"""
+        import torch
+
+        pipe = self.pipe
+        hidden_states = []
+        pooled = None
+        with torch.no_grad():
+            for tokenizer, text_encoder in ((pipe.tokenizer, pipe.text_encoder),
+                                            (pipe.tokenizer_2, pipe.text_encoder_2)):
+                if tokenizer is None or text_encoder is None:
+                    continue
+                input_ids = tokenizer(
+                    text,
+                    padding="max_length",
+                    max_length=tokenizer.model_max_length,
+                    truncation=True,
+                    return_tensors="pt"
+                ).input_ids
+                output = text_encoder(input_ids.to(text_encoder.device), output_hidden_states=True)
+                # 池化向量只取最后一个文本编码器的输出
+                if pooled is None and output[0].ndim == 2:
+                    pooled = output[0]
+                layer = -2 if clip_skip is None else -(clip_skip + 2)
+                hidden_states.append(output.hidden_states[layer])
+        dtype = pipe.text_encoder_2.dtype
+        return torch.cat(hidden_states, dim=-1).to(dtype), pooled.to(dtype)
+
+    def encode_chunk(self, text, clip_skip, stage):
+        """
+        编码一段文本（带缓存）
+
+        Returns:
+            tuple: (prompt_embeds [1, 77, 2048], pooled_prompt_embeds [1, 1280])
+        """
+        key = (text, self.fingerprint, clip_skip)
+        stats = self._stage(stage)
+        with _cache_lock:
+            cached = _cache.get(key)
+            if cached is not None:
+                _cache.move_to_end(key)
+                stats["hits"] += 1
+                return cached
+
+        start = time.perf_counter()
+        result = self._encode_text(text, clip_skip)
+        stats["time"] += time.perf_counter() - start
+        stats["encoded"] += 1
+        with _cache_lock:
+            _cache[key] = result
+            while len(_cache) > MAX_CACHE_ENTRIES:
+                _cache.popitem(last=False)
+        return result
+
+    def encode(self, text, clip_skip, stage):
+        """
+        编码完整提示词（按 BREAK 分段）
+
+        Returns:
+            list: 每段的 (prompt_embeds, pooled_prompt_embeds)
+        """
+        return [self.encode_chunk(chunk, clip_skip, stage) for chunk in split_chunks(text)]
+
+    def _pad(self, chunks, count, clip_skip):
+        return chunks + [self.encode_chunk("", clip_skip, "补齐")] * (count - len(chunks))
+
+    @staticmethod
+    def _join(chunks):
+        import torch
+        return torch.cat([embeds for embeds, _ in chunks], dim=1), chunks[0][1]
+
+    def pipeline_kwargs(self, prompts):
+        """
+        把一批分镜提示词编码为管线参数（质量标签 BREAK 分镜提示词，负面词每批复用）
+
+        Args:
+            prompts: 分镜提示词列表（不含质量标签）
+
+        Returns:
+            dict: prompt_embeds、pooled_prompt_embeds、negative_prompt_embeds、negative_pooled_prompt_embeds
+        """
+        import torch
+
+        prefix = self.encode(self.quality_tags, self.clip_skip, "质量标签") if self.quality_tags else []
+        positives = [prefix + self.encode(prompt, self.clip_skip, "分镜") for prompt in prompts]
+        negative = self.encode(self.negative_prompt, None, "负面词")
+
+        # 正负提示词的序列长度必须一致
+        count = max([len(chunks) for chunks in positives] + [len(negative)])
+        positives = [self._join(self._pad(chunks, count, self.clip_skip)) for chunks in positives]
+        negative_embeds, negative_pooled = self._join(self._pad(negative, count, None))
+
+        n = len(prompts)
+        return {
+            "prompt_embeds": torch.cat([embeds for embeds, _ in positives], dim=0),
+            "pooled_prompt_embeds": torch.cat([pooled for _, pooled in positives], dim=0),
+            "negative_prompt_embeds": negative_embeds.repeat(n, 1, 1),
+            "negative_pooled_prompt_embeds": negative_pooled.repeat(n, 1)
+        }
+
+    def print_timing(self):
+        """按阶段打印提示词编码耗时和缓存命中"""
+        total = sum(s["time"] for s in self.stats.values()) + self.fingerprint_time
+        print(f"  提示词编码: {total:.2f}秒（编码器指纹 {self.fingerprint_time:.2f}秒）")
+        for stage, s in self.stats.items():
+            print(f"    {stage}: 编码 {s['encoded']} 段，缓存命中 {s['hits']} 段，{s['time']:.2f}秒")
+
+
+def clear_cache():
+    """清空编码缓存"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,112 @@
+"""
+令牌桶限速器
+进程内所有LLM调用方（同步线程、各个事件循环中的协程）共享同一个限速器：
+调用方先预约令牌，得到需要等待的秒数，再自行 time.sleep 或 await asyncio.sleep，
+限速器本身不阻塞，也不绑定某个事件循环
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# 429响应没有Retry-After时的默认等待（秒）
+DEFAULT_RETRY_AFTER = 5.0
+
+
+class TokenBucket:
+    """令牌桶（按GCRA方式记录下一个令牌的理论到达时间，预约即扣减）"""
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._interval = 1.0 / rate
+        self._tolerance = (self.burst - 1) * self._interval
+        self._tat = time.monotonic()  # 下一个令牌的理论到达时间
+        self._lock = threading.Lock()
+        self._stats = {
+            "acquired": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "pauses": 0
+        }
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, burst=1):
+        return cls(requests_per_minute / 60.0, burst)
+
+    def reserve(self):
+        """
+        预约一个令牌
+
+        Returns:
+            float: 调用方需要等待的秒数（0表示立即可用）
+        """
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            delay = max(0.0, tat - self._tolerance - now)
+            self._tat = tat + self._interval
+            self._stats["acquired"] += 1
+            if delay > 0:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += delay
+            return delay
+
+    def try_acquire(self):
+        """
+        令牌立即可用时取走一个，否则不预约（用于可有可无的请求，如对冲请求）
+
+        Returns:
+            bool: 是否取到令牌
+        """
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            if tat - self._tolerance > now:
+                return False
+            self._tat = tat + self._interval
+            self._stats["acquired"] += 1
+            return True
+
+    def pause(self, seconds):
+        """
+        服务端限流（429）后暂停发放令牌，恢复后不允许突发，按速率逐个发放
+
+        Args:
+            seconds: 暂停秒数（通常来自Retry-After）
+        """
+        with self._lock:
+            resume = time.monotonic() + max(0.0, seconds)
+            self._tat = max(self._tat, resume + self._tolerance)
+            self._stats["pauses"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+    """
+    解析Retry-After响应头（秒数或HTTP日期）
+
+    Returns:
+        float: 需要等待的秒数
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,164 @@
+"""
+边生成提示词边出图
+步骤2流式解析出一个分镜提示词（PromptGenerator 的 on_scene_prompt 回调）就放入队列，
+后台线程用常驻SDXL管线生成图片，不必等全部提示词写完；
+步骤2结束后把生成记录合并进 Prompts.json（见 seed_ledger），步骤3跳过这些已生成且未变化的图
+"""
+import queue
+import threading
+import time
+from pathlib import Path
+
+from app_config import get_setting
+
+_DONE = object()
+
+
+class SceneImageStream:
+    """后台分镜出图队列"""
+
+    def __init__(self, project_name, imgs_dir, pipeline_service=None):
+        """
+        Args:
+            project_name: 项目名称（确定性种子模式下参与推导种子）
+            imgs_dir: 图片目录
+            pipeline_service: SDXLPipelineService，默认为共享的常驻管线
+        """
+        self.project_name = project_name
+        self.imgs_dir = Path(imgs_dir)
+        self._service = pipeline_service
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+        self._started_at = None
+        self._first_image_at = None
+        self.records = {}  # 分镜序号 -> 生成记录
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="scene-image-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, index, prompt):
+        """on_scene_prompt 回调：只入队，不阻塞提示词生成的事件循环"""
+        if self._error is None:
+            self._queue.put((index, prompt['prompt']))
+
+    def _drain(self, first):
+        """取出队列中已到达的全部分镜，遇到结束标记时返回 (jobs, True)"""
+        items = [first]
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items, False
+            if items[-1] is _DONE:
+                return items[:-1], True
+
+    def _run(self):
+        from sdxl_pipeline import get_pipeline_service, default_loras, sampling_params
+        from sdxl_batch import BatchImageGenerator
+        from prompt_embeddings import PromptEncoder, CLIP_SKIP
+        from seed_ledger import generation_settings, make_record, scene_seed, seed_mode
+
+        first = self._queue.get()
+        if first is _DONE:
+            return
+        try:
+            service = self._service or get_pipeline_service()
+            loras = default_loras()
+            params = sampling_params(bool(loras))
+            settings = generation_settings(service, loras, params, 1024, 1024, CLIP_SKIP)
+            mode = seed_mode()
+            self.imgs_dir.mkdir(parents=True, exist_ok=True)
+
+            def save_image(job, image):
+                img_filename = f"scene_{job['index']:04d}.png"
+                image.save(self.imgs_dir / img_filename)
+                self.records[job['index']] = make_record(job['seed'], job['prompt'], settings)
+                if self._first_image_at is None:
+                    self._first_image_at = time.perf_counter() - self._started_at
+                print(f"  🎨 分镜 {job['index']} 图像已生成（边生成提示词边出图）")
+
+            # 整个步骤2期间占用管线，避免每张图重新获取
+            with service.acquire(loras) as pipe:
+                encoder = PromptEncoder(pipe)
+                generator = BatchImageGenerator(pipe, device=service.device,
+                                                encode_prompts=encoder.pipeline_kwargs)
+                done = False
+                while not done:
+                    items, done = self._drain(first)
+                    jobs = [
+                        {"index": index, "prompt": prompt,
+                         "seed": scene_seed(mode, self.project_name, index, prompt)}
+                        for index, prompt in items
+                    ]
+                    generator.generate(jobs, on_image=save_image, width=1024, height=1024, **params)
+                    if not done:
+                        first = self._queue.get()
+                        done = first is _DONE
+        except Exception as e:
+            # 出错后不再接收新分镜，剩下的由步骤3生成
+            self._error = e
+            print(f"  ⚠ 边生成提示词边出图中断（剩余分镜在步骤3生成）: {e}")
+
+    def close(self):
+        """等待队列中的分镜全部出图（可重复调用）"""
+        if self._thread is None:
+            return
+        self._queue.put(_DONE)
+        self._thread.join()
+        self._thread = None
+        if self.records:
+            first = f"，首张图 {self._first_image_at:.1f}秒" if self._first_image_at is not None else ""
+            print(f"✓ 步骤2期间已生成 {len(self.records)} 张图像{first}")
+
+    def apply_records(self, prompts_data):
+        """
+        把生成记录合并进提示词数据
+
+        最终提示词与出图时不同（如批次重试后替换）的分镜删除已生成的图，由步骤3重新生成
+
+        Returns:
+            int: 合并的记录数
+        """
+        from seed_ledger import matches_prompt
+
+        applied = 0
+        for scene in prompts_data.get('scene_prompts', []):
+            record = self.records.get(scene['index'])
+            if record is None:
+                continue
+            if matches_prompt(record, scene['prompt']):
+                scene['generation'] = record
+                applied += 1
+            else:
+                (self.imgs_dir / f"scene_{scene['index']:04d}.png").unlink(missing_ok=True)
+        return applied
+
+    def discard(self):
+        """
+        删除本次流式生成的全部图像（步骤2失败、提示词未保存时调用）
+
+        这些图没有写入 Prompts.json 的生成记录，步骤3会把它们当作未变化的图跳过
+
+        Returns:
+            int: 删除的图像数
+        """
+        self.close()
+        removed = 0
+        for index in self.records:
+            img_path = self.imgs_dir / f"scene_{index:04d}.png"
+            if img_path.exists():
+                img_path.unlink()
+                removed += 1
+        self.records = {}
+        if removed:
+            print(f"  已删除步骤2期间生成的 {removed} 张图像（由步骤3重新生成）")
+        return removed
+
+
+def stream_enabled():
+    """是否在步骤2期间开始出图（config.json 中的 prompt_stream_images，默认关闭：会在步骤2占用显存加载SDXL）"""
+    return get_setting("prompt_stream_images", False)
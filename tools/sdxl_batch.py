@@ -0,0 +1,213 @@
+"""
+SDXL批量生成
+把多个分镜的提示词组成一批调用管线，每个提示词使用各自的随机数生成器和种子：
+初始噪声和每步的采样噪声按提示词分别生成，与逐张生成使用同一种子时一致。
+批大小按可用显存自动选择，显存不足（OOM）时减半后重试当前批次
+"""
+import time
+
+from app_config import get_setting
+
+# 自动选择时的批大小上限
+DEFAULT_MAX_BATCH_SIZE = 4
+
+# 1024x1024、fp16、开启CFG时每张图生成过程中额外占用的显存估计（MB），其他分辨率按像素数缩放
+DEFAULT_MB_PER_IMAGE = 1200
+
+# 只按可用显存的这一比例规划批次，给VAE解码和显存碎片留余量
+MEMORY_HEADROOM = 0.85
+
+
+def is_oom_error(exc):
+    """是否为显存不足（torch.cuda.OutOfMemoryError，或旧版本torch的RuntimeError）"""
+    if type(exc).__name__ == "OutOfMemoryError":
+        return True
+    return isinstance(exc, RuntimeError) and "out of memory" in str(exc).lower()
+
+
+def auto_batch_size(free_mb, width, height, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                    mb_per_image=DEFAULT_MB_PER_IMAGE):
+    """
+    按可用显存估算批大小
+
+    Args:
+        free_mb: 可用显存（MB），None表示无法查询（如CPU），此时使用上限
+        width / height: 图像尺寸
+        max_batch_size: 批大小上限
+        mb_per_image: 1024x1024每张图的显存估计
+
+    Returns:
+        int: 批大小（至少为1）
+    """
+    if free_mb is None:
+        return max(1, max_batch_size)
+    per_image = mb_per_image * (width * height) / (1024 * 1024)
+    return max(1, min(max_batch_size, int(free_mb * MEMORY_HEADROOM // per_image)))
+
+
+def available_memory_mb(device):
+    """
+    当前可用于生成的显存（MB）：设备空闲显存 + PyTorch已缓存但未使用的显存，非CUDA设备返回None
+    """
+    from sdxl_pipeline import free_memory_mb
+
+    free = free_memory_mb(device)
+    if free is None:
+        return None
+    import torch
+    index = torch.device(device)
+    cached = torch.cuda.memory_reserved(index) - torch.cuda.memory_allocated(index)
+    return free + cached / 1024 ** 2
+
+
+def _torch_generator(device):
+    import torch
+
+    def make(seed):
+        return torch.Generator(device=device).manual_seed(seed)
+    return make
+
+
+def _clear_cuda_cache():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+class BatchImageGenerator:
+    """多提示词批量生成（按显存自动选择批大小，OOM时减半）"""
+
+    def __init__(self, pipe, device="cuda", batch_size=None, max_batch_size=None, mb_per_image=None,
+                 memory_probe=None, make_generator=None, clear_cache=None, encode_prompts=None):
+        """
+        Args:
+            pipe: StableDiffusionXLPipeline（或接口相同的桩管线）
+            device: 随机数生成器所在设备，与逐张生成时一致才能得到相同的图
+            batch_size: 固定批大小，None或0表示按可用显存自动选择
+                        默认读取config.json中的 sdxl_batch_size
+            max_batch_size: 自动选择时的上限，默认读取 sdxl_max_batch_size
+            mb_per_image: 1024x1024每张图的显存估计（MB）
+            memory_probe: 可用显存查询函数 memory_probe(device) -> MB或None
+            make_generator: 随机数生成器工厂 make_generator(seed)，默认为 torch.Generator(device)
+            clear_cache: OOM后释放缓存的函数，默认为 torch.cuda.empty_cache
+            encode_prompts: 提示词编码函数 encode_prompts(prompts) -> 管线参数（如 prompt_embeds），
+                            见 prompt_embeddings.PromptEncoder.pipeline_kwargs；None表示直接传 prompt
+        """
+        if batch_size is None:
+            batch_size = get_setting("sdxl_batch_size", 0)
+        if max_batch_size is None:
+            max_batch_size = get_setting("sdxl_max_batch_size", DEFAULT_MAX_BATCH_SIZE)
+        self.pipe = pipe
+        self.device = device
+        self.batch_size = batch_size or None
+        self.max_batch_size = max_batch_size
+        self.mb_per_image = mb_per_image or DEFAULT_MB_PER_IMAGE
+        self._memory_probe = memory_probe or available_memory_mb
+        self._make_generator = make_generator or _torch_generator(device)
+        self._clear_cache = clear_cache or _clear_cuda_cache
+        self._encode_prompts = encode_prompts
+
+        self.stats = {
+            "images": 0,
+            "batches": 0,
+            "oom_backoffs": 0,
+            "batch_size": 0,  # 最近一次使用的批大小
+            "elapsed": 0.0
+        }
+
+    @property
+    def images_per_minute(self):
+        if not self.stats["elapsed"]:
+            return 0.0
+        return self.stats["images"] / self.stats["elapsed"] * 60
+
+    def _choose_batch_size(self, width, height):
+        if self.batch_size:
+            return self.batch_size
+        size = auto_batch_size(self._memory_probe(self.device), width, height,
+                               self.max_batch_size, self.mb_per_image)
+        print(f"✓ 批大小: {size}（按可用显存自动选择）")
+        return size
+
+    def _run_batch(self, jobs, pipe_kwargs):
+        generators = [self._make_generator(job["seed"]) for job in jobs]
+        prompts = [job["prompt"] for job in jobs]
+        if self._encode_prompts:
+            prompt_kwargs = self._encode_prompts(prompts)
+        else:
+            prompt_kwargs = {"prompt": prompts}
+        result = self.pipe(
+            generator=generators,
+            **prompt_kwargs,
+            **pipe_kwargs
+        )
+        return result.images
+
+    def generate(self, jobs, on_image=None, on_batch=None, **pipe_kwargs):
+        """
+        批量生成
+
+        Args:
+            jobs: [{"prompt", "seed", ...}]，按顺序生成
+            on_image: 每生成一张图调用 on_image(job, image)（如保存到磁盘），为None时收集结果
+            on_batch: 每批的图都处理完后调用 on_batch(batch_jobs)（如写回生成记录）
+            **pipe_kwargs: 其他管线参数（negative_prompt、num_inference_steps、guidance_scale、
+                           width、height、clip_skip 等），所有任务相同；
+                           使用 encode_prompts 时负面词和clip_skip由编码函数处理
+
+        Returns:
+            list: on_image为None时返回与jobs对应的图像，否则返回空列表
+        """
+        jobs = list(jobs)
+        images = []
+        if not jobs:
+            return images
+        width = pipe_kwargs.get("width", 1024)
+        height = pipe_kwargs.get("height", 1024)
+        batch_size = min(self._choose_batch_size(width, height), len(jobs))
+
+        start = time.perf_counter()
+        position = 0
+        try:
+            while position < len(jobs):
+                batch = jobs[position:position + batch_size]
+                try:
+                    batch_images = self._run_batch(batch, pipe_kwargs)
+                except Exception as e:
+                    if not is_oom_error(e) or batch_size == 1:
+                        raise
+                    # 显存不足：释放缓存后减半重试，之后的批次（包括后续调用）沿用较小的批大小
+                    batch_size = max(1, batch_size // 2)
+                    if self.batch_size:
+                        self.batch_size = batch_size
+                    else:
+                        self.max_batch_size = min(self.max_batch_size, batch_size)
+                    self.stats["oom_backoffs"] += 1
+                    self._clear_cache()
+                    print(f"  ⚠ 显存不足，批大小减为 {batch_size} 后重试")
+                    continue
+
+                self.stats["batches"] += 1
+                self.stats["batch_size"] = batch_size
+                for job, image in zip(batch, batch_images):
+                    self.stats["images"] += 1
+                    if on_image is None:
+                        images.append(image)
+                    else:
+                        on_image(job, image)
+                if on_batch is not None:
+                    on_batch(batch)
+                position += len(batch)
+        finally:
+            self.stats["elapsed"] += time.perf_counter() - start
+        return images
+
+    def print_summary(self):
+        """打印吞吐统计"""
+        print(f"  生成: {self.stats['images']} 张，{self.stats['batches']} 批（批大小 {self.stats['batch_size']}），"
+              f"{self.stats['elapsed']:.1f}秒，{self.images_per_minute:.1f} 张/分钟")
+        if self.stats["oom_backoffs"]:
+            print(f"  显存不足减小批次: {self.stats['oom_backoffs']} 次")
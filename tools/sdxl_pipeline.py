@@ -0,0 +1,444 @@
+"""
+常驻SDXL管线服务
+批量生成、单图重生和风格测试脚本共享同一个管线实例：模型只加载一次，
+LoRA按需加载后通过 set_adapters 切换，空闲超时或显存紧张时自动卸载；
+单文件checkpoint已转换为diffusers快照（见 sdxl_snapshot.py）时直接加载快照
+"""
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from app_config import get_setting
+from gpu_residents import register_resident, release_idle_residents
+from sdxl_snapshot import find_snapshot
+
+PROJECT_ROOT = Path(__file__).parent.parent
+MODELS_DIR = PROJECT_ROOT / "sdxl" / "models"
+
+# 默认模型：Prefect Illustrious XL 40（单文件checkpoint + 同目录下的diffusers配置）
+DEFAULT_MODEL_DIR = MODELS_DIR / "prefectIllustriousXL_40"
+DEFAULT_MODEL_PATH = DEFAULT_MODEL_DIR / "prefectIllustriousXL_40.safetensors"
+DEFAULT_SCHEDULER = "EulerAncestralDiscreteScheduler"
+
+# DMD2加速LoRA
+DMD2_LORA_PATH = MODELS_DIR / "loras" / "dmd2_sdxl_4step_lora.safetensors"
+DMD2_LORA_WEIGHT = 0.8
+
+# 默认空闲10分钟后卸载模型
+DEFAULT_IDLE_TIMEOUT = 600
+
+# 空闲时显存低于该值（MB）视为显存紧张，卸载管线
+DEFAULT_MIN_FREE_MEMORY_MB = 1024
+
+# 空闲期间检查显存的间隔（秒）
+MEMORY_CHECK_INTERVAL = 30
+
+
+def default_loras():
+    """
+    默认LoRA（DMD2加速，文件不存在时为空）
+
+    Returns:
+        list: [{"name", "path", "weight"}]
+    """
+    if DMD2_LORA_PATH.exists():
+        return [{"name": "dmd2", "path": str(DMD2_LORA_PATH), "weight": DMD2_LORA_WEIGHT}]
+    return []
+
+
+def sampling_params(use_dmd2):
+    """
+    采样步数和CFG
+
+    Returns:
+        dict: num_inference_steps、guidance_scale
+    """
+    if use_dmd2:
+        # DMD2: 12步，CFG=2.5（原始稳定配置）
+        return {"num_inference_steps": 12, "guidance_scale": 2.5}
+    # 标准模式: 20步，CFG=7.0（原始配置）
+    return {"num_inference_steps": 20, "guidance_scale": 7.0}
+
+
+def _normalize_loras(loras):
+    """LoRA配置转为 ((名称, 路径, 权重), ...)，名称缺省时使用文件名"""
+    normalized = []
+    for lora in loras or []:
+        path = Path(lora["path"]).resolve()
+        normalized.append((lora.get("name") or path.stem, path, float(lora.get("weight", 1.0))))
+    return tuple(normalized)
+
+
+class SDXLPipelineService:
+    """常驻SDXL管线服务"""
+
+    def __init__(self, model_path=None, config_dir=None, device="cuda", scheduler=DEFAULT_SCHEDULER,
+                 idle_timeout=None, min_free_memory_mb=None, loader=None, memory_probe=None,
+                 snapshot=None, fuse_loras=None):
+        """
+        初始化管线服务（不会立即加载模型）
+
+        Args:
+            model_path: 单文件checkpoint（.safetensors）或diffusers格式的模型文件夹
+            config_dir: 单文件checkpoint对应的diffusers配置文件夹，默认为checkpoint所在文件夹
+            device: 运行设备（cuda / cpu）
+            scheduler: diffusers调度器类名，None表示使用模型自带的调度器
+            idle_timeout: 空闲多少秒后卸载模型，<=0 表示常驻不卸载
+                          默认读取config.json中的 sdxl_idle_timeout
+            min_free_memory_mb: 空闲时可用显存低于该值则卸载，<=0 表示不检查
+                                默认读取config.json中的 sdxl_min_free_memory_mb
+            loader: 自定义加载函数 loader(model_path, config_dir, device, scheduler)，
+                    默认加载StableDiffusionXLPipeline（测试和基准时可传入随机初始化的小管线）
+            memory_probe: 自定义可用显存查询函数 memory_probe(device) -> MB或None
+            snapshot: 是否优先加载转换好的diffusers快照，默认读取 sdxl_snapshot_enabled
+            fuse_loras: 快照中融合的LoRA（与转换时一致才会使用快照），
+                        默认在 sdxl_snapshot_fuse_lora 为true时使用DMD2
+        """
+        self.model_path = Path(model_path) if model_path else DEFAULT_MODEL_PATH
+        self.config_dir = Path(config_dir) if config_dir else self.model_path.parent
+        self.device = device
+        self.scheduler = scheduler
+        if idle_timeout is None:
+            idle_timeout = get_setting("sdxl_idle_timeout", DEFAULT_IDLE_TIMEOUT)
+        if min_free_memory_mb is None:
+            min_free_memory_mb = get_setting("sdxl_min_free_memory_mb", DEFAULT_MIN_FREE_MEMORY_MB)
+        self.idle_timeout = idle_timeout
+        self.min_free_memory_mb = min_free_memory_mb
+        self._loader = loader or _load_sdxl
+        self._memory_probe = memory_probe or free_memory_mb
+        if snapshot is None:
+            snapshot = get_setting("sdxl_snapshot_enabled", True)
+        if fuse_loras is None:
+            fuse_loras = default_loras() if get_setting("sdxl_snapshot_fuse_lora", False) else []
+        self.snapshot = snapshot
+        self.fuse_loras = fuse_loras
+
+        self._pipe = None
+        self._lora_files = {}       # 已加载的LoRA: 名称 -> 路径
+        self._adapters = ()         # 当前生效的 ((名称, 权重), ...)
+        self._fused = ()            # 快照中已融合的 ((名称, 路径, 权重), ...)
+        self._lock = threading.RLock()
+        self._use_lock = threading.Lock()  # 同一时间只有一个调用方使用管线
+        self._active = 0
+        self._last_used = 0.0
+        self._timer = None
+
+        self._stats = {
+            "loads": 0,
+            "unloads": 0,
+            "load_time": 0.0,
+            "snapshot_loads": 0,
+            "acquires": 0,
+            "hits": 0,
+            "lora_loads": 0,
+            "adapter_switches": 0,
+            "idle_unloads": 0,
+            "pressure_unloads": 0
+        }
+
+    @property
+    def is_loaded(self):
+        return self._pipe is not None
+
+    def _load(self):
+        """加载模型（调用方需持有self._lock）"""
+        if not self.model_path.exists():
+            raise FileNotFoundError(f"未找到模型: {self.model_path}")
+        # 先释放其他常驻模型（卸载空闲的TTS模型）
+        release_idle_residents(exclude="sdxl")
+        load_path = self.model_path
+        fused = ()
+        if self.snapshot and self.model_path.is_file():
+            manifest = find_snapshot(self.model_path, self.fuse_loras)
+            if manifest:
+                load_path = Path(manifest["path"])
+                fused = _normalize_loras(manifest["fused_loras"])
+            else:
+                print("  提示: 运行 python tools/sdxl_snapshot.py 转换为diffusers快照可加快加载")
+
+        print(f"加载SDXL模型: {load_path.name}")
+        start = time.perf_counter()
+        self._pipe = self._loader(load_path, self.config_dir, self.device, self.scheduler)
+        elapsed = time.perf_counter() - start
+
+        self._lora_files = {}
+        self._adapters = ()
+        self._fused = fused
+        self._stats["loads"] += 1
+        if load_path != self.model_path:
+            self._stats["snapshot_loads"] += 1
+        self._stats["load_time"] += elapsed
+        print(f"✓ SDXL模型加载完成，耗时 {elapsed:.1f}秒")
+
+    def load(self):
+        """预加载模型（已加载时不重复加载）"""
+        with self._lock:
+            if self._pipe is None:
+                self._load()
+                self._last_used = time.time()
+                if self._active == 0:
+                    self._schedule_eviction()
+
+    def unload(self):
+        """卸载模型并释放显存"""
+        with self._lock:
+            self._cancel_timer()
+            if self._pipe is None:
+                return
+            if self._active > 0:
+                # 仍有任务在使用，推迟卸载
+                self._schedule_eviction()
+                return
+
+            print("\n释放SDXL显存...")
+            self._pipe = None
+            self._lora_files = {}
+            self._adapters = ()
+            self._stats["unloads"] += 1
+
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _check_interval(self):
+        intervals = []
+        if self.idle_timeout and self.idle_timeout > 0:
+            intervals.append(self.idle_timeout)
+        if self.min_free_memory_mb and self.min_free_memory_mb > 0:
+            intervals.append(MEMORY_CHECK_INTERVAL)
+        return min(intervals) if intervals else None
+
+    def _schedule_eviction(self):
+        """空闲期间定时检查是否超时或显存紧张（调用方需持有self._lock）"""
+        self._cancel_timer()
+        interval = self._check_interval()
+        if interval is None or self._pipe is None:
+            return
+        self._timer = threading.Timer(interval, self._evict_if_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _memory_pressure(self):
+        """可用显存是否低于阈值"""
+        if not self.min_free_memory_mb or self.min_free_memory_mb <= 0:
+            return False
+        free = self._memory_probe(self.device)
+        return free is not None and free < self.min_free_memory_mb
+
+    def _evict_if_idle(self):
+        with self._lock:
+            self._timer = None
+            if self._active > 0 or self._pipe is None:
+                return
+            idle = time.time() - self._last_used
+            if self.idle_timeout and 0 < self.idle_timeout <= idle:
+                print(f"SDXL模型已空闲 {idle:.0f}秒，自动卸载")
+                self._stats["idle_unloads"] += 1
+                self.unload()
+            elif self._memory_pressure():
+                print("显存紧张，卸载空闲的SDXL模型")
+                self._stats["pressure_unloads"] += 1
+                self.unload()
+            else:
+                self._schedule_eviction()
+
+    def reclaim(self):
+        """
+        显存紧张时立即卸载空闲的管线（其他模型加载前调用）
+
+        Returns:
+            bool: 是否卸载了管线
+        """
+        with self._lock:
+            if self._pipe is None or self._active > 0 or not self._memory_pressure():
+                return False
+            print("显存紧张，卸载空闲的SDXL模型")
+            self._stats["pressure_unloads"] += 1
+            self.unload()
+            return True
+
+    def _apply_loras(self, pipe, loras):
+        """加载尚未加载的LoRA，并切换到本次需要的adapter组合（快照中已融合的LoRA跳过）"""
+        loras = tuple(lora for lora in loras if lora not in self._fused)
+        adapters = tuple((name, weight) for name, _, weight in loras)
+        if adapters == self._adapters and all(self._lora_files.get(name) == path for name, path, _ in loras):
+            return
+
+        for name, path, _ in loras:
+            if self._lora_files.get(name) == path:
+                continue
+            if name in self._lora_files:
+                # 同名adapter换了文件，先删除旧的
+                pipe.delete_adapters(name)
+            pipe.load_lora_weights(str(path.parent), weight_name=path.name, adapter_name=name)
+            self._lora_files[name] = path
+            self._stats["lora_loads"] += 1
+            print(f"✓ LoRA已加载: {name}（{path.name}）")
+
+        if adapters:
+            if not self._adapters:
+                pipe.enable_lora()
+            pipe.set_adapters([name for name, _ in adapters],
+                              adapter_weights=[weight for _, weight in adapters])
+        elif self._lora_files:
+            pipe.disable_lora()
+        self._adapters = adapters
+        self._stats["adapter_switches"] += 1
+
+    @contextmanager
+    def acquire(self, loras=None):
+        """
+        获取常驻的管线（首次使用时加载），并切换到指定的LoRA组合
+
+        Args:
+            loras: [{"name", "path", "weight"}]，None或空列表表示不使用LoRA
+
+        用法：
+            with service.acquire(default_loras()) as pipe:
+                image = pipe(prompt=...).images[0]
+        """
+        loras = _normalize_loras(loras)
+        with self._use_lock:
+            with self._lock:
+                self._cancel_timer()
+                self._stats["acquires"] += 1
+                if self._pipe is None:
+                    self._load()
+                else:
+                    self._stats["hits"] += 1
+                self._active += 1
+                pipe = self._pipe
+            try:
+                self._apply_loras(pipe, loras)
+                yield pipe
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._last_used = time.time()
+                    if self._active == 0:
+                        self._schedule_eviction()
+
+    def get_stats(self):
+        """获取累计统计信息"""
+        stats = dict(self._stats)
+        stats["loaded"] = self.is_loaded
+        stats["adapters"] = [name for name, _ in self._adapters]
+        return stats
+
+    def stats_since(self, snapshot):
+        """计算从snapshot（get_stats的返回值）到现在的增量"""
+        current = self.get_stats()
+        return {
+            key: current[key] - snapshot.get(key, 0)
+            for key in ("loads", "unloads", "load_time", "snapshot_loads", "acquires", "hits", "lora_loads",
+                        "adapter_switches", "idle_unloads", "pressure_unloads")
+        }
+
+    @staticmethod
+    def print_timing(delta):
+        """打印模型加载次数与命中情况"""
+        snapshot = f"（其中快照 {delta['snapshot_loads']} 次）" if delta.get('snapshot_loads') else ""
+        print(f"  SDXL模型加载: {delta['loads']} 次{snapshot}，{delta['load_time']:.1f}秒")
+        print(f"  SDXL管线复用: {delta['hits']}/{delta['acquires']} 次")
+        if delta.get('lora_loads') or delta.get('adapter_switches'):
+            print(f"  LoRA加载: {delta['lora_loads']} 次，切换: {delta['adapter_switches']} 次")
+
+
+def free_memory_mb(device):
+    """CUDA设备的可用显存（MB），其他设备返回None"""
+    if not str(device).startswith("cuda"):
+        return None
+    try:
+        import torch
+    except ImportError:
+        return None
+    if not torch.cuda.is_available():
+        return None
+    free, _ = torch.cuda.mem_get_info(torch.device(device))
+    return free / 1024 ** 2
+
+
+def _load_sdxl(model_path, config_dir, device, scheduler):
+    """默认加载函数：单文件checkpoint用from_single_file，diffusers文件夹用from_pretrained"""
+    import torch
+    import diffusers
+    from diffusers import StableDiffusionXLPipeline
+
+    dtype = torch.float16 if str(device).startswith("cuda") else torch.float32
+    if model_path.is_dir():
+        # diffusers文件夹（含转换好的快照）：safetensors按内存映射读取，不先整体读入内存
+        pipe = StableDiffusionXLPipeline.from_pretrained(
+            str(model_path),
+            torch_dtype=dtype,
+            use_safetensors=True,
+            low_cpu_mem_usage=True,
+            local_files_only=True
+        )
+    else:
+        pipe = StableDiffusionXLPipeline.from_single_file(
+            str(model_path),
+            torch_dtype=dtype,
+            config=str(config_dir),
+            local_files_only=True
+        )
+    pipe = pipe.to(device)
+
+    if scheduler:
+        scheduler_cls = getattr(diffusers, scheduler)
+        pipe.scheduler = scheduler_cls.from_config(pipe.scheduler.config)
+        print(f"✓ 使用调度器: {scheduler}")
+
+    pipe.enable_attention_slicing()
+    pipe.enable_vae_slicing()
+    return pipe
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_pipeline_service(model_path=None, config_dir=None, device="cuda", scheduler=DEFAULT_SCHEDULER):
+    """
+    获取进程内共享的管线服务（同一模型、设备和调度器只创建一个实例）
+
+    Args:
+        model_path: 模型路径，默认为 Prefect Illustrious XL 40
+        config_dir: 单文件checkpoint的配置文件夹
+        device: 运行设备
+        scheduler: 调度器类名
+    """
+    model_path = Path(model_path) if model_path else DEFAULT_MODEL_PATH
+    key = (str(model_path.resolve()), str(device), scheduler)
+
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = SDXLPipelineService(model_path, config_dir, device=device, scheduler=scheduler)
+            _services[key] = service
+        return service
+
+
+def release_idle_pipelines():
+    """
+    显存紧张时卸载所有空闲的管线（加载其他GPU模型前调用，不会创建新服务）
+
+    Returns:
+        int: 卸载的管线数
+    """
+    with _services_lock:
+        services = list(_services.values())
+    return sum(1 for service in services if service.reclaim())
+
+
+register_resident("sdxl", release_idle_pipelines)
@@ -0,0 +1,258 @@
+"""
+SDXL diffusers格式快照
+from_single_file 每次加载都要把单文件checkpoint重新转换成diffusers的各个模块；
+这里一次性转换为fp16的diffusers格式（可选把LoRA融合进权重），保存在 sdxl/models/snapshots/ 下，
+之后用 from_pretrained 加载，safetensors按内存映射读取。
+快照记录源文件和LoRA的内容哈希，任一文件变化后旧快照失效，需要重新转换
+
+用法：
+    python tools/sdxl_snapshot.py               # 转换默认模型
+    python tools/sdxl_snapshot.py --fuse-lora   # 同时融合DMD2 LoRA
+    python tools/sdxl_snapshot.py --list
+"""
+import hashlib
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from file_hashing import file_digest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+MODELS_DIR = PROJECT_ROOT / "sdxl" / "models"
+DEFAULT_SNAPSHOT_DIR = MODELS_DIR / "snapshots"
+
+# 快照格式版本，转换方式变化时修改以使旧快照失效
+SNAPSHOT_VERSION = "1"
+
+MANIFEST_NAME = "snapshot.json"
+HASHES_NAME = "file_hashes.json"
+
+_hashes_lock = threading.Lock()
+
+
+def _file_hash(path, root):
+    """
+    文件内容的SHA256（按路径、大小、修改时间记录在 file_hashes.json 中，文件未变化时不重新计算）
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    hashes_file = Path(root) / HASHES_NAME
+    with _hashes_lock:
+        hashes = {}
+        if hashes_file.exists():
+            try:
+                with open(hashes_file, 'r', encoding='utf-8') as f:
+                    hashes = json.load(f)
+            except (OSError, ValueError):
+                hashes = {}
+        entry = hashes.get(str(path))
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['sha256']
+
+        print(f"计算文件哈希: {path.name}...")
+        digest = file_digest(path)
+        hashes[str(path)] = {"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime}
+        hashes_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = hashes_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f, ensure_ascii=False, indent=2)
+        tmp_file.replace(hashes_file)
+        return digest
+
+
+def _lora_entries(loras):
+    """LoRA配置按名称排序为 [{"name", "path", "weight"}]"""
+    entries = []
+    for lora in loras or []:
+        path = Path(lora["path"])
+        entries.append({"name": lora.get("name") or path.stem, "path": path,
+                        "weight": float(lora.get("weight", 1.0))})
+    return sorted(entries, key=lambda e: e["name"])
+
+
+def snapshot_key(model_path, loras=None, root=None):
+    """
+    快照的内容哈希：源checkpoint + 融合的LoRA（内容和权重）+ 快照格式版本
+
+    Returns:
+        str: 十六进制SHA256
+    """
+    root = Path(root) if root else DEFAULT_SNAPSHOT_DIR
+    spec = {
+        "version": SNAPSHOT_VERSION,
+        "dtype": "float16",
+        "model": _file_hash(model_path, root),
+        "loras": [
+            {"name": e["name"], "sha256": _file_hash(e["path"], root), "weight": e["weight"]}
+            for e in _lora_entries(loras)
+        ]
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _snapshot_dir(model_path, key, root):
+    return Path(root) / f"{Path(model_path).stem}-{key[:12]}"
+
+
+def _read_manifest(snapshot_dir):
+    try:
+        with open(Path(snapshot_dir) / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def find_snapshot(model_path, loras=None, root=None):
+    """
+    查找与源文件和LoRA匹配的快照
+
+    Args:
+        model_path: 单文件checkpoint
+        loras: 融合进快照的LoRA [{"name", "path", "weight"}]
+        root: 快照目录，默认为 sdxl/models/snapshots
+
+    Returns:
+        dict: 快照清单（含 path），没有可用快照时返回None
+    """
+    root = Path(root) if root else DEFAULT_SNAPSHOT_DIR
+    model_path = Path(model_path)
+    # 没有这个模型的任何快照时不计算哈希（首次计算大文件哈希需要数秒）
+    if not model_path.is_file() or not any(root.glob(f"{model_path.stem}-*/{MANIFEST_NAME}")):
+        return None
+    if any(not Path(e["path"]).exists() for e in _lora_entries(loras)):
+        return None
+
+    key = snapshot_key(model_path, loras, root)
+    snapshot_dir = _snapshot_dir(model_path, key, root)
+    manifest = _read_manifest(snapshot_dir)
+    if not manifest or manifest.get("key") != key or not (snapshot_dir / "model_index.json").exists():
+        return None
+    manifest["path"] = str(snapshot_dir)
+    return manifest
+
+
+def convert_snapshot(model_path, config_dir=None, loras=None, root=None, force=False):
+    """
+    把单文件checkpoint转换为fp16的diffusers格式快照（已有匹配的快照时直接返回）
+
+    LoRA按各自权重融合进UNet和文本编码器后卸载adapter，快照中不再包含LoRA层；
+    同一模型、融合同一组LoRA的旧快照在新快照写入后删除
+
+    Args:
+        model_path: 单文件checkpoint
+        config_dir: diffusers配置文件夹，默认为checkpoint所在文件夹
+        loras: 要融合的LoRA [{"name", "path", "weight"}]，None表示不融合
+        root: 快照目录
+        force: 即使已有匹配的快照也重新转换
+
+    Returns:
+        dict: 快照清单（含 path）
+    """
+    import torch
+    from diffusers import StableDiffusionXLPipeline
+
+    root = Path(root) if root else DEFAULT_SNAPSHOT_DIR
+    model_path = Path(model_path)
+    config_dir = Path(config_dir) if config_dir else model_path.parent
+    if not model_path.is_file():
+        raise FileNotFoundError(f"未找到模型: {model_path}")
+    if not force:
+        existing = find_snapshot(model_path, loras, root)
+        if existing:
+            print(f"✓ 快照已是最新: {existing['path']}")
+            return existing
+
+    key = snapshot_key(model_path, loras, root)
+    snapshot_dir = _snapshot_dir(model_path, key, root)
+    tmp_dir = snapshot_dir.with_name(snapshot_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+
+    print(f"转换模型: {model_path.name} → {snapshot_dir.name}")
+    start = time.perf_counter()
+    pipe = StableDiffusionXLPipeline.from_single_file(
+        str(model_path),
+        torch_dtype=torch.float16,
+        config=str(config_dir),
+        local_files_only=True
+    )
+
+    entries = _lora_entries(loras)
+    if entries:
+        for e in entries:
+            pipe.load_lora_weights(str(e["path"].parent), weight_name=e["path"].name, adapter_name=e["name"])
+        names = [e["name"] for e in entries]
+        pipe.set_adapters(names, adapter_weights=[e["weight"] for e in entries])
+        pipe.fuse_lora(adapter_names=names)
+        pipe.unload_lora_weights()
+        fused = ", ".join(f"{e['name']}({e['weight']})" for e in entries)
+        print(f"✓ 已融合LoRA: {fused}")
+
+    pipe.save_pretrained(str(tmp_dir), safe_serialization=True)
+    manifest = {
+        "key": key,
+        "version": SNAPSHOT_VERSION,
+        "source": str(model_path.resolve()),
+        "dtype": "float16",
+        "fused_loras": [{"name": e["name"], "path": str(e["path"].resolve()), "weight": e["weight"]}
+                        for e in entries],
+        "created": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    if snapshot_dir.exists():
+        shutil.rmtree(snapshot_dir)
+    tmp_dir.replace(snapshot_dir)
+    elapsed = time.perf_counter() - start
+    print(f"✓ 快照已保存: {snapshot_dir}（{elapsed:.1f}秒）")
+
+    # 删除同一模型、融合同一组LoRA的旧快照（源文件或LoRA已变化）
+    names = [e["name"] for e in entries]
+    for old_dir in root.glob(f"{model_path.stem}-*"):
+        old = _read_manifest(old_dir)
+        if old_dir != snapshot_dir and old and [l["name"] for l in old.get("fused_loras", [])] == names:
+            shutil.rmtree(old_dir)
+            print(f"  已删除旧快照: {old_dir.name}")
+
+    manifest["path"] = str(snapshot_dir)
+    return manifest
+
+
+def list_snapshots(root=None):
+    """所有快照的清单（按目录名排序）"""
+    root = Path(root) if root else DEFAULT_SNAPSHOT_DIR
+    snapshots = []
+    for manifest_file in sorted(root.glob(f"*/{MANIFEST_NAME}")):
+        manifest = _read_manifest(manifest_file.parent)
+        if manifest:
+            manifest["path"] = str(manifest_file.parent)
+            snapshots.append(manifest)
+    return snapshots
+
+
+def main():
+    import argparse
+    from sdxl_pipeline import DEFAULT_MODEL_PATH, default_loras
+
+    parser = argparse.ArgumentParser(description='SDXL diffusers格式快照')
+    parser.add_argument('--model', type=str, default=str(DEFAULT_MODEL_PATH), help='单文件checkpoint路径')
+    parser.add_argument('--config', type=str, default=None, help='diffusers配置文件夹（默认为checkpoint所在文件夹）')
+    parser.add_argument('--fuse-lora', action='store_true', help='融合DMD2加速LoRA')
+    parser.add_argument('--force', action='store_true', help='即使已有匹配的快照也重新转换')
+    parser.add_argument('--list', action='store_true', help='列出已有快照')
+    args = parser.parse_args()
+
+    if args.list:
+        for manifest in list_snapshots():
+            loras = ", ".join(f"{l['name']}({l['weight']})" for l in manifest['fused_loras']) or "无"
+            print(f"  {Path(manifest['path']).name:<40} 融合LoRA: {loras}  {manifest['created']}")
+        return
+
+    convert_snapshot(args.model, args.config, default_loras() if args.fuse_lora else None, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
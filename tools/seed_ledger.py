@@ -0,0 +1,146 @@
+"""
+分镜图像种子台账
+每张分镜图生成后，把种子和生成参数（步数、CFG、调度器、尺寸、模型和LoRA文件、提示词模板）
+记录在 Prompts.json 对应 scene_prompts 条目的 "generation" 字段中：
+同一种子可以复现喜欢的图（例如提高步数重新生成），提示词和参数都没变的图不必重新生成
+
+种子模式（config.json 中的 sdxl_seed_mode）：
+- random: 每次生成随机种子（默认）
+- deterministic: 由（项目名, 分镜序号, 提示词）推导，同一分镜的同一提示词总是得到同一种子
+"""
+import hashlib
+import json
+import random
+import time
+from pathlib import Path
+
+from app_config import get_setting
+
+SEED_MODES = ("random", "deterministic")
+
+# 生成记录中参与比较的参数（created 等字段不影响图像）
+SETTING_KEYS = ("steps", "cfg", "scheduler", "width", "height", "clip_skip",
+                "model", "loras", "prompt_template")
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _file_identity(path):
+    """
+    文件标识：文件名、大小、修改时间（不读取内容，数GB的checkpoint也不必计算哈希）
+
+    文件被替换或重新下载后大小或修改时间会变化，旧图随之视为过期
+    """
+    path = Path(path)
+    if not path.is_file():
+        return {"name": path.name}
+    stat = path.stat()
+    return {"name": path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def random_seed():
+    return random.randint(0, 2**32 - 1)
+
+
+def derive_seed(project_name, scene_index, prompt):
+    """由（项目名, 分镜序号, 提示词）推导种子"""
+    payload = json.dumps([project_name, scene_index, prompt], ensure_ascii=False)
+    return int(hashlib.sha256(payload.encode('utf-8')).hexdigest()[:8], 16)
+
+
+def seed_mode():
+    """当前种子模式（配置无效时为 random）"""
+    mode = get_setting("sdxl_seed_mode", "random")
+    if mode not in SEED_MODES:
+        print(f"⚠ 未知的种子模式 {mode}，使用 random")
+        return "random"
+    return mode
+
+
+def scene_seed(mode, project_name, scene_index, prompt):
+    """按种子模式为分镜选择种子"""
+    if mode == "deterministic":
+        return derive_seed(project_name, scene_index, prompt)
+    return random_seed()
+
+
+def generation_settings(pipeline_service, loras, params, width, height, clip_skip):
+    """
+    本次生成的参数（写入生成记录，也用于判断已有的图是否过期）
+
+    模型和LoRA按文件名、大小和修改时间记录
+
+    Args:
+        pipeline_service: SDXLPipelineService
+        loras: 本次使用的LoRA [{"name", "path", "weight"}]
+        params: sampling_params() 的返回值
+        width / height: 图像尺寸
+        clip_skip: 文本编码器层
+    """
+    from prompt_embeddings import NEGATIVE_PROMPT, QUALITY_TAGS
+
+    model_path = Path(pipeline_service.model_path)
+    return {
+        "steps": params["num_inference_steps"],
+        "cfg": params["guidance_scale"],
+        "scheduler": pipeline_service.scheduler or "default",
+        "width": width,
+        "height": height,
+        "clip_skip": clip_skip,
+        "model": _file_identity(model_path),
+        "loras": [
+            {"name": lora.get("name") or Path(lora["path"]).stem,
+             "file": _file_identity(lora["path"]),
+             "weight": float(lora.get("weight", 1.0))}
+            for lora in sorted(loras, key=lambda l: l.get("name") or Path(l["path"]).stem)
+        ],
+        # 质量标签和负面词变化后旧图也视为过期
+        "prompt_template": _digest(f"{QUALITY_TAGS}\n{NEGATIVE_PROMPT}")
+    }
+
+
+def make_record(seed, prompt, settings, pinned=()):
+    """
+    生成记录（写入 scene_prompts 条目的 generation 字段）
+
+    Args:
+        pinned: 手动指定的参数名（如单图重生时提高步数的 "steps"），
+                批量生成时不因这些参数与默认值不同而重新生成
+    """
+    record = {"seed": seed, "prompt_sha256": _digest(prompt)}
+    record.update(settings)
+    if pinned:
+        record["pinned"] = sorted(pinned)
+    record["created"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+
+def matches_prompt(record, prompt):
+    """生成记录是否由该提示词生成"""
+    return record.get("prompt_sha256") == _digest(prompt)
+
+
+def is_unchanged(scene, settings):
+    """
+    分镜的提示词和生成参数是否与记录一致
+
+    没有记录的分镜（台账之前生成的图）无法判断，视为未变化；手动指定的参数不参与比较
+    """
+    record = scene.get("generation")
+    if not record:
+        return True
+    if not matches_prompt(record, scene.get("prompt", "")):
+        return False
+    pinned = set(record.get("pinned") or ())
+    return all(record.get(key) == settings.get(key) for key in SETTING_KEYS if key not in pinned)
+
+
+def save_prompts(prompts_file, prompts_data):
+    """写回 Prompts.json（先写临时文件再替换，中途中断不会留下半个文件）"""
+    prompts_file = Path(prompts_file)
+    tmp_file = prompts_file.with_suffix(".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(prompts_data, f, ensure_ascii=False, indent=2)
+    tmp_file.replace(prompts_file)
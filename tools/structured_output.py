@@ -0,0 +1,338 @@
+"""
+LLM结构化输出解析
+从回复中提取JSON（```json 代码块、前后夹杂说明文字、JSON模式下的纯JSON都可以），
+解析失败时先在本地做低成本修复，再按调用方给出的schema校验，尽量避免因为格式问题重新请求：
+- 中文引号“”「」作为字符串定界符、全角逗号/冒号
+- 多余的尾逗号、字符串内未转义的引号、Python 风格的 True/False/None
+- 回复被截断：补齐未闭合的括号，必要时退回到最后一个完整元素（被截断的字符串不保留，以免用到半截内容）
+
+schema 使用 JSON Schema 的一个子集：type（可为列表）、properties、required、items、minItems、enum，
+数字/布尔值写成字符串等简单类型偏差会自动转换
+"""
+import json
+import threading
+
+# 中文引号（开 → 闭）
+_QUOTE_PAIRS = {"“": "”", "「": "」", "『": "』"}
+
+# 字符串外的全角标点
+_FULLWIDTH = {"，": ",", "：": ":", "｛": "{", "｝": "}", "［": "[", "］": "]"}
+
+# Python 风格的字面量
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# 截断修复时最多尝试的截断位置数
+MAX_REPAIR_CANDIDATES = 50
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+# 解析统计（进程内共享）
+_stats = {
+    "parsed": 0,     # 直接解析成功
+    "repaired": 0,   # 本地修复后成功
+    "truncated": 0,  # 其中修复了截断的回复
+    "failed": 0      # 修复后仍无法解析或不符合schema
+}
+_stats_lock = threading.Lock()
+
+
+class StructuredOutputError(ValueError):
+    """回复中没有可用的JSON，或不符合schema（errors为校验错误列表）"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def get_stats():
+    """获取累计解析统计"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ---------- 提取 ----------
+
+def _json_region(text, expect=None):
+    """
+    回复中JSON开始的位置之后的文本
+
+    有 ``` 代码块时取代码块内容（没有结束标记时取到末尾），否则从第一个 { 或 [ 开始；
+    expect 为 "object" / "array" 时只找对应的括号
+    """
+    if "```" in text:
+        block = text.split("```", 1)[1]
+        if block.startswith("json"):
+            block = block[4:]
+        block = block.split("```", 1)[0]
+        if block.strip():
+            text = block
+
+    openers = {"object": "{", "array": "["}.get(expect, "{[")
+    positions = [p for p in (text.find(c) for c in openers) if p >= 0]
+    if not positions:
+        return None
+    return text[min(positions):]
+
+
+# ---------- 修复 ----------
+
+def _skip_spaces(text, i):
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return i
+
+
+def _repair(text):
+    """
+    逐字符修复JSON的常见问题，在顶层值结束处停止（丢弃后面的说明文字）
+
+    Returns:
+        tuple: (修复后的文本, 是否完整, 未闭合的括号栈, 是否停在字符串中, 可截断位置列表[(位置, 括号栈)])
+    """
+    out = []
+    stack = []
+    cuts = []
+    in_string = False
+    closer = None
+    nested = 0
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if in_string:
+            if c == "\\":
+                out.append(text[i:i + 2])
+                i += 2
+                continue
+            if c == closer:
+                if closer == '"':
+                    # 字符串内未转义的引号：后面不是结构字符时视为内容
+                    j = _skip_spaces(text, i + 1)
+                    if j < n and text[j] not in ",:}]":
+                        out.append('\\"')
+                        i += 1
+                        continue
+                elif nested:
+                    # 中文引号定界的字符串内成对的中文引号
+                    nested -= 1
+                    out.append(c)
+                    i += 1
+                    continue
+                in_string = False
+                out.append('"')
+            elif closer != '"' and c in _QUOTE_PAIRS:
+                nested += 1
+                out.append(c)
+            elif c == '"':
+                out.append('\\"')
+            else:
+                out.append(c)
+            i += 1
+            continue
+
+        if c == '"' or c in _QUOTE_PAIRS:
+            in_string = True
+            closer = _QUOTE_PAIRS.get(c, '"')
+            nested = 0
+            out.append('"')
+            i += 1
+            continue
+
+        c = _FULLWIDTH.get(c, c)
+        if c in "{[":
+            stack.append(c)
+            out.append(c)
+            cuts.append((len(out), tuple(stack)))
+        elif c in "}]":
+            if stack:
+                stack.pop()
+            out.append(c)
+            if not stack:
+                return "".join(out), True, [], False, cuts
+            cuts.append((len(out), tuple(stack)))
+        elif c == ",":
+            j = _skip_spaces(text, i + 1)
+            if j < n and _FULLWIDTH.get(text[j], text[j]) in "}]":
+                i += 1  # 尾逗号
+                continue
+            cuts.append((len(out), tuple(stack)))
+            out.append(c)
+        elif c.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    return "".join(out), False, stack, in_string, cuts
+
+
+def _closers(stack):
+    return "".join("}" if c == "{" else "]" for c in reversed(stack))
+
+
+def _candidates(text):
+    """
+    修复后的候选文本（按保留内容从多到少排列）
+
+    Returns:
+        tuple: (候选列表, 是否修复了截断)
+    """
+    repaired, complete, stack, in_string, cuts = _repair(text)
+    if complete:
+        return [repaired], False
+    # 截断：停在字符串外时先直接补齐括号，不行再退回到之前的完整元素
+    candidates = [] if in_string else [repaired + _closers(stack)]
+    for position, cut_stack in reversed(cuts[-MAX_REPAIR_CANDIDATES:]):
+        candidates.append(repaired[:position] + _closers(cut_stack))
+    return candidates, True
+
+
+# ---------- 校验 ----------
+
+def _matches(value, type_name):
+    if type_name == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if type_name == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, _TYPES[type_name])
+
+
+def _coerce(value, type_name):
+    """简单类型偏差的转换（如 "0.8" → 0.8），无法转换时返回原值"""
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            if type_name == "number":
+                return float(text)
+            if type_name == "integer":
+                return int(float(text)) if float(text).is_integer() else value
+        except ValueError:
+            return value
+        if type_name == "boolean" and text.lower() in ("true", "false"):
+            return text.lower() == "true"
+    if type_name == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if type_name == "integer" and isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def validate(value, schema, path="$"):
+    """
+    按schema校验（并做简单类型转换）
+
+    Returns:
+        tuple: (转换后的值, 错误列表)
+    """
+    errors = []
+    types = schema.get("type")
+    if types:
+        types = [types] if isinstance(types, str) else types
+        if not any(_matches(value, t) for t in types):
+            for t in types:
+                coerced = _coerce(value, t)
+                if _matches(coerced, t):
+                    value = coerced
+                    break
+            else:
+                return value, [f"{path}: 应为 {'/'.join(types)}，实际为 {type(value).__name__}"]
+
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} 不在 {schema['enum']} 中")
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: 缺少 {key}")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                value[key], sub_errors = validate(value[key], sub_schema, f"{path}.{key}")
+                errors.extend(sub_errors)
+    elif isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{path}: 至少需要 {schema['minItems']} 项")
+        if "items" in schema:
+            for index, item in enumerate(value):
+                value[index], sub_errors = validate(item, schema["items"], f"{path}[{index}]")
+                errors.extend(sub_errors)
+    return value, errors
+
+
+# ---------- 解析 ----------
+
+def parse_json(text, schema=None):
+    """
+    从LLM回复中解析JSON
+
+    Args:
+        text: 回复内容
+        schema: 期望的结构（None表示只解析不校验）
+
+    Returns:
+        解析（并按schema转换）后的数据
+
+    Raises:
+        StructuredOutputError: 修复后仍无法解析或不符合schema
+    """
+    if not text or not text.strip():
+        _count("failed")
+        raise StructuredOutputError("空回复")
+    schema = schema or {}
+
+    # JSON模式的回复通常可以直接解析
+    try:
+        data = json.loads(text.strip(), strict=False)
+    except ValueError:
+        pass
+    else:
+        data, errors = validate(data, schema)
+        if not errors:
+            _count("parsed")
+            return data
+
+    region = _json_region(text, schema.get("type"))
+    if region is None:
+        _count("failed")
+        raise StructuredOutputError(f"回复中没有JSON: {text[:80]!r}")
+
+    candidates, truncated = _candidates(region)
+    first_errors = None
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate, strict=False)
+        except ValueError as e:
+            first_errors = first_errors or [f"JSON格式错误: {e}"]
+            continue
+        data, errors = validate(data, schema)
+        if errors:
+            # 不符合schema（如截断处的元素缺少字段）时继续退回
+            first_errors = first_errors or errors
+            continue
+        if not region.startswith(candidate):
+            _count("repaired")
+            if truncated:
+                _count("truncated")
+        else:
+            _count("parsed")
+        return data
+
+    _count("failed")
+    errors = first_errors or []
+    raise StructuredOutputError(f"无法解析的回复: {'; '.join(errors[:3])}", errors)
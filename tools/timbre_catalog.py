@@ -0,0 +1,299 @@
+"""
+音色目录
+扫描 Timbre/ 文件夹，持久化每个音色的文件哈希、时长、采样率，
+并预先计算IndexTTS的说话人条件（参考音频梅尔谱），避免每句合成都重新解码参考音频
+"""
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+from file_hashing import file_digest
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_TIMBRE_DIR = PROJECT_ROOT / "Timbre"
+DEFAULT_CACHE_DIR = PROJECT_ROOT / "cache" / "timbres"
+
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.flac'}
+
+# IndexTTS 1.5 参考音频的采样率
+COND_SAMPLE_RATE = 24000
+
+
+def _probe_audio(path):
+    """读取音频时长和采样率"""
+    try:
+        import soundfile as sf
+        info = sf.info(str(path))
+        return info.frames / info.samplerate, info.samplerate
+    except Exception:
+        pass
+    try:
+        import torchaudio
+        info = torchaudio.info(str(path))
+        return info.num_frames / info.sample_rate, info.sample_rate
+    except Exception:
+        return None, None
+
+
+class TimbreCatalog:
+    """音色目录（带说话人条件缓存）"""
+
+    def __init__(self, timbre_dir=None, cache_dir=None):
+        """
+        Args:
+            timbre_dir: 音色参考音频文件夹，默认为 ../Timbre
+            cache_dir: 目录和条件缓存的保存位置，默认为 ../cache/timbres
+        """
+        self.timbre_dir = Path(timbre_dir) if timbre_dir else DEFAULT_TIMBRE_DIR
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        # 不同音色文件夹使用各自的目录文件，条件缓存按内容哈希共享
+        dir_key = hashlib.sha1(str(self.timbre_dir.resolve()).encode('utf-8')).hexdigest()[:8]
+        self.catalog_file = self.cache_dir / f"catalog_{dir_key}.json"
+
+        self._lock = threading.RLock()
+        self._entries = self._load_catalog()
+        self._conditioning = {}  # sha256 -> 已加载的条件张量（CPU）
+
+    def _load_catalog(self):
+        if not self.catalog_file.exists():
+            return {}
+        try:
+            with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('timbres', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_catalog(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.catalog_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"timbres": self._entries}, f, ensure_ascii=False, indent=2)
+        tmp_file.replace(self.catalog_file)
+
+    def refresh(self):
+        """
+        同步目录：只对新增或修改过（大小/修改时间变化）的文件重新计算哈希和时长
+
+        Returns:
+            dict: 文件名 -> 音色信息
+        """
+        with self._lock:
+            if not self.timbre_dir.exists():
+                return {}
+
+            changed = False
+            seen = set()
+            for file_path in sorted(self.timbre_dir.iterdir()):
+                if file_path.suffix.lower() not in AUDIO_EXTENSIONS:
+                    continue
+                seen.add(file_path.name)
+                stat = file_path.stat()
+                entry = self._entries.get(file_path.name)
+                if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                    continue
+
+                duration, sample_rate = _probe_audio(file_path)
+                self._entries[file_path.name] = {
+                    "name": file_path.stem,
+                    "filename": file_path.name,
+                    "sha256": file_digest(file_path),
+                    "duration": duration,
+                    "sample_rate": sample_rate,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime
+                }
+                changed = True
+
+            for filename in list(self._entries):
+                if filename not in seen:
+                    del self._entries[filename]
+                    changed = True
+
+            if changed:
+                self._save_catalog()
+            return self._entries
+
+    def list(self):
+        """所有音色信息（按文件名排序），每项附带完整路径"""
+        entries = self.refresh()
+        return [
+            dict(entry, path=str(self.timbre_dir / filename))
+            for filename, entry in sorted(entries.items())
+        ]
+
+    def get(self, timbre):
+        """
+        按文件名（含扩展名）或音色名（不含扩展名）查找音色
+
+        Returns:
+            dict: 音色信息，找不到返回None
+        """
+        entries = self.refresh()
+        entry = entries.get(timbre)
+        if entry is None:
+            entry = next((e for e in entries.values() if e['name'] == timbre), None)
+        if entry is None:
+            return None
+        return dict(entry, path=str(self.timbre_dir / entry['filename']))
+
+    def find_by_path(self, audio_path):
+        """根据参考音频路径查找目录中的音色"""
+        audio_path = Path(audio_path)
+        try:
+            if audio_path.parent.resolve() != self.timbre_dir.resolve():
+                return None
+        except OSError:
+            return None
+        return self.get(audio_path.name)
+
+    def default(self):
+        """默认音色：第一个WAV文件，没有WAV时取第一个音色"""
+        entries = self.list()
+        wav_entries = [e for e in entries if e['filename'].lower().endswith('.wav')]
+        candidates = wav_entries or entries
+        return candidates[0] if candidates else None
+
+    def _conditioning_file(self, entry):
+        return self.cache_dir / f"{entry['sha256']}.cond.pt"
+
+    @staticmethod
+    def compute_conditioning(audio_path):
+        """
+        计算IndexTTS 1.5的说话人条件（与 IndexTTS.infer 中的参考音频处理一致）
+
+        Returns:
+            torch.Tensor: 参考音频梅尔谱（CPU）
+        """
+        import torch
+        import torchaudio
+        from indextts.utils.feature_extractors import MelSpectrogramFeatures
+
+        audio, sr = torchaudio.load(str(audio_path))
+        audio = torch.mean(audio, dim=0, keepdim=True)
+        audio = torchaudio.transforms.Resample(sr, COND_SAMPLE_RATE)(audio)
+        return MelSpectrogramFeatures()(audio).cpu()
+
+    def get_conditioning(self, timbre):
+        """
+        获取音色的说话人条件：内存 -> 磁盘缓存 -> 现场计算并持久化
+
+        Args:
+            timbre: 音色文件名、音色名或音色信息dict
+
+        Returns:
+            torch.Tensor: 条件张量（CPU），音色不存在返回None
+        """
+        import torch
+
+        entry = timbre if isinstance(timbre, dict) else self.get(timbre)
+        if entry is None:
+            return None
+
+        with self._lock:
+            cond = self._conditioning.get(entry['sha256'])
+            if cond is not None:
+                return cond
+
+            cond_file = self._conditioning_file(entry)
+            if cond_file.exists():
+                cond = torch.load(cond_file, map_location="cpu")
+            else:
+                cond = self.compute_conditioning(self.timbre_dir / entry['filename'])
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                torch.save(cond, cond_file)
+
+            self._conditioning[entry['sha256']] = cond
+            return cond
+
+    def prime(self, tts, audio_prompt):
+        """
+        将预计算的条件写入IndexTTS实例的参考音频缓存，
+        使 tts.infer(audio_prompt=...) 跳过参考音频解码
+
+        Args:
+            tts: IndexTTS 实例
+            audio_prompt: 即将传给 infer 的参考音频路径（字符串需一致）
+
+        Returns:
+            bool: 是否成功写入
+        """
+        if not hasattr(tts, "cache_cond_mel"):
+            return False
+        audio_prompt = str(audio_prompt)
+        if getattr(tts, "cache_audio_prompt", None) == audio_prompt and tts.cache_cond_mel is not None:
+            return True
+
+        entry = self.find_by_path(audio_prompt)
+        if entry is None:
+            return False
+
+        cond = self.get_conditioning(entry)
+        tts.cache_cond_mel = cond.to(tts.device)
+        tts.cache_audio_prompt = audio_prompt
+        return True
+
+    def precompute_all(self):
+        """为所有音色预先计算并持久化说话人条件"""
+        entries = self.list()
+        for entry in entries:
+            cached = self._conditioning_file(entry).exists()
+            self.get_conditioning(entry)
+            print(f"  {'✓' if cached else '+'} {entry['filename']}")
+        return len(entries)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_timbre_catalog(timbre_dir=None):
+    """获取进程内共享的音色目录"""
+    timbre_dir = Path(timbre_dir) if timbre_dir else DEFAULT_TIMBRE_DIR
+    key = str(timbre_dir.resolve())
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = TimbreCatalog(timbre_dir)
+            _catalogs[key] = catalog
+        return catalog
+
+
+def find_catalog(audio_path):
+    """查找已创建的、包含该参考音频的音色目录（没有则返回None）"""
+    try:
+        key = str(Path(audio_path).parent.resolve())
+    except OSError:
+        return None
+    with _catalogs_lock:
+        return _catalogs.get(key)
+
+
+def main():
+    """命令行入口：刷新目录并预计算所有音色的说话人条件"""
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='音色目录工具')
+    parser.add_argument('--precompute', action='store_true', help='预计算所有音色的说话人条件')
+    args = parser.parse_args()
+
+    catalog = get_timbre_catalog()
+    entries = catalog.list()
+    print(f"\n音色目录: {catalog.timbre_dir}（共 {len(entries)} 个）")
+    print("-" * 60)
+    for entry in entries:
+        duration = f"{entry['duration']:.1f}秒" if entry['duration'] else "未知"
+        print(f"  {entry['filename']:<20} {duration:>8}  {entry['sample_rate']}Hz  {entry['sha256'][:12]}")
+
+    if args.precompute:
+        index_tts_dir = PROJECT_ROOT / "index-tts"
+        sys.path.insert(0, str(index_tts_dir))
+        import patch_front  # noqa: F401
+
+        print("\n预计算说话人条件...")
+        catalog.precompute_all()
+
+
+if __name__ == "__main__":
+    main()
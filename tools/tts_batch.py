@@ -0,0 +1,98 @@
+"""
+TTS批量合成
+将同一音色的子分镜按文本长度分桶组成批次，交给 TTSService.infer_batch 合成后按句返回
+（IndexTTS 1.5 下仍是逐句推理，见 TTSService.infer_batch）
+"""
+import numpy as np
+
+# 默认批次参数
+DEFAULT_MAX_BATCH_CHARS = 400
+DEFAULT_BUCKET_RATIO = 1.5
+
+
+def plan_batches(texts, max_batch_size=8, max_batch_chars=DEFAULT_MAX_BATCH_CHARS,
+                 bucket_ratio=DEFAULT_BUCKET_RATIO):
+    """
+    按长度分桶规划批次
+
+    文本先按长度排序，相邻的文本放入同一批次，满足以下条件时开启新批次：
+    - 批次句数达到 max_batch_size
+    - 批次总字数超过 max_batch_chars
+    - 最长句与最短句的长度比超过 bucket_ratio（避免短句被长句拖慢）
+
+    Args:
+        texts: TTS文本列表
+        max_batch_size: 每批最大句数
+        max_batch_chars: 每批最大总字数
+        bucket_ratio: 同一批次内最长/最短文本长度比上限
+
+    Returns:
+        list[list[int]]: 每个批次包含的原始下标
+    """
+    order = sorted(range(len(texts)), key=lambda i: (len(texts[i]), i))
+
+    batches = []
+    current = []
+    current_chars = 0
+    shortest = 0
+    for i in order:
+        length = max(len(texts[i]), 1)
+        if current and (
+            len(current) >= max_batch_size
+            or current_chars + length > max_batch_chars
+            or length > shortest * bucket_ratio
+        ):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        if not current:
+            shortest = length
+        current.append(i)
+        current_chars += length
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def synthesize_batch(service, audio_prompt, texts):
+    """
+    批量合成一组文本
+
+    批量推理失败时逐句重试，定位失败的句子而不是整批丢弃
+
+    Args:
+        service: TTSService 实例
+        audio_prompt: 音色参考音频路径
+        texts: TTS文本列表
+
+    Returns:
+        list: 与texts一一对应的 (sample_rate, wav) 或 None（合成失败）
+    """
+    try:
+        return list(service.infer_batch(audio_prompt, texts))
+    except Exception as e:
+        if len(texts) == 1:
+            print(f"      ❌ 生成失败: {e}")
+            return [None]
+        print(f"  ⚠ 批量合成失败: {e}，改为逐句合成")
+
+    results = []
+    for text in texts:
+        try:
+            results.extend(service.infer_batch(audio_prompt, [text]))
+        except Exception as e:
+            print(f"      ❌ 生成失败: {text[:20]}... {e}")
+            results.append(None)
+    return results
+
+
+def clip_duration(wav, sample_rate):
+    """根据采样点数计算精确时长（秒）"""
+    return len(wav) / sample_rate
+
+
+def write_clip(path, sample_rate, wav):
+    """将合成结果写为16bit PCM WAV"""
+    import soundfile as sf
+    sf.write(str(path), np.asarray(wav), sample_rate, subtype='PCM_16')
@@ -0,0 +1,225 @@
+"""
+TTS音频片段缓存
+按（音色文件内容, TTS文本, 模型配置）的哈希缓存合成结果，
+重复的句子直接从缓存复制，无需再次合成
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from app_config import get_setting
+
+PROJECT_ROOT = Path(__file__).parent.parent
+DEFAULT_CACHE_DIR = PROJECT_ROOT / "cache" / "tts_clips"
+
+# 默认缓存上限 2GB
+DEFAULT_MAX_MB = 2048
+
+# 缓存格式版本，格式变化时修改以使旧缓存失效
+CACHE_VERSION = "1"
+
+
+class TTSClipCache:
+    """基于内容哈希的TTS片段磁盘缓存（LRU淘汰）"""
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Args:
+            cache_dir: 缓存目录，默认读取config.json中的 tts_cache_dir，
+                       未配置时使用 <项目根目录>/cache/tts_clips
+            max_bytes: 缓存容量上限（字节），默认读取 tts_cache_max_mb
+        """
+        if cache_dir is None:
+            cache_dir = get_setting("tts_cache_dir") or DEFAULT_CACHE_DIR
+        if max_bytes is None:
+            max_bytes = int(get_setting("tts_cache_max_mb", DEFAULT_MAX_MB)) * 1024 * 1024
+
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.wav"))
+
+    @staticmethod
+    def make_key(timbre_digest, tts_text, model_digest):
+        """
+        生成缓存键
+
+        Args:
+            timbre_digest: 音色参考音频的内容哈希
+            tts_text: clean_text_for_tts 处理后的文本
+            model_digest: 模型配置的内容哈希
+        """
+        h = hashlib.sha256()
+        for part in (CACHE_VERSION, timbre_digest, model_digest, tts_text):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def _paths(self, key):
+        entry_dir = self.cache_dir / key[:2]
+        return entry_dir / f"{key}.wav", entry_dir / f"{key}.json"
+
+    def get(self, key):
+        """
+        查询缓存
+
+        Returns:
+            dict: 缓存元数据（含duration、sample_rate、path），未命中返回None
+        """
+        wav_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if not wav_path.exists():
+                raise FileNotFoundError(wav_path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新访问时间，用于LRU淘汰
+        now = time.time()
+        os.utime(meta_path, (now, now))
+
+        with self._lock:
+            self.hits += 1
+        meta["path"] = str(wav_path)
+        return meta
+
+    def fetch(self, key, output_path):
+        """
+        命中时将缓存片段复制到output_path
+
+        Returns:
+            dict: 缓存元数据，未命中返回None
+        """
+        meta = self.get(key)
+        if meta is None:
+            return None
+        shutil.copyfile(meta["path"], output_path)
+        return meta
+
+    def read(self, key):
+        """
+        命中时读取缓存片段的采样数据
+
+        Returns:
+            tuple: (元数据, int16数组)，未命中返回None
+        """
+        import soundfile as sf
+
+        meta = self.get(key)
+        if meta is None:
+            return None
+        wav, _ = sf.read(meta["path"], dtype='int16', always_2d=True)
+        return meta, wav
+
+    def put(self, key, clip_path, duration, sample_rate, **extra):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            clip_path: 已生成的音频文件
+            duration: 时长（秒）
+            sample_rate: 采样率
+            extra: 额外记录的元数据（如text、timbre）
+        """
+        self._store(key, lambda tmp_wav: shutil.copyfile(clip_path, tmp_wav),
+                    duration, sample_rate, extra)
+
+    def put_samples(self, key, sample_rate, wav, **extra):
+        """
+        直接写入内存中的合成结果（不需要先落盘为单独的WAV）
+
+        Args:
+            key: 缓存键
+            sample_rate: 采样率
+            wav: int16采样数组
+            extra: 额外记录的元数据
+        """
+        import soundfile as sf
+
+        self._store(
+            key,
+            lambda tmp_wav: sf.write(str(tmp_wav), wav, sample_rate, subtype='PCM_16', format='WAV'),
+            len(wav) / sample_rate, sample_rate, extra
+        )
+
+    def _store(self, key, write_wav, duration, sample_rate, extra):
+        wav_path, meta_path = self._paths(key)
+        wav_path.parent.mkdir(parents=True, exist_ok=True)
+        old_size = wav_path.stat().st_size if wav_path.exists() else 0
+
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_wav = wav_path.with_suffix(f".{os.getpid()}.tmp")
+        write_wav(tmp_wav)
+        os.replace(tmp_wav, wav_path)
+
+        meta = {
+            "duration": duration,
+            "sample_rate": sample_rate,
+            "created": time.time(),
+            **extra
+        }
+        tmp_meta = meta_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_meta, meta_path)
+
+        with self._lock:
+            self._total_bytes += wav_path.stat().st_size - old_size
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """按最近访问时间淘汰旧条目，直到低于容量上限的90%"""
+        with self._lock:
+            entries = []
+            total = 0
+            for meta_path in self.cache_dir.glob("*/*.json"):
+                wav_path = meta_path.with_suffix(".wav")
+                try:
+                    size = wav_path.stat().st_size
+                    last_access = meta_path.stat().st_mtime
+                except OSError:
+                    continue
+                entries.append((last_access, size, wav_path, meta_path))
+                total += size
+
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for _, size, wav_path, meta_path in sorted(entries):
+                if total <= target:
+                    break
+                for p in (meta_path, wav_path):
+                    try:
+                        p.unlink()
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+
+            self._total_bytes = total
+        if removed:
+            print(f"  TTS缓存淘汰 {removed} 个旧片段")
+        return removed
+
+    def stats(self):
+        """命中/未命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size_mb": self._total_bytes / 1024 / 1024
+        }
@@ -0,0 +1,130 @@
+"""
+TTS阶段检查点
+每个子分镜合成完成后立即追加一行记录到 Audio/tts_checkpoint.jsonl，
+TTS中途崩溃后重新运行时校验已完成的片段，从第一个缺失的子分镜继续
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+CHECKPOINT_FILENAME = "tts_checkpoint.jsonl"
+
+# 检查点格式版本，格式变化时修改以使旧检查点失效
+CHECKPOINT_VERSION = "1"
+
+# 每个已完成子分镜记录的音频字段
+CLIP_FIELDS = ("duration", "sample_rate", "sample_count", "location")
+
+
+def plan_signature(timbre_digest, model_digest, audio_store, children, settings=None):
+    """
+    计算本次合成计划的签名：音色、模型、存储方式、子分镜文本、合成单元划分或后处理参数变化时检查点失效
+
+    Args:
+        timbre_digest: 音色参考音频的内容哈希
+        model_digest: 模型配置的内容哈希
+        audio_store: 音频存储方式
+        children: 子分镜列表（含child_index、tts_text，可选unit_index）
+        settings: 其他影响输出音频的参数（dict）
+    """
+    h = hashlib.sha256()
+    settings = json.dumps(settings, sort_keys=True)
+    for part in (CHECKPOINT_VERSION, timbre_digest, model_digest, audio_store, settings):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    for child in children:
+        unit_index = child.get('unit_index', child['child_index'])
+        h.update(f"{child['child_index']}\t{unit_index}\t{child['tts_text']}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+class TTSCheckpoint:
+    """追加写入的TTS进度日志"""
+
+    def __init__(self, audio_dir, signature):
+        """
+        Args:
+            audio_dir: 项目音频目录
+            signature: plan_signature 的返回值
+        """
+        self.path = Path(audio_dir) / CHECKPOINT_FILENAME
+        self.signature = signature
+        self._file = None
+
+    def load(self):
+        """
+        读取已完成的子分镜记录
+
+        签名不一致（文本、音色或模型已变化）时忽略旧检查点；
+        末尾写了一半的行（崩溃时）直接丢弃
+
+        Returns:
+            list: 按完成顺序排列的记录
+        """
+        if not self.path.exists():
+            return []
+
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return []
+        if header.get('signature') != self.signature:
+            print("⚠ TTS检查点与当前文本/音色不一致，重新开始")
+            return []
+
+        for line in lines[1:]:
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        return records
+
+    def start(self, records):
+        """
+        以校验通过的记录重写检查点，之后的记录以追加方式写入
+
+        Args:
+            records: 保留的记录
+        """
+        tmp_file = self.path.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"signature": self.signature}) + "\n")
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_file, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, child, clip):
+        """
+        记录一个完成的子分镜（立即flush，进程崩溃后可恢复）
+
+        Args:
+            child: 子分镜（含child_index、tts_text）
+            clip: 音频信息（duration、sample_rate、sample_count、location）
+        """
+        record = {
+            "child_index": child['child_index'],
+            "tts_text": child['tts_text'],
+            **{key: clip[key] for key in CLIP_FIELDS}
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """阶段完成后删除检查点"""
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
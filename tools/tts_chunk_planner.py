@@ -0,0 +1,101 @@
+"""
+TTS合成单元规划
+逗号切分出的子分镜常常只有一两个字（如"他说，好，走吧。"），逐个合成时每次推理的固定开销最大、
+韵律也很零碎。规划器把同一父分镜内相邻的片段合并为一次合成，
+合成后按字数比例把实测时长（采样点）分配回原来的片段，字幕粒度保持不变
+"""
+
+# 默认每次合成的字数上限
+DEFAULT_MAX_CHARS = 30
+
+# 估算时长用的语速（字/秒）
+DEFAULT_CHARS_PER_SECOND = 4.5
+
+# 合并后的片段之间插入逗号，保留原来的停顿
+CHUNK_JOINER = "，"
+
+
+def chunk_budget(max_chars=DEFAULT_MAX_CHARS, max_seconds=None,
+                 chars_per_second=DEFAULT_CHARS_PER_SECOND):
+    """
+    计算每次合成的字数预算（字数上限和时长上限取较小者）
+
+    Args:
+        max_chars: 字数上限，<=0 表示不限
+        max_seconds: 时长上限（秒），按语速换算为字数，None表示不限
+        chars_per_second: 估算语速
+    """
+    budgets = []
+    if max_chars and max_chars > 0:
+        budgets.append(max_chars)
+    if max_seconds:
+        budgets.append(int(max_seconds * chars_per_second))
+    return min(budgets) if budgets else 0
+
+
+def plan_chunks(texts, groups=None, max_chars=DEFAULT_MAX_CHARS, max_seconds=None,
+                chars_per_second=DEFAULT_CHARS_PER_SECOND):
+    """
+    将相邻片段合并为合成单元
+
+    Args:
+        texts: 片段文本列表（按播放顺序）
+        groups: 每个片段所属的分组（如父分镜编号），不同分组的片段不会合并；None表示不分组
+        max_chars: 每个合成单元的字数上限，<=0 且未设置max_seconds时不合并
+        max_seconds: 每个合成单元的估算时长上限（秒）
+        chars_per_second: 估算语速
+
+    Returns:
+        list[list[int]]: 每个合成单元包含的片段下标（连续、保持原顺序）
+    """
+    budget = chunk_budget(max_chars, max_seconds, chars_per_second)
+    if budget <= 0:
+        return [[i] for i in range(len(texts))]
+
+    chunks = []
+    current = []
+    current_chars = 0
+    for i, text in enumerate(texts):
+        length = len(text)
+        if current and (
+            current_chars + length > budget
+            or (groups is not None and groups[i] != groups[current[-1]])
+        ):
+            chunks.append(current)
+            current = []
+            current_chars = 0
+        current.append(i)
+        current_chars += length
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def join_chunk(texts, joiner=CHUNK_JOINER):
+    """拼接合成单元的TTS文本"""
+    return joiner.join(texts)
+
+
+def split_samples(total, weights):
+    """
+    将采样点总数按权重分配（整数、总和精确等于total）
+
+    Args:
+        total: 合成单元的采样点数
+        weights: 各片段的权重（字数）
+
+    Returns:
+        list[int]: 各片段的采样点数
+    """
+    weights = [max(w, 1) for w in weights]
+    weight_sum = sum(weights)
+    counts = []
+    allotted = 0
+    cumulative = 0
+    for w in weights:
+        cumulative += w
+        end = total * cumulative // weight_sum
+        counts.append(end - allotted)
+        allotted = end
+    return counts
@@ -4,7 +4,6 @@ TTS音频和字幕生成模块
 import sys
 import os
 import json
-import re
 from pathlib import Path
 
 # 添加index-tts到路径
@@ -18,136 +17,64 @@ import patch_front
 import torchaudio
 torchaudio.set_audio_backend("soundfile")
 
-from indextts.infer import IndexTTS
+from app_config import get_setting
+from tts_service import get_tts_service
+from file_hashing import file_digest
+from tts_cache import TTSClipCache
+from timbre_catalog import get_timbre_catalog
+from tts_batch import plan_batches, synthesize_batch, clip_duration
+from audio_track import open_clip_store
+from tts_chunk_planner import plan_chunks, join_chunk, split_samples, DEFAULT_MAX_CHARS
+from audio_postprocess import AudioPostProcessor
+from tts_pool import TTSProcessPool
+from tts_checkpoint import TTSCheckpoint, CLIP_FIELDS, plan_signature
+from text_segmenter import clean_input_text, split_parent_scenes, split_child_scenes, clean_text_for_tts
 
 
-def clean_input_text(text):
-    """
-    清理用户输入文本（保留基本结构）
-    
-    移除：
-    - 换行符 \\n
-    - 特殊符号（除了逗号、句号、问号、感叹号）
-    - 多余空格
-    
-    保留：
-    - 逗号、句号、问号、感叹号（用于分割）
-    
-    Args:
-        text: 原始文本
+def _synthesize_sequential(tts, timbre_path, pending, on_clips):
+    """逐句合成子分镜音频（结果保留在内存中，交给音频存储写入）"""
+    for child in pending:
+        print(f"\n  [{child['child_index']}] 子分镜: {child['text']}")
+        print(f"      TTS文本: {child['tts_text']}")
         
-    Returns:
-        str: 清理后的文本
-    """
-    # 1. 移除所有换行符（包括转义的和实际的）
-    cleaned = text.replace('\\n', '').replace('\n', '')
-    
-    # 2. 移除Markdown格式符号
-    cleaned = cleaned.replace('>', '').replace('#', '').replace('-', '')
-    cleaned = cleaned.replace('*', '').replace('_', '').replace('`', '')
-    
-    # 3. 只保留中文、英文、数字、逗号、句号、问号、感叹号
-    # 移除其他所有中文标点符号
-    cleaned = re.sub(r'[：；、""''「」『』【】《》—…·（）\(\)]+', '', cleaned)
-    
-    # 4. 移除多余空格
-    cleaned = re.sub(r'\s+', '', cleaned)
-    
-    return cleaned
-
-
-def split_parent_scenes(text):
-    """
-    按句号分割父分镜（用于生成图片）
-    
-    Returns:
-        list: 父分镜列表
-    """
-    # 按句号分割
-    sentences = re.split(r'([。！？\.!?])', text)
-    
-    # 重新组合句子和标点
-    result = []
-    for i in range(0, len(sentences)-1, 2):
-        sentence = sentences[i].strip()
-        punct = sentences[i+1] if i+1 < len(sentences) else ''
-        if sentence:
-            result.append(sentence + punct)
-    
-    # 处理最后一个可能没有标点的句子
-    if len(sentences) % 2 == 1 and sentences[-1].strip():
-        result.append(sentences[-1].strip())
-    
-    # 过滤无效句子
-    def is_valid_sentence(s):
-        """判断是否为有效句子"""
-        if not s or len(s) <= 1:
-            return False
-        cleaned = s.strip('"\'""''「」『』【】《》 \t')
-        if not cleaned or len(cleaned) <= 1:
-            return False
-        if all(c in '，。！？,.:;!?、""''"\'「」『』【】《》—…·' for c in cleaned):
-            return False
-        return True
-    
-    result = [s for s in result if is_valid_sentence(s)]
-    return result
+        try:
+            result = tts.infer(
+                audio_prompt=str(timbre_path),
+                text=child['tts_text'],  # 使用清理后的文本
+                output_path=None
+            )
+            on_clips([child], [result])
+            
+        except Exception as e:
+            print(f"      ❌ 生成失败: {e}")
 
 
-def split_child_scenes(parent_text):
-    """
-    按逗号分割子分镜（用于生成TTS和字幕）
-    
-    Args:
-        parent_text: 父分镜文本
+def _synthesize_batched(tts, timbre_path, pending, batch_size, on_clips):
+    """按长度分桶分批合成子分镜音频（IndexTTS 1.5 下每批在一次加锁内逐句推理）"""
+    batches = plan_batches([c['tts_text'] for c in pending], max_batch_size=batch_size)
+    print(f"\n批量合成: {len(pending)} 句，分为 {len(batches)} 个批次（每批最多{batch_size}句）")
+    
+    for batch_num, batch in enumerate(batches, 1):
+        items = [pending[i] for i in batch]
+        print(f"\n  批次 {batch_num}/{len(batches)}: {len(items)} 句")
         
-    Returns:
-        list: 子分镜列表
-    """
-    # 按逗号分割
-    parts = re.split(r'([，,])', parent_text)
-    
-    # 重新组合
-    result = []
-    for i in range(0, len(parts)-1, 2):
-        part = parts[i].strip()
-        punct = parts[i+1] if i+1 < len(parts) else ''
-        if part:
-            result.append(part + punct)
-    
-    # 处理最后一个没有逗号的部分
-    if len(parts) % 2 == 1 and parts[-1].strip():
-        result.append(parts[-1].strip())
-    
-    # 如果没有逗号，返回整个文本
-    if len(result) == 0:
-        result = [parent_text]
-    
-    return result
+        results = synthesize_batch(tts, timbre_path, [c['tts_text'] for c in items])
+        on_clips(items, results)
 
 
-def clean_text_for_tts(text):
-    """
-    清理文本用于TTS（移除所有特殊符号和Markdown格式）
-    
-    Args:
-        text: 原始文本
-        
-    Returns:
-        str: 清理后的文本
-    """
-    # 先移除Markdown格式符号
-    cleaned = text.replace('\\n', '').replace('\n', '')  # 移除换行符（转义和实际）
-    cleaned = cleaned.replace('>', '').replace('#', '').replace('-', '')  # 移除Markdown符号
-    cleaned = cleaned.replace('*', '').replace('_', '').replace('`', '')  # 移除其他Markdown符号
-    
-    # 移除所有标点符号和特殊字符
-    cleaned = re.sub(r'[，。！？、；：,.:;!?""''"\'「」『』【】《》—…·\s]+', '', cleaned)
-    
-    return cleaned
+def _synthesize_parallel(pool, timbre_path, pending, on_clips):
+    """多进程并行合成子分镜音频（结果按原始顺序、按分片交回）"""
+    print(f"\n并行合成: {len(pending)} 句，{pool.workers} 个工作进程")
+    
+    results = pool.synthesize(timbre_path, [c['tts_text'] for c in pending])
+    for start in range(0, len(pending), pool.shard_size):
+        items = pending[start:start + pool.shard_size]
+        on_clips(items, [next(results) for _ in items])
 
 
-def generate_audio_and_subtitles(text, project_name, timbre_name=None):
+def generate_audio_and_subtitles(text, project_name, timbre_name=None, use_cache=True,
+                                 batch_size=None, audio_store=None, workers=None,
+                                 chunk_max_chars=None, postprocess=None):
     """
     生成音频和字幕文件（父子分镜结构）
     
@@ -158,10 +85,33 @@ def generate_audio_and_subtitles(text, project_name, timbre_name=None):
         text: 小说文本
         project_name: 项目名称
         timbre_name: 音色名称（可选）
+        use_cache: 是否使用TTS片段缓存（相同音色+文本直接复用）
+        batch_size: 批量合成的每批句数，<=1 为逐句合成
+                    默认读取config.json中的 tts_batch_size
+        audio_store: 音频存储方式，"track" 写入单一音轨 Audio/track.wav，
+                     "files" 每个子分镜一个WAV；默认读取 tts_audio_store
+        workers: 并行合成的工作进程数（每个进程加载一份模型），<=1 为单进程
+                 默认读取config.json中的 tts_workers
+        chunk_max_chars: 合并相邻短片段后每次合成的字数上限，<=0 为每个子分镜单独合成
+                         默认读取config.json中的 tts_chunk_max_chars
+        postprocess: 音频后处理参数（裁剪首尾静音、限制停顿、响度归一化），
+                     dict 同 AudioPostProcessor 的参数，False 关闭；默认读取 tts_postprocess
     
     Returns:
         bool: 是否成功
     """
+    if batch_size is None:
+        batch_size = int(get_setting("tts_batch_size", 1))
+    if audio_store is None:
+        audio_store = get_setting("tts_audio_store", "track")
+    if workers is None:
+        workers = int(get_setting("tts_workers", 1))
+    if chunk_max_chars is None:
+        chunk_max_chars = int(get_setting("tts_chunk_max_chars", DEFAULT_MAX_CHARS))
+    if postprocess is None:
+        postprocess = get_setting("tts_postprocess", True)
+    postprocessor = AudioPostProcessor.from_config(postprocess)
+    
     # 创建项目目录
     project_dir = PROJECT_ROOT / "projects" / project_name
     audio_dir = project_dir / "Audio"
@@ -176,88 +126,220 @@ def generate_audio_and_subtitles(text, project_name, timbre_name=None):
     parent_scenes = split_parent_scenes(text)
     print(f"分割成 {len(parent_scenes)} 个父分镜（图片）")
     
-    # 加载TTS模型
-    print("加载TTS模型...")
-    models_dir = PROJECT_ROOT / "models"
-    tts = IndexTTS(
-        model_dir=str(models_dir),
-        cfg_path=str(models_dir / "config.yaml")
-    )
-    print("✓ TTS模型加载成功")
+    # 获取常驻TTS服务（模型在多个任务间共享，首次合成时加载）
+    tts = get_tts_service(PROJECT_ROOT / "models")
+    stats_snapshot = tts.get_stats()
     
-    # 选择音色
-    timbre_dir = PROJECT_ROOT / "Timbre"
+    # 选择音色（音色目录中已记录文件哈希，说话人条件预先计算并缓存）
+    catalog = get_timbre_catalog(PROJECT_ROOT / "Timbre")
     if timbre_name:
-        timbre_path = timbre_dir / timbre_name
+        timbre_entry = catalog.get(timbre_name)
+        if not timbre_entry:
+            print(f"❌ 找不到音色文件: {timbre_name}")
+            return False
     else:
         # 使用第一个WAV文件
-        wav_files = list(timbre_dir.glob("*.wav")) + list(timbre_dir.glob("*.WAV"))
-        if not wav_files:
+        timbre_entry = catalog.default()
+        if not timbre_entry:
             print("❌ 没有找到音色文件")
             return False
-        timbre_path = wav_files[0]
+    timbre_path = Path(timbre_entry['path'])
     
     print(f"使用音色: {timbre_path.name}")
     
-    # 生成音频和字幕（父子分镜结构）
-    parent_subtitles = []
-    child_index = 0  # 子分镜全局索引
-    current_time = 0.0
+    # TTS片段缓存（按音色内容、文本、模型配置寻址）
+    timbre_digest = timbre_entry['sha256']
+    model_digest = file_digest(tts.cfg_path)
+    clip_cache = TTSClipCache() if use_cache else None
     
+    # 规划子分镜（按逗号分割），子分镜全局编号
+    children = []
+    child_index = 0
     for parent_idx, parent_text in enumerate(parent_scenes, 1):
-        print(f"\n{'='*60}")
-        print(f"父分镜 {parent_idx}/{len(parent_scenes)}: {parent_text[:50]}...")
-        print(f"{'='*60}")
+        for child_text in split_child_scenes(parent_text):
+            child_index += 1
+            children.append({
+                "parent_index": parent_idx,
+                "child_index": child_index,
+                "text": child_text,  # 保留原始文本（带标点）用于显示
+                "tts_text": clean_text_for_tts(child_text)  # 清理后的文本用于TTS
+            })
+    print(f"分割成 {len(children)} 个子分镜（字幕）")
+    
+    # 规划合成单元：同一父分镜内相邻的短片段合并为一次合成
+    units = []
+    for unit_index, members in enumerate(plan_chunks(
+        [c['tts_text'] for c in children],
+        groups=[c['parent_index'] for c in children],
+        max_chars=chunk_max_chars
+    ), 1):
+        unit_children = [children[i] for i in members]
+        for child in unit_children:
+            child['unit_index'] = unit_index
+        units.append({
+            "child_index": unit_children[0]['child_index'],
+            "text": "".join(c['text'] for c in unit_children),
+            "tts_text": join_chunk([c['tts_text'] for c in unit_children]),
+            "children": unit_children
+        })
+    if len(units) < len(children):
+        print(f"合并短片段: {len(children)} 个子分镜 -> {len(units)} 次合成")
+    
+    # 子分镜音频统一写入音频存储（默认为单一音轨）
+    store = open_clip_store(audio_store, audio_dir, project_name)
+    clips = {}  # child_index -> {duration, sample_rate, sample_count, location}
+    
+    # 检查点：上次运行中断时，校验已完成的片段并从第一个缺失的合成单元继续
+    checkpoint = TTSCheckpoint(
+        audio_dir, plan_signature(
+            timbre_digest, model_digest, audio_store, children,
+            settings=postprocessor.settings() if postprocessor else None
+        )
+    )
+    records = checkpoint.load()
+    # 只写入了一部分子分镜的合成单元需要整体重新合成
+    recorded = {r['child_index'] for r in records}
+    incomplete = {c['unit_index'] for c in children if c['child_index'] not in recorded}
+    unit_of = {c['child_index']: c['unit_index'] for c in children}
+    resumed = store.resume([r for r in records if unit_of[r['child_index']] not in incomplete])
+    checkpoint.start(resumed)
+    for record in resumed:
+        clips[record['child_index']] = {key: record[key] for key in CLIP_FIELDS}
+    if resumed:
+        print(f"✓ 从检查点恢复 {len(resumed)} 个已完成的子分镜")
+    
+    def save_clip(child, clip):
+        clips[child['child_index']] = clip
+        checkpoint.record(child, clip)
+    
+    def add_unit(unit, sample_rate, wav):
+        """按字数比例把合成单元的采样点分配回各子分镜"""
+        counts = split_samples(len(wav), [len(c['tts_text']) for c in unit['children']])
+        offset = 0
+        for child, count in zip(unit['children'], counts):
+            piece = wav[offset:offset + count]
+            offset += count
+            save_clip(child, {
+                "duration": clip_duration(piece, sample_rate),
+                "sample_rate": sample_rate,
+                "sample_count": count,
+                "location": store.add(child, sample_rate, piece)
+            })
+    
+    def share_unit(unit, source):
+        """重复文本直接引用同一段音频"""
+        for child, source_child in zip(unit['children'], source['children']):
+            save_clip(child, clips[source_child['child_index']])
+    
+    # 生成音频：相同文本只合成一次，其余先查缓存
+    pending = []
+    sources = {}  # tts_text -> 第一次出现该文本的合成单元
+    cache_hits = []  # (合成单元, 缓存中的原始音频)
+    for unit in units:
+        if all(c['child_index'] in clips for c in unit['children']):
+            sources.setdefault(unit['tts_text'], unit)
+            continue
         
-        # 分割子分镜（按逗号）
-        child_scenes = split_child_scenes(parent_text)
-        print(f"  包含 {len(child_scenes)} 个子分镜")
+        source = sources.get(unit['tts_text'])
+        if source is not None:
+            if all(c['child_index'] in clips for c in source['children']):
+                share_unit(unit, source)
+            else:
+                source['duplicates'].append(unit)
+            continue
+        sources[unit['tts_text']] = unit
+        unit['duplicates'] = []
         
+        if clip_cache:
+            unit['cache_key'] = clip_cache.make_key(timbre_digest, unit['tts_text'], model_digest)
+            cached = clip_cache.read(unit['cache_key'])
+            if cached:
+                meta, wav = cached
+                unit['cached'] = True
+                cache_hits.append((unit, (meta['sample_rate'], wav)))
+                continue
+        pending.append(unit)
+    
+    def on_clips(group, results):
+        """
+        一组合成完成：一次性后处理，再写入音频存储和检查点、写入缓存、复用到重复文本
+        （缓存保存后处理之前的原始音频）
+        """
+        done = [(unit, result) for unit, result in zip(group, results) if result is not None]
+        if not done:
+            return
+        sample_rate = done[0][1][0]
+        wavs = [wav for _, (_, wav) in done]
+        if postprocessor:
+            wavs = postprocessor.process(wavs, sample_rate)
+        
+        for (unit, (_, raw)), wav in zip(done, wavs):
+            add_unit(unit, sample_rate, wav)
+            if not unit.get('cached'):
+                print(f"      ✓ [{unit['child_index']}] 生成完成，时长: {clip_duration(wav, sample_rate):.2f}秒")
+                if clip_cache:
+                    clip_cache.put_samples(
+                        unit['cache_key'], sample_rate, raw,
+                        text=unit['tts_text'], timbre=timbre_path.name
+                    )
+            for dup in unit['duplicates']:
+                share_unit(dup, unit)
+    
+    if cache_hits:
+        on_clips(*zip(*cache_hits))
+        print(f"✓ {len(cache_hits)} 个合成单元命中缓存")
+    
+    pool = None
+    try:
+        if pending:
+            if workers > 1:
+                pool = TTSProcessPool(
+                    workers, tts.model_dir, tts.cfg_path, catalog.timbre_dir,
+                    shard_size=max(batch_size, 1)
+                )
+                _synthesize_parallel(pool, timbre_path, pending, on_clips)
+            elif batch_size > 1:
+                _synthesize_batched(tts, timbre_path, pending, batch_size, on_clips)
+            else:
+                _synthesize_sequential(tts, timbre_path, pending, on_clips)
+    finally:
+        if pool:
+            pool.shutdown()
+        track_info = store.close()
+        checkpoint.close()
+    
+    # 组装时间轴（按原始顺序）
+    parent_subtitles = []
+    current_time = 0.0
+    children_by_parent = {}
+    for child in children:
+        children_by_parent.setdefault(child['parent_index'], []).append(child)
+    
+    for parent_idx, parent_text in enumerate(parent_scenes, 1):
         child_subtitles = []
         parent_start_time = current_time
         
-        for child_text in child_scenes:
-            child_index += 1
-            print(f"\n  [{child_index}] 子分镜: {child_text}")
-            
-            # 清理文本用于TTS（移除所有标点符号）
-            tts_text = clean_text_for_tts(child_text)
-            print(f"      TTS文本: {tts_text}")
+        for child in children_by_parent.get(parent_idx, []):
+            clip = clips.get(child['child_index'])
+            if clip is None:
+                # 合成失败的子分镜不进入时间轴
+                continue
+            duration = clip['duration']
+            location = clip['location']
             
-            # 生成音频
-            output_file = audio_dir / f"{project_name}_{child_index:04d}.wav"
+            # 子分镜字幕（filename/sample_offset/sample_count 定位音频）
+            child_subtitle = {
+                "child_index": child['child_index'],
+                "text": child['text'],
+                "tts_text": child['tts_text'],
+                **location,
+                "start_time": current_time,
+                "end_time": current_time + duration,
+                "duration": duration
+            }
+            child_subtitles.append(child_subtitle)
             
-            try:
-                tts.infer(
-                    audio_prompt=str(timbre_path),
-                    text=tts_text,  # 使用清理后的文本
-                    output_path=str(output_file)
-                )
-                
-                # 获取音频时长
-                import soundfile as sf
-                audio_data, sample_rate = sf.read(str(output_file))
-                duration = len(audio_data) / sample_rate
-                
-                # 子分镜字幕
-                child_subtitle = {
-                    "child_index": child_index,
-                    "text": child_text,  # 保留原始文本（带标点）用于显示
-                    "tts_text": tts_text,  # 清理后的文本
-                    "filename": output_file.name,
-                    "start_time": current_time,
-                    "end_time": current_time + duration,
-                    "duration": duration
-                }
-                child_subtitles.append(child_subtitle)
-                
-                current_time += duration
-                
-                print(f"      ✓ 生成完成，时长: {duration:.2f}秒")
-                
-            except Exception as e:
-                print(f"      ❌ 生成失败: {e}")
-                continue
+            current_time += duration
         
         # 父分镜信息
         parent_duration = current_time - parent_start_time
@@ -270,8 +352,6 @@ def generate_audio_and_subtitles(text, project_name, timbre_name=None):
             "children": child_subtitles
         }
         parent_subtitles.append(parent_subtitle)
-        
-        print(f"\n  父分镜 {parent_idx} 完成，总时长: {parent_duration:.2f}秒")
     
     # 保存字幕文件（父子分镜结构）
     subtitle_file = audio_dir / "Subtitles.json"
@@ -285,22 +365,32 @@ def generate_audio_and_subtitles(text, project_name, timbre_name=None):
         "total_child_scenes": total_children,
         "parent_scenes": parent_subtitles
     }
+    if track_info:
+        subtitle_data["audio_track"] = track_info
     
-    with open(subtitle_file, 'w', encoding='utf-8') as f:
+    # 先写临时文件再替换，字幕文件存在即代表本阶段完整完成
+    tmp_file = subtitle_file.with_suffix(".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
         json.dump(subtitle_data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, subtitle_file)
+    checkpoint.remove()
     
     print(f"\n✓ 字幕文件已保存: {subtitle_file}")
     print(f"  父分镜（图片）: {len(parent_subtitles)} 个")
     print(f"  子分镜（字幕）: {total_children} 个")
+    if total_children < len(children):
+        print(f"  ⚠ {len(children) - total_children} 个子分镜生成失败")
     print(f"  总时长: {current_time:.2f}秒")
     
-    # 卸载模型释放显存
-    print("\n释放显存...")
-    del tts
-    import torch
-    import gc
-    torch.cuda.empty_cache()
-    gc.collect()
+    # 模型保持常驻，由TTS服务在空闲超时后卸载
+    if pool:
+        pool.print_timing()
+    else:
+        tts.print_timing(tts.stats_since(stats_snapshot))
+    if clip_cache:
+        cache_stats = clip_cache.stats()
+        print(f"  TTS缓存: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次"
+              f"（命中率 {cache_stats['hit_rate']:.0%}）")
     
     return True
 
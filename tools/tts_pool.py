@@ -0,0 +1,130 @@
+"""
+多进程并行TTS
+CPU节点上将子分镜分片交给多个工作进程，每个进程持有独立的IndexTTS实例；
+结果按提交顺序返回，时间轴与逐句合成完全一致
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 工作进程内的TTS服务
+_worker_service = None
+
+
+def _init_worker(model_dir, cfg_path, timbre_dir, loader, threads):
+    """工作进程初始化：限制线程数，创建常驻TTS服务并注册音色目录"""
+    global _worker_service
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from tts_service import TTSService
+    from timbre_catalog import get_timbre_catalog
+
+    _worker_service = TTSService(model_dir, cfg_path, idle_timeout=0, loader=loader)
+    if timbre_dir:
+        # 注册音色目录，使用预计算的说话人条件
+        get_timbre_catalog(timbre_dir)
+
+
+def _synthesize_shard(audio_prompt, texts):
+    """
+    在工作进程中合成一个分片
+
+    Returns:
+        tuple: (每句的 (sample_rate, wav) 或 None, 进程统计增量)
+    """
+    from tts_batch import synthesize_batch
+
+    snapshot = _worker_service.get_stats()
+    results = synthesize_batch(_worker_service, audio_prompt, texts)
+    return results, _worker_service.stats_since(snapshot)
+
+
+class TTSProcessPool:
+    """并行TTS进程池（每个进程一个模型实例）"""
+
+    def __init__(self, workers, model_dir=None, cfg_path=None, timbre_dir=None,
+                 shard_size=4, loader=None):
+        """
+        Args:
+            workers: 工作进程数
+            model_dir: 模型文件夹路径
+            cfg_path: 配置文件路径
+            timbre_dir: 音色文件夹（工作进程内注册音色目录）
+            shard_size: 每个分片的句数
+            loader: 自定义模型加载函数（需可pickle的模块级函数，测试和基准时传入桩模型）
+        """
+        self.workers = workers
+        self.shard_size = max(1, shard_size)
+        threads = max(1, (os.cpu_count() or workers) // workers)
+
+        # CUDA/torch 在fork后不可用，统一使用spawn
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(
+                str(model_dir) if model_dir else None,
+                str(cfg_path) if cfg_path else None,
+                str(timbre_dir) if timbre_dir else None,
+                loader,
+                threads
+            )
+        )
+        self._stats = {
+            "workers": workers,
+            "shards": 0,
+            "loads": 0,
+            "load_time": 0.0,
+            "infer_calls": 0,
+            "synth_time": 0.0,
+            "wall_time": 0.0
+        }
+
+    def synthesize(self, audio_prompt, texts):
+        """
+        并行合成，按texts的顺序逐句产出结果
+
+        Yields:
+            (sample_rate, wav) 或 None（合成失败）
+        """
+        texts = list(texts)
+        shards = [texts[i:i + self.shard_size] for i in range(0, len(texts), self.shard_size)]
+        start = time.perf_counter()
+        try:
+            # map 按提交顺序返回，后完成的分片在父进程中等待前面的分片
+            for results, delta in self._executor.map(
+                _synthesize_shard, [str(audio_prompt)] * len(shards), shards
+            ):
+                self._stats["shards"] += 1
+                for key in ("loads", "load_time", "infer_calls", "synth_time"):
+                    self._stats[key] += delta[key]
+                yield from results
+        finally:
+            self._stats["wall_time"] += time.perf_counter() - start
+
+    def get_stats(self):
+        return dict(self._stats)
+
+    def print_timing(self):
+        """打印并行合成耗时"""
+        stats = self._stats
+        print(f"  TTS并行进程: {stats['workers']} 个，{stats['shards']} 个分片")
+        print(f"  TTS模型加载: {stats['loads']} 次，{stats['load_time']:.1f}秒（各进程累计）")
+        print(f"  TTS合成: {stats['infer_calls']} 句，{stats['synth_time']:.1f}秒（各进程累计），"
+              f"实际耗时 {stats['wall_time']:.1f}秒")
+
+    def shutdown(self):
+        """关闭工作进程并释放各进程中的模型"""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,301 @@
+"""
+常驻TTS模型服务
+多个任务共享同一个IndexTTS实例，模型常驻内存，空闲超时后自动卸载
+"""
+import gc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from app_config import get_setting
+from gpu_residents import register_resident, release_idle_residents
+from timbre_catalog import find_catalog
+
+PROJECT_ROOT = Path(__file__).parent.parent
+INDEX_TTS_DIR = PROJECT_ROOT / "index-tts"
+DEFAULT_MODEL_DIR = PROJECT_ROOT / "models"
+
+# 默认空闲10分钟后卸载模型
+DEFAULT_IDLE_TIMEOUT = 600
+
+
+class TTSService:
+    """常驻IndexTTS模型服务"""
+
+    def __init__(self, model_dir=None, cfg_path=None, idle_timeout=None, loader=None):
+        """
+        初始化TTS服务（不会立即加载模型）
+
+        Args:
+            model_dir: 模型文件夹路径，默认为 ../models
+            cfg_path: 配置文件路径，默认为 ../models/config.yaml
+            idle_timeout: 空闲多少秒后卸载模型，<=0 表示常驻不卸载
+                          默认读取config.json中的 tts_idle_timeout
+            loader: 自定义模型加载函数 loader(model_dir, cfg_path)，
+                    默认加载IndexTTS（测试和基准时可传入桩模型）
+        """
+        self.model_dir = Path(model_dir) if model_dir else DEFAULT_MODEL_DIR
+        self.cfg_path = Path(cfg_path) if cfg_path else self.model_dir / "config.yaml"
+        if idle_timeout is None:
+            idle_timeout = get_setting("tts_idle_timeout", DEFAULT_IDLE_TIMEOUT)
+        self.idle_timeout = idle_timeout
+        self._loader = loader or _load_index_tts
+
+        self._tts = None
+        self._lock = threading.RLock()
+        self._infer_lock = threading.Lock()  # IndexTTS实例不是线程安全的
+        self._active = 0
+        self._last_used = 0.0
+        self._timer = None
+
+        self._stats = {
+            "loads": 0,
+            "unloads": 0,
+            "load_time": 0.0,
+            "infer_calls": 0,
+            "batch_calls": 0,
+            "synth_time": 0.0
+        }
+
+    @property
+    def is_loaded(self):
+        return self._tts is not None
+
+    def _load(self):
+        """加载模型（调用方需持有self._lock）"""
+        # 先释放其他常驻模型（显存紧张时卸载空闲的SDXL管线）
+        release_idle_residents(exclude="tts")
+        print("加载TTS模型...")
+        start = time.perf_counter()
+        self._tts = self._loader(self.model_dir, self.cfg_path)
+        elapsed = time.perf_counter() - start
+
+        self._stats["loads"] += 1
+        self._stats["load_time"] += elapsed
+        print(f"✓ TTS模型加载成功，耗时 {elapsed:.1f}秒")
+
+    def unload(self):
+        """卸载模型并释放显存"""
+        with self._lock:
+            self._cancel_timer()
+            if self._tts is None:
+                return
+            if self._active > 0:
+                # 仍有任务在使用，推迟卸载
+                self._schedule_eviction()
+                return
+
+            print("\n释放TTS显存...")
+            self._tts = None
+            self._stats["unloads"] += 1
+
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def release(self):
+        """
+        空闲时立即卸载模型（加载其他GPU模型前调用，不等空闲超时）
+
+        Returns:
+            bool: 是否卸载了模型
+        """
+        with self._lock:
+            if self._tts is None or self._active > 0:
+                return False
+            self.unload()
+            return True
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_eviction(self):
+        """空闲超时后自动卸载（调用方需持有self._lock）"""
+        self._cancel_timer()
+        if not self.idle_timeout or self.idle_timeout <= 0:
+            return
+        self._timer = threading.Timer(self.idle_timeout, self._evict_if_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _evict_if_idle(self):
+        with self._lock:
+            idle = time.time() - self._last_used
+            if self._active == 0 and idle >= self.idle_timeout:
+                print(f"TTS模型已空闲 {idle:.0f}秒，自动卸载")
+                self.unload()
+
+    @contextmanager
+    def acquire(self):
+        """
+        获取常驻的IndexTTS实例（首次使用时加载）
+
+        用法：
+            with service.acquire() as tts:
+                tts.infer(...)
+        """
+        with self._lock:
+            self._cancel_timer()
+            if self._tts is None:
+                self._load()
+            self._active += 1
+            tts = self._tts
+        try:
+            yield tts
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_used = time.time()
+                if self._active == 0:
+                    self._schedule_eviction()
+
+    @staticmethod
+    def _prime_conditioning(tts, audio_prompt):
+        """使用音色目录中预计算的说话人条件，跳过参考音频解码"""
+        catalog = find_catalog(audio_prompt)
+        if catalog is None:
+            return
+        try:
+            catalog.prime(tts, audio_prompt)
+        except Exception as e:
+            print(f"  ⚠ 音色条件缓存不可用，回退到解码参考音频: {e}")
+
+    def infer(self, audio_prompt, text, output_path=None, **kwargs):
+        """
+        合成单句语音，参数与 IndexTTS.infer 相同
+
+        Returns:
+            IndexTTS.infer 的返回值
+        """
+        with self.acquire() as tts:
+            with self._infer_lock:
+                self._prime_conditioning(tts, audio_prompt)
+                start = time.perf_counter()
+                try:
+                    return tts.infer(
+                        audio_prompt=str(audio_prompt),
+                        text=text,
+                        output_path=str(output_path) if output_path else None,
+                        **kwargs
+                    )
+                finally:
+                    self._stats["infer_calls"] += 1
+                    self._stats["synth_time"] += time.perf_counter() - start
+
+    def infer_batch(self, audio_prompt, texts, **kwargs):
+        """
+        合成同一音色的多句文本，结果保留在内存中（不写WAV）
+
+        IndexTTS 1.5 没有多句批量推理入口，此时在一次加锁内逐句调用 infer(output_path=None)，
+        推理次数与逐句合成相同，只省去每句的加锁和音色条件准备（见 benchmarks/bench_tts_batch.py）；
+        模型提供 infer_batch 时才是真正的批量推理
+
+        Returns:
+            list: 每句对应的 (sample_rate, wav) ，wav为int16数组
+        """
+        texts = list(texts)
+        with self.acquire() as tts:
+            with self._infer_lock:
+                self._prime_conditioning(tts, audio_prompt)
+                start = time.perf_counter()
+                try:
+                    if hasattr(tts, "infer_batch"):
+                        return list(tts.infer_batch(
+                            audio_prompt=str(audio_prompt),
+                            texts=texts,
+                            **kwargs
+                        ))
+                    return [
+                        tts.infer(
+                            audio_prompt=str(audio_prompt),
+                            text=text,
+                            output_path=None,
+                            **kwargs
+                        )
+                        for text in texts
+                    ]
+                finally:
+                    self._stats["infer_calls"] += len(texts)
+                    self._stats["batch_calls"] += 1
+                    self._stats["synth_time"] += time.perf_counter() - start
+
+    def get_stats(self):
+        """获取累计统计信息"""
+        stats = dict(self._stats)
+        stats["loaded"] = self.is_loaded
+        return stats
+
+    def stats_since(self, snapshot):
+        """计算从snapshot（get_stats的返回值）到现在的增量"""
+        current = self.get_stats()
+        return {
+            key: current[key] - snapshot.get(key, 0)
+            for key in ("loads", "unloads", "load_time", "infer_calls", "batch_calls", "synth_time")
+        }
+
+    @staticmethod
+    def print_timing(delta):
+        """打印模型加载耗时与合成耗时"""
+        print(f"  TTS模型加载: {delta['loads']} 次，{delta['load_time']:.1f}秒")
+        print(f"  TTS合成: {delta['infer_calls']} 句，{delta['synth_time']:.1f}秒")
+        if delta.get('batch_calls'):
+            print(f"  TTS批量调用: {delta['batch_calls']} 次")
+
+
+def _load_index_tts(model_dir, cfg_path):
+    """默认加载函数：加载IndexTTS模型"""
+    if str(INDEX_TTS_DIR) not in sys.path:
+        sys.path.insert(0, str(INDEX_TTS_DIR))
+
+    # 应用wetext补丁后再导入indextts
+    import patch_front  # noqa: F401
+    from indextts.infer import IndexTTS
+
+    return IndexTTS(model_dir=str(model_dir), cfg_path=str(cfg_path))
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_tts_service(model_dir=None, cfg_path=None):
+    """
+    获取进程内共享的TTS服务（同一模型路径只创建一个实例）
+
+    Args:
+        model_dir: 模型文件夹路径
+        cfg_path: 配置文件路径
+    """
+    model_dir = Path(model_dir) if model_dir else DEFAULT_MODEL_DIR
+    cfg_path = Path(cfg_path) if cfg_path else model_dir / "config.yaml"
+    key = (str(model_dir.resolve()), str(cfg_path.resolve()))
+
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = TTSService(model_dir, cfg_path)
+            _services[key] = service
+        return service
+
+
+def release_idle_services():
+    """
+    卸载所有空闲的TTS模型（加载SDXL前调用，不会创建新服务）
+
+    Returns:
+        int: 卸载的模型数
+    """
+    with _services_lock:
+        services = list(_services.values())
+    return sum(1 for service in services if service.release())
+
+
+register_resident("tts", release_idle_services)
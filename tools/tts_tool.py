@@ -25,7 +25,8 @@ class SimpleNormalizer:
 wetext_module.Normalizer = SimpleNormalizer
 sys.modules['wetext'] = wetext_module
 
-from indextts.infer import IndexTTS
+from tts_service import get_tts_service
+from timbre_catalog import get_timbre_catalog
 
 # 配置日志
 logging.basicConfig(
@@ -81,30 +82,18 @@ class ShortDramaTTS:
             logger.info(f"GPU: {torch.cuda.get_device_name(0)}")
             logger.info(f"显存: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB")
         
-        # 初始化模型
-        logger.info("正在加载IndexTTS 1.5模型...")
-        self.tts = IndexTTS(
-            model_dir=str(self.model_dir),
-            cfg_path=str(self.config_path)
-        )
-        logger.info("模型加载完成！")
+        # 使用进程内共享的常驻TTS服务（首次合成时加载模型）
+        self.tts = get_tts_service(self.model_dir, self.config_path)
         
         # 获取可用的音色列表
         self.available_timbres = self._scan_timbres()
         logger.info(f"找到 {len(self.available_timbres)} 个可用音色")
     
     def _scan_timbres(self) -> Dict[str, str]:
-        """扫描音色文件夹，返回音色名称到文件路径的映射"""
-        timbres = {}
-        audio_extensions = {'.wav', '.mp3', '.flac', '.WAV', '.MP3', '.FLAC'}
-        
-        for file_path in self.timbre_dir.iterdir():
-            if file_path.suffix in audio_extensions:
-                # 使用文件名（不含扩展名）作为音色名称
-                timbre_name = file_path.stem
-                timbres[timbre_name] = str(file_path)
-        
-        return timbres
+        """从音色目录读取音色，返回音色名称到文件路径的映射"""
+        catalog = get_timbre_catalog(self.timbre_dir)
+        # 使用文件名（不含扩展名）作为音色名称
+        return {entry['name']: entry['path'] for entry in catalog.list()}
     
     def list_timbres(self) -> List[str]:
         """列出所有可用的音色名称"""
@@ -63,6 +63,11 @@ def compose_video(project_dir, subtitle_file, imgs_dir, audio_dir, output_dir):
     with open(subtitle_file, 'r', encoding='utf-8') as f:
         subtitles_data = json.load(f)
     
+    if 'audio_track' in subtitles_data:
+        # 单一音轨格式（tts_audio_store 为 "track"）没有逐句的音频文件
+        raise ValueError("字幕文件使用单一音轨格式，请使用 video_composer_enhanced 合成，"
+                         "或在config.json中把 tts_audio_store 设为 \"files\" 后重新生成音频")
+    
     subtitles = subtitles_data['subtitles']
     total_duration = subtitles_data['total_duration']
     
@@ -7,6 +7,8 @@ import subprocess
 import random
 from pathlib import Path
 
+from audio_track import AudioTrackReader
+
 
 # Ken Burns运镜效果配置（扩展版）
 CAMERA_EFFECTS = [
@@ -109,7 +111,8 @@ def split_subtitle_lines(text, max_chars_per_line=22):
     return lines
 
 
-def create_video_with_effects(img_path, audio_path, output_path, duration, subtitle_text, effect):
+def create_video_with_effects(img_path, audio_path, output_path, duration, subtitle_text, effect,
+                              audio_clip=None):
     """
     为单个片段创建带运镜和字幕的视频
     
@@ -120,6 +123,8 @@ def create_video_with_effects(img_path, audio_path, output_path, duration, subti
         duration: 时长
         subtitle_text: 字幕文本
         effect: 运镜效果
+        audio_clip: (PCM采样, 采样率)，音频为项目音轨时传入内存映射的片段，
+                    经stdin以原始PCM送给ffmpeg（只读这一段，不必每次从音轨开头解码）
     """
     # 构建zoompan滤镜（Ken Burns效果）
     fps = 24
@@ -207,7 +212,17 @@ def create_video_with_effects(img_path, audio_path, output_path, duration, subti
     cmd = [
         'ffmpeg', '-y',
         '-loop', '1', '-i', str(img_path),  # 循环图片
-        '-i', str(audio_path),  # 音频
+    ]
+    audio_input = None
+    if audio_clip is not None:
+        # 项目音轨中的片段：16位PCM经stdin传入
+        samples, sample_rate = audio_clip
+        channels = samples.shape[1] if samples.ndim > 1 else 1
+        cmd += ['-f', 's16le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0']
+        audio_input = samples.tobytes()
+    else:
+        cmd += ['-i', str(audio_path)]  # 音频
+    cmd += [
         '-vf', video_filter,  # 视频滤镜
         '-c:v', 'libx264',  # 视频编码
         '-tune', 'stillimage',  # 优化静态图片
@@ -219,7 +234,7 @@ def create_video_with_effects(img_path, audio_path, output_path, duration, subti
         str(output_path)
     ]
     
-    subprocess.run(cmd, check=True, capture_output=True)
+    subprocess.run(cmd, input=audio_input, check=True, capture_output=True)
 
 
 def compose_video(project_dir, subtitle_file, imgs_dir, audio_dir, output_dir):
@@ -276,6 +291,12 @@ def compose_video(project_dir, subtitle_file, imgs_dir, audio_dir, output_dir):
     audio_path = Path(audio_dir)
     output_path = Path(output_dir)
     
+    # 单一音轨格式：所有子分镜从同一个内存映射的音轨中按偏移截取
+    track = None
+    if 'audio_track' in subtitles_data:
+        track = AudioTrackReader(audio_path / subtitles_data['audio_track']['filename'])
+        print(f"音轨: {track.path.name}（{track.duration:.2f}秒，{track.sample_rate}Hz）")
+    
     # 创建临时目录
     temp_dir = output_path / "temp"
     temp_dir.mkdir(exist_ok=True)
@@ -318,8 +339,15 @@ def compose_video(project_dir, subtitle_file, imgs_dir, audio_dir, output_dir):
             child_text = child['text']
             child_duration = child['duration']
             audio_file = audio_path / child['filename']
+            audio_clip = None
             
-            if not audio_file.exists():
+            if track is not None and 'sample_offset' in child:
+                try:
+                    audio_clip = (track.clip(child['sample_offset'], child['sample_count']), track.sample_rate)
+                except IndexError as e:
+                    print(f"    ⚠ 子分镜 {j} 音频缺失，跳过: {e}")
+                    continue
+            elif not audio_file.exists():
                 print(f"    ⚠ 子分镜 {j} 音频缺失，跳过")
                 continue
             
@@ -335,7 +363,8 @@ def compose_video(project_dir, subtitle_file, imgs_dir, audio_dir, output_dir):
                     output_path=child_segment_file,
                     duration=child_duration,
                     subtitle_text=child_text,
-                    effect=effect  # 所有子分镜使用相同的运镜效果
+                    effect=effect,  # 所有子分镜使用相同的运镜效果
+                    audio_clip=audio_clip
                 )
                 
                 child_segments.append(child_segment_file)